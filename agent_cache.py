@@ -0,0 +1,238 @@
+"""Record/replay cache for LLM calls and agent runs.
+
+AGENT_CACHE selects the mode (default off):
+
+    record   run live and save, under AGENT_CACHE_DIR,
+               llm/<hash>.json   each LLM response, keyed by a hash of the
+                                 model, the request messages (page state
+                                 included, with the volatile parts browser_use
+                                 adds normalized, see _normalize) and the
+                                 output schema
+               runs/<hash>.json  each agent run, keyed by a hash of the stage,
+                                 model and task: its final result plus a page
+                                 snapshot (url, title, DOM text, actions) per step
+    replay   serve from the cache: a recorded run returns its final result
+             without launching a browser, and LLM calls are answered from
+             llm/; a miss of either raises CacheMiss rather than going live
+
+models.get_llm() wraps every model with wrap(), and each stage runs its
+agents through run_agent(). Replay makes storage read-only (see
+storage.STORAGE_READ_ONLY), so the statuses a replayed run reports — hold.py
+records them from the HOLD RESULTS text — never reach real data. SFPL
+credentials only appear in tasks as sensitive_data placeholders (see
+sessions.sfpl_sensitive_data), so they're never hashed or saved.
+
+    uv run agent_cache.py parse   # re-run the current parsers over every recording
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+
+import metrics
+
+AGENT_CACHE = os.getenv("AGENT_CACHE", "off")
+AGENT_CACHE_DIR = os.getenv("AGENT_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".agent_cache"))
+
+
+class CacheMiss(RuntimeError):
+    pass
+
+
+# browser_use puts today's date in every request and names tabs by the last 4
+# hex digits of their random CDP target IDs.
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?)?\b")
+_TAB_ID = re.compile(r"((?<![A-Za-z])Tab |Current tab: |\"tab_id\": ?\")([0-9A-Fa-f]{4})\b")
+
+
+def _normalize(value, tabs: dict[str, str] | None = None):
+    """value (messages as dumped JSON) with dates blanked and tab IDs renumbered
+    in order of appearance, so identical page states hash the same across runs."""
+    tabs = {} if tabs is None else tabs
+    if isinstance(value, dict):
+        return {k: _normalize(v, tabs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v, tabs) for v in value]
+    if not isinstance(value, str):
+        return value
+
+    def tab(match: re.Match) -> str:
+        return match[1] + tabs.setdefault(match[2].upper(), f"#{len(tabs) + 1}")
+
+    return _TAB_ID.sub(tab, _DATE.sub("<date>", value))
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _path(kind: str, key: str) -> str:
+    return os.path.join(AGENT_CACHE_DIR, kind, f"{key}.json")
+
+
+def _load(kind: str, key: str) -> dict | None:
+    try:
+        with open(_path(kind, key)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save(kind: str, key: str, entry: dict) -> None:
+    path = _path(kind, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(entry, f, indent=1, default=str)
+    os.replace(path + ".tmp", path)
+
+
+def _schema(output_format) -> dict | None:
+    return output_format.model_json_schema() if output_format is not None else None
+
+
+class CachedLLM:
+    """A chat model that records or replays the wrapped model's responses."""
+
+    _verified_api_keys = True
+
+    def __init__(self, llm, stage: str):
+        self.llm = llm
+        self.stage = stage
+        self.model = llm.model
+
+    @property
+    def provider(self) -> str:
+        return self.llm.provider
+
+    @property
+    def name(self) -> str:
+        return self.llm.name
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        from browser_use.llm.views import ChatInvokeCompletion, ChatInvokeUsage
+
+        request = [m.model_dump(mode="json") for m in messages]
+        key = _hash(self.model, _normalize(request), _schema(output_format))
+        if AGENT_CACHE == "replay":
+            entry = _load("llm", key)
+            if entry is None:
+                metrics.incr("agent_cache_misses", agent=self.stage, kind="llm")
+                raise CacheMiss(f"No recorded {self.stage} LLM response for this request ({key[:12]})")
+            metrics.incr("agent_cache_hits", agent=self.stage, kind="llm")
+            completion = entry["completion"]
+            if output_format is not None:
+                completion = output_format.model_validate(completion)
+            usage = ChatInvokeUsage.model_validate(entry["usage"]) if entry["usage"] else None
+            return ChatInvokeCompletion(completion=completion, usage=usage)
+
+        response = await self.llm.ainvoke(messages, output_format, **kwargs)
+        completion = response.completion
+        _save("llm", key, {
+            "stage": self.stage,
+            "model": self.model,
+            "messages": request,
+            "completion": completion.model_dump(mode="json") if output_format is not None else completion,
+            "usage": response.usage.model_dump(mode="json") if response.usage else None,
+            "recorded_at": time.time(),
+        })
+        return response
+
+
+def wrap(llm, stage: str):
+    """llm, recording or replaying through the cache when AGENT_CACHE is on."""
+    if AGENT_CACHE not in ("record", "replay"):
+        return llm
+    return CachedLLM(llm, stage)
+
+
+def _snapshot(state, output, step: int) -> dict:
+    return {
+        "step": step,
+        "url": state.url,
+        "title": state.title,
+        "dom": state.dom_state.llm_representation(),
+        "actions": [a.model_dump(mode="json", exclude_unset=True) for a in output.action],
+    }
+
+
+async def run_agent(stage: str, task: str, llm, run) -> str:
+    """Final result of await run(on_step), an agent run, recorded or replayed by task.
+
+    run should pass on_step to Agent(register_new_step_callback=...); it is
+    None when the cache is off. Replay raises CacheMiss for an unrecorded run.
+    """
+    if AGENT_CACHE not in ("record", "replay"):
+        return await run(None)
+    key = _hash(stage, llm.model, task)
+    if AGENT_CACHE == "replay":
+        entry = _load("runs", key)
+        if entry is not None:
+            metrics.incr("agent_cache_hits", agent=stage, kind="run")
+            return entry["final_result"]
+        metrics.incr("agent_cache_misses", agent=stage, kind="run")
+        raise CacheMiss(f"No recorded {stage} run for this task ({key[:12]})")
+
+    steps = []
+    final_result = await run(lambda state, output, step: steps.append(_snapshot(state, output, step)))
+    if AGENT_CACHE == "record":
+        _save("runs", key, {
+            "stage": stage,
+            "model": llm.model,
+            "task": task,
+            "final_result": final_result,
+            "steps": steps,
+            "recorded_at": time.time(),
+        })
+    return final_result
+
+
+def recordings(kind: str) -> list[dict]:
+    """Every recorded entry of kind ("llm" or "runs")."""
+    directory = os.path.join(AGENT_CACHE_DIR, kind)
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            entry = _load(kind, name[:-len(".json")])
+            if entry is not None:
+                entries.append(entry)
+    return entries
+
+
+def parse_recordings() -> None:
+    """Run the current parsers over every recorded output and report hits and timing."""
+    from parsing import parse_agent_picks, parse_hold_results, parse_hold_statuses, parse_verification
+
+    parsers = {
+        "search": parse_agent_picks,
+        "verify": lambda text: parse_verification(text) is not None,
+        "hold": parse_hold_results,
+        "sync": parse_hold_statuses,
+    }
+    outputs = [(e["stage"], e["final_result"]) for e in recordings("runs")]
+    outputs += [(e["stage"], e["completion"]) for e in recordings("llm")
+                if e["stage"] == "search" and isinstance(e["completion"], str)]
+
+    print(f"{'stage':<8}{'outputs':>8}{'parsed':>8}{'ms':>9}")
+    for stage, parse in parsers.items():
+        texts = [text or "" for s, text in outputs if s == stage]
+        start = time.perf_counter()
+        parsed = sum(1 for text in texts if parse(text))
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{stage:<8}{len(texts):>8}{parsed:>8}{elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect the agent record/replay cache")
+    parser.add_argument("command", choices=["parse"], help="parse: re-run parsers over recorded outputs")
+    parser.parse_args()
+    parse_recordings()
@@ -0,0 +1,107 @@
+"""Persistent title → branch availability cache shared across runs.
+
+Entries are keyed by parsing.book_key (normalized title + author surname) and
+hold the branches that had a copy on the shelf when last checked — an empty
+list means every copy was in use. Lookups older than CACHE_TTL seconds are
+treated as misses, and the least recently used entries are evicted once the
+cache grows past CACHE_MAX_ENTRIES.
+
+Backed by a local SQLite file so separate processes (main.py, hold.py,
+runner.py workers) share it without a server.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from parsing import book_key
+
+CACHE_PATH = os.getenv(
+    "AVAILABILITY_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), ".cache", "availability.sqlite3"),
+)
+CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", str(6 * 60 * 60)))
+CACHE_MAX_ENTRIES = int(os.getenv("AVAILABILITY_CACHE_MAX_ENTRIES", "5000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS availability (
+    key TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    bib_id TEXT,
+    branches TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS availability_accessed_at ON availability (accessed_at);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a connection per call; callers run on short-lived catalog worker
+    threads, so they close it when done (with closing(_connect()) as conn)."""
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+            with closing(sqlite3.connect(CACHE_PATH, timeout=10)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            _initialized = True
+    return sqlite3.connect(CACHE_PATH, timeout=10)
+
+
+def get(title: str, author: str = "") -> dict | None:
+    """Return a fresh cached result ({"title", "author", "bib_id", "branches"}) or None."""
+    key = book_key(title, author)
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        row = conn.execute(
+            "SELECT title, author, bib_id, branches, checked_at FROM availability WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None or now - row[4] > CACHE_TTL:
+            return None
+        conn.execute("UPDATE availability SET accessed_at = ? WHERE key = ?", (now, key))
+    return {"title": row[0], "author": row[1], "bib_id": row[2], "branches": json.loads(row[3])}
+
+
+def put(title: str, author: str, branches: list[str], bib_id: str | None = None) -> None:
+    """Record the branches currently holding an available copy of a book."""
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO availability "
+            "(key, title, author, bib_id, branches, checked_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (book_key(title, author), title, author, bib_id, json.dumps(branches), now, now),
+        )
+        _evict(conn)
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    (count,) = conn.execute("SELECT COUNT(*) FROM availability").fetchone()
+    if count <= CACHE_MAX_ENTRIES:
+        return
+    conn.execute(
+        "DELETE FROM availability WHERE key IN "
+        "(SELECT key FROM availability ORDER BY accessed_at LIMIT ?)",
+        (count - CACHE_MAX_ENTRIES,),
+    )
+
+
+def record_picks(books: list[dict]) -> None:
+    """Populate the cache from parsed agent picks that name a branch."""
+    for book in books:
+        if not book.get("branch"):
+            continue
+        cached = get(book["title"], book["author"])
+        if cached and book["branch"] in cached["branches"]:
+            continue
+        put(book["title"], book["author"], [book["branch"]])
@@ -0,0 +1,124 @@
+"""Benchmark per-document vs transactional recommendation writes against the emulator.
+
+    gcloud emulators firestore start --host-port=127.0.0.1:8686
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8686 uv run bench_firestore.py --books 5 --runs 20
+
+Each run seeds a throwaway family, then times the recommendation writes of
+one family run (save_recommendations' stale-delete + insert, hold's
+hold_placed update, sync_holds' in_transit update), each with its status
+events: written the old way — one round trip per document and per event —
+and through firestore_storage.write_recommendations, which applies them and
+appends the events in one transaction.
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+import firestore_storage
+import metrics
+import status_events
+from firestore_client import commit_writes, get_db
+
+
+def seed_family(family_id: str, books: int) -> list[str]:
+    """Create `books` recommended docs for a family and return their IDs."""
+    recs_ref = get_db().collection("families").document(family_id).collection("recommendations")
+    now = datetime.now(timezone.utc)
+    refs = [recs_ref.document() for _ in range(books)]
+    commit_writes([
+        ("set", ref, {"title": f"Book {i}", "author": "Author", "status": "recommended", "updated_at": now})
+        for i, ref in enumerate(refs)
+    ])
+    return [ref.id for ref in refs]
+
+
+def family_run_calls(family_id: str, doc_ids: list[str]) -> list[dict]:
+    """write_recommendations arguments for each call one family run makes."""
+    recs_ref = get_db().collection("families").document(family_id).collection("recommendations")
+    now = datetime.now(timezone.utc)
+    new_ids = [recs_ref.document().id for _ in doc_ids]
+    books = {doc_id: {"title": f"Book {i}", "author": "Author", "status": "recommended"}
+             for i, doc_id in enumerate(new_ids)}
+    save = {
+        "updates": {},
+        "creates": {doc_id: {**book, "updated_at": now} for doc_id, book in books.items()},
+        "deletes": doc_ids,
+        "events": [status_events.event(doc_id, None, "replaced") for doc_id in doc_ids]
+        + [status_events.event(doc_id, book, "recommended") for doc_id, book in books.items()],
+        "history": {doc_id: {"title": book["title"], "author": book["author"]} for doc_id, book in books.items()},
+    }
+    calls = [save]
+    for status in ("hold_placed", "in_transit"):
+        calls.append({
+            "updates": {doc_id: {"status": status, "updated_at": now} for doc_id in new_ids},
+            "creates": {},
+            "deletes": [],
+            "events": [status_events.event(doc_id, books[doc_id], status) for doc_id in new_ids],
+            "history": {},
+        })
+    return calls
+
+
+def per_document(family_id: str, call: dict) -> None:
+    """The pre-batching write path: one round trip per document and per event."""
+    family_ref = get_db().collection("families").document(family_id)
+    recs_ref = family_ref.collection("recommendations")
+    for doc_id in call["deletes"]:
+        recs_ref.document(doc_id).delete()
+    for doc_id, data in call["creates"].items():
+        recs_ref.document(doc_id).set(data)
+    for doc_id, data in call["updates"].items():
+        recs_ref.document(doc_id).update(data)
+    if call["history"]:
+        family_ref.collection("sync_state").document("book_history").set({"books": call["history"]}, merge=True)
+    now = datetime.now(timezone.utc)
+    for e in call["events"]:
+        family_ref.collection("status_events").add({**e, "at": now})
+    metrics.incr("firestore_commits", len(call["deletes"]) + len(call["creates"]) + len(call["updates"])
+                 + bool(call["history"]) + len(call["events"]))
+
+
+def transactional(family_id: str, call: dict) -> None:
+    firestore_storage.write_recommendations(family_id, **call)
+
+
+def bench(mode: str, books: int, runs: int) -> tuple[list[float], float]:
+    write = per_document if mode == "per-document" else transactional
+    latencies = []
+    commits = 0.0
+    for run in range(runs):
+        family_id = f"bench-{mode}-{os.getpid()}-{run}"
+        calls = family_run_calls(family_id, seed_family(family_id, books))
+        before = metrics.total("firestore_commits")
+        start = time.perf_counter()
+        for call in calls:
+            write(family_id, call)
+        latencies.append(time.perf_counter() - start)
+        commits += metrics.total("firestore_commits") - before
+    return latencies, commits / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-document vs transactional recommendation writes")
+    parser.add_argument("--books", type=int, default=5, help="recommendations per family")
+    parser.add_argument("--runs", type=int, default=20, help="family runs per mode")
+    args = parser.parse_args()
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("Set FIRESTORE_EMULATOR_HOST — this benchmark only runs against the emulator")
+
+    print(f"{args.books} books per family, {args.runs} family runs per mode\n")
+    print(f"{'mode':<16}{'round trips/run':>16}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in ("per-document", "transactional"):
+        latencies, round_trips = bench(mode, args.books, args.runs)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+        print(f"{mode:<16}{round_trips:>16g}{p50:>10.1f}{p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
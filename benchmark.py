@@ -0,0 +1,209 @@
+"""Offline end-to-end pipeline benchmark.
+
+Runs search → hold → sync → notify for synthetic families against local
+stand-ins only: fake_catalog.py (the synthetic fixtures in fixtures/catalog),
+fake_cartesia.py, the Firestore emulator (or, with --storage sqlite, an
+in-process SQLite file), and scripted_llm.ScriptedLLM in place of Claude.
+Browser stages still launch real Chromium and walk fake_catalog.py's HTML
+pages (home, search results, detail pages, holds), so their numbers include
+browser startup, page loads and DOM extraction; browsers may only navigate to
+localhost, and the run fails if any agent tries to go elsewhere.
+
+    gcloud emulators firestore start --host-port=127.0.0.1:8686
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8686 uv run benchmark.py --families 1,10,100
+    uv run benchmark.py --storage sqlite --families 1,10,100,1000
+
+Reports per-stage wall time, per-family latency (p50/p95) and throughput.
+--profiles lean,default runs every scale once per browser profile (see
+sessions.profile_kwargs) for a before/after comparison.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Pipeline modules read their config at import, so the environment is set up
+# here and they are only imported once the stand-ins are running.
+_scratch = tempfile.mkdtemp(prefix="bench-")
+os.environ.setdefault("CARTESIA_API_KEY", "bench-key")
+os.environ.setdefault("BENCH_SFPL_PASSWORD", "bench-pin")
+# Agents stay on the stand-ins: no opening the sfpl.org URL in their tasks,
+# and navigation anywhere else is blocked (and counted, see NavigationGuard)
+os.environ["AGENT_OPEN_TASK_URL"] = "0"
+os.environ["BROWSER_ALLOWED_HOSTS"] = "127.0.0.1,localhost"
+# Synthetic families are notified as soon as their books are ready
+os.environ.setdefault("NOTIFY_WINDOW_MINUTES", "0")
+os.environ.setdefault("NOTIFY_MIN_INTERVAL_HOURS", "0")
+os.environ["AVAILABILITY_CACHE_PATH"] = os.path.join(_scratch, "availability.sqlite3")
+os.environ["SESSION_DIR"] = os.path.join(_scratch, "sessions")
+os.environ["STORAGE_PATH"] = os.path.join(_scratch, "storage.sqlite3")
+os.environ["METRICS_JSONL"] = os.path.join(_scratch, "metrics.jsonl")
+os.environ["METRICS_PROM"] = os.path.join(_scratch, "metrics.prom")
+
+STAGE_ORDER = ["search", "hold", "sync", "notify"]
+
+
+class NavigationGuard(logging.Handler):
+    """Collects the navigations browser_use blocked under BROWSER_ALLOWED_HOSTS."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.blocked: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if "disallowed URL" in message or "non-allowed URL" in message:
+            self.blocked.append(message)
+
+
+def configure_stand_ins(catalog_port: int, cartesia_port: int, latency: float):
+    """Start the fake servers and point the pipeline at them (before it's imported)."""
+    import fake_cartesia
+    import fake_catalog
+
+    os.environ["CATALOG_BASE_URL"] = f"http://127.0.0.1:{catalog_port}/v2/libraries/sfpl"
+    os.environ["CARTESIA_BASE_URL"] = f"http://127.0.0.1:{cartesia_port}"
+    return (
+        fake_catalog.serve(catalog_port, latency),
+        fake_cartesia.serve(cartesia_port, calls=20, latency=latency),
+    )
+
+
+def seed_families(prefix: str, count: int) -> list[str]:
+    """Create count families, each with one summary, and return their IDs."""
+    import storage
+
+    now = datetime.now(timezone.utc)
+    family_ids = [f"{prefix}-{i:04d}" for i in range(count)]
+    for i, family_id in enumerate(family_ids):
+        storage.put_family(family_id, {
+            "parent_name": "Parent",
+            "child_name": f"Kid {i}",
+            "child_age": 4 + i % 4,
+            "preferred_branch": "Noe Valley",
+            "phone_number": f"+1555{i:07d}",
+            "cartesia_agent_id": f"bench-agent-{i:04d}",
+            "sfpl_username": f"bench-card-{i:04d}",
+            "sfpl_password_env": "BENCH_SFPL_PASSWORD",
+        })
+        storage.add_summaries(family_id, {"seed": {
+            "summary_text": "Asked about dinosaurs, dragons and very hungry caterpillars.",
+            "topics": [],
+            "mode": "standard",
+            "source": "benchmark",
+            "created_at": now,
+        }})
+    return family_ids
+
+
+async def time_stage(stage: str, family_ids: list[str], max_families: int) -> dict:
+    from runner import run_stage
+
+    slots = asyncio.Semaphore(max_families)
+    latencies = []
+    errors = 0
+
+    async def one(family_id: str) -> None:
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await run_stage(stage, family_id)
+            except Exception as e:
+                errors += 1
+                print(f"[{family_id}] {stage}: failed: {e!r}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(f) for f in family_ids))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "wall": wall,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "throughput": len(family_ids) / wall if wall else 0.0,
+        "errors": errors,
+    }
+
+
+async def bench_scale(count: int, max_families: int, profile: str) -> dict[str, dict]:
+    import config
+    import sessions
+
+    # Each synthetic family has its own accounts, as under runner.py
+    config.allow_shared_accounts(False)
+    sessions.configure(lean=profile == "lean")
+    prefix = f"bench-{int(time.time())}-{profile}-{count}"
+    family_ids = await asyncio.to_thread(seed_families, prefix, count)
+    results = {}
+    try:
+        for stage in STAGE_ORDER:
+            results[stage] = await time_stage(stage, family_ids, max_families)
+    finally:
+        await sessions.close_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--families", default="1,10,100", help="comma-separated family counts")
+    parser.add_argument("--max-families", type=int, default=32, help="families in flight at once")
+    parser.add_argument("--max-browsers", type=int, default=4, help="simultaneous browser sessions")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds of simulated latency per stand-in HTTP response")
+    parser.add_argument("--profiles", default="lean",
+                        help="comma-separated browser profiles to compare: lean, default")
+    parser.add_argument("--storage", choices=["firestore", "sqlite"], default="firestore",
+                        help="storage backend (firestore needs the emulator)")
+    parser.add_argument("--catalog-port", type=int, default=8765)
+    parser.add_argument("--cartesia-port", type=int, default=8766)
+    args = parser.parse_args()
+
+    if args.storage == "firestore" and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("Set FIRESTORE_EMULATOR_HOST — the benchmark only runs against the emulator")
+    os.environ["STORAGE_BACKEND"] = args.storage
+
+    servers = configure_stand_ins(args.catalog_port, args.cartesia_port, args.latency)
+
+    import browser_use  # noqa: F401 — sets up its loggers, which the guard then joins
+
+    import browser_pool
+    import metrics
+    import models
+    from scripted_llm import ScriptedLLM
+
+    guard = NavigationGuard()
+    logging.getLogger("browser_use").addHandler(guard)
+
+    models.use(lambda stage: ScriptedLLM(site=f"http://127.0.0.1:{args.catalog_port}"))
+    browser_pool.configure(max_browsers=args.max_browsers, site_min_interval=0.0)
+
+    profiles = args.profiles.split(",")
+    if not set(profiles) <= {"lean", "default"}:
+        raise SystemExit("--profiles takes lean and/or default")
+
+    print(f"{'families':>8}  {'profile':<9}{'stage':<7}{'wall s':>9}{'p50 s':>8}{'p95 s':>8}"
+          f"{'fam/s':>8}{'errors':>8}")
+    for count in [int(n) for n in args.families.split(",")]:
+        for profile in profiles:
+            results = asyncio.run(bench_scale(count, args.max_families, profile))
+            for stage, r in results.items():
+                print(f"{count:>8}  {profile:<9}{stage:<7}{r['wall']:>9.2f}{r['p50']:>8.2f}"
+                      f"{r['p95']:>8.2f}{r['throughput']:>8.2f}{r['errors']:>8}")
+
+    metrics.export()
+    print(f"\nDetailed metrics: {os.environ['METRICS_JSONL']}")
+    for server in servers:
+        server.shutdown()
+    if guard.blocked:
+        raise SystemExit(f"{len(guard.blocked)} agent navigations left localhost:\n" + "\n".join(guard.blocked))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Per-family index of every book ever recommended, in any status.
+
+A map from parsing.book_key(title, author) to {title, author, status,
+updated_at} (on Firestore, one document: families/{family_id}/sync_state/
+book_history), so the search stage can drop already-seen candidates with a
+single read before any catalog lookup or browser check. Recommendation
+writers pass entries() along with their status writes to keep the index
+current; a family whose index was never built by rebuild() gets it rebuilt
+from its recommendations, even if status writes already added entries.
+"""
+
+from datetime import datetime, timezone
+
+import storage
+from parsing import book_key
+
+# Already-seen titles listed in the brainstorm prompt, newest first.
+PROMPT_LIMIT = 30
+
+
+def _entry(title: str, author: str, status: str, now: datetime) -> dict:
+    return {"title": title, "author": author, "status": status, "updated_at": now}
+
+
+def entries(books: list[dict], status: str | None = None) -> dict[str, dict]:
+    """Index entries recording books (each with its own "status" unless status is given)."""
+    now = datetime.now(timezone.utc)
+    return {
+        book_key(b["title"], b.get("author", "")): _entry(
+            b["title"], b.get("author", ""), status or b["status"], now
+        )
+        for b in books
+    }
+
+
+def rebuild(family_id: str) -> dict[str, dict]:
+    """Rebuild the index from every recommendation the family has."""
+    recs = storage.load_recommendations(family_id, None, fields=["title", "author", "updated_at"])
+    now = datetime.now(timezone.utc)
+    books = {}
+    for rec in recs:
+        if not rec.get("title"):
+            continue
+        books[book_key(rec["title"], rec.get("author", ""))] = _entry(
+            rec["title"], rec.get("author", ""), rec.get("status", ""), rec.get("updated_at", now)
+        )
+    storage.put_book_history(family_id, books)
+    return books
+
+
+def load(family_id: str) -> dict[str, dict]:
+    """The family's index: book_key -> {title, author, status, updated_at}."""
+    books = storage.load_book_history(family_id)
+    if books is None:
+        return rebuild(family_id)
+    return books
+
+
+def recent_titles(history: dict[str, dict], limit: int = PROMPT_LIMIT) -> list[str]:
+    """'"Title" by Author' for the most recently updated books in the index."""
+    newest = sorted(history.values(), key=lambda e: e["updated_at"], reverse=True)
+    return [f'"{e["title"]}" by {e["author"]}' for e in newest[:limit]]
@@ -0,0 +1,65 @@
+"""Process-wide limits on concurrent browser sessions and per-site request rate."""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+SFPL_SITE = "sfpl.org"
+
+MAX_BROWSERS = int(os.getenv("MAX_BROWSERS", "4"))
+SITE_MIN_INTERVAL = float(os.getenv("SITE_MIN_INTERVAL", "0.5"))
+
+_slots: asyncio.Semaphore | None = None
+_site_locks: dict[str, asyncio.Lock] = {}
+_site_last: dict[str, float] = {}
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _bind_loop() -> None:
+    """asyncio primitives belong to one loop; start fresh under a new asyncio.run()."""
+    global _slots, _loop
+    loop = asyncio.get_running_loop()
+    if loop is not _loop:
+        _loop = loop
+        _slots = None
+        _site_locks.clear()
+
+
+def configure(max_browsers: int | None = None, site_min_interval: float | None = None) -> None:
+    """Override the limits. Call before any browser is started."""
+    global MAX_BROWSERS, SITE_MIN_INTERVAL, _slots
+    if max_browsers is not None:
+        MAX_BROWSERS = max_browsers
+        _slots = None
+    if site_min_interval is not None:
+        SITE_MIN_INTERVAL = site_min_interval
+
+
+@asynccontextmanager
+async def browser_slot():
+    """Hold one of MAX_BROWSERS slots for the lifetime of a browser session."""
+    global _slots
+    _bind_loop()
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_BROWSERS)
+    async with _slots:
+        yield
+
+
+async def throttle(site: str) -> None:
+    """Wait until at least SITE_MIN_INTERVAL seconds have passed since the last request to site."""
+    _bind_loop()
+    lock = _site_locks.setdefault(site, asyncio.Lock())
+    async with lock:
+        wait = _site_last.get(site, 0.0) + SITE_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        _site_last[site] = time.monotonic()
+
+
+def step_throttle(site: str):
+    """Agent on_step_start hook that rate-limits every agent step against site."""
+    async def hook(agent) -> None:
+        await throttle(site)
+    return hook
@@ -0,0 +1,150 @@
+"""Shared Cartesia API client.
+
+One pooled keep-alive session for every stage, a client-side rate limit
+(CARTESIA_RATE_LIMIT requests/second across all threads), a timeout on every
+request, and bounded retries with full-jitter exponential backoff. GETs are
+retried on 429/5xx and connection errors; POSTs (which start real phone
+calls) only when the request provably wasn't processed — 429 or a connect
+timeout. The rate limit and backoff block in time.sleep, so async code must
+use the async variants (or asyncio.to_thread), which run the same pooled
+session on a worker thread.
+
+Credentials and CARTESIA_BASE_URL are read when a request is made (after the
+stage has loaded .env), and importing this is cheap.
+"""
+
+import os
+import random
+import threading
+import time
+
+import metrics
+
+DEFAULT_BASE_URL = "https://api.cartesia.ai"
+CARTESIA_VERSION = "2025-04-16"
+CARTESIA_TIMEOUT = float(os.getenv("CARTESIA_TIMEOUT", "10"))
+CARTESIA_MAX_RETRIES = int(os.getenv("CARTESIA_MAX_RETRIES", "4"))
+CARTESIA_BACKOFF = float(os.getenv("CARTESIA_BACKOFF", "0.5"))
+CARTESIA_MAX_BACKOFF = 20.0
+CARTESIA_RATE_LIMIT = float(os.getenv("CARTESIA_RATE_LIMIT", "5"))  # 0 disables
+CARTESIA_POOL_SIZE = int(os.getenv("CARTESIA_POOL_SIZE", "16"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_rate_lock = threading.Lock()
+_next_slot = 0.0
+
+
+def configured() -> bool:
+    return bool(os.getenv("CARTESIA_API_KEY"))
+
+
+def api_key() -> str:
+    """The API key, read when a stage needs it. Agent IDs come from each family's config."""
+    if not configured():
+        raise RuntimeError("CARTESIA_API_KEY must be set")
+    return os.environ["CARTESIA_API_KEY"]
+
+
+def _http():
+    """The shared session, created (and requests imported) on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=CARTESIA_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+
+def _wait_for_slot() -> None:
+    """Space requests at least 1/CARTESIA_RATE_LIMIT seconds apart, process-wide."""
+    global _next_slot
+    if CARTESIA_RATE_LIMIT <= 0:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_slot)
+        _next_slot = slot + 1 / CARTESIA_RATE_LIMIT
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    delay = random.uniform(0, min(CARTESIA_MAX_BACKOFF, CARTESIA_BACKOFF * 2 ** attempt))
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), CARTESIA_MAX_BACKOFF))
+    return delay
+
+
+def request(method: str, path: str, params: dict | None = None, json: dict | None = None) -> dict:
+    """Call the Cartesia API and return the decoded JSON body."""
+    import requests
+
+    key = api_key()
+    base_url = os.getenv("CARTESIA_BASE_URL", DEFAULT_BASE_URL)
+    headers = {"X-API-Key": key, "Cartesia-Version": CARTESIA_VERSION}
+    idempotent = method.upper() == "GET"
+    endpoint = path.strip("/")
+    for attempt in range(CARTESIA_MAX_RETRIES + 1):
+        last = attempt == CARTESIA_MAX_RETRIES
+        _wait_for_slot()
+        try:
+            with metrics.timed("http_seconds", host="cartesia", endpoint=endpoint):
+                resp = _http().request(
+                    method, f"{base_url}{path}", params=params, json=json,
+                    headers=headers, timeout=CARTESIA_TIMEOUT,
+                )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+            if last or not retryable:
+                raise
+            metrics.incr("http_retries", host="cartesia", endpoint=endpoint)
+            time.sleep(_backoff(attempt))
+            continue
+        retryable = resp.status_code in RETRY_STATUSES and (idempotent or resp.status_code == 429)
+        if retryable and not last:
+            metrics.incr("http_retries", host="cartesia", endpoint=endpoint)
+            time.sleep(_backoff(attempt, resp.headers.get("Retry-After")))
+            continue
+        resp.raise_for_status()
+        return resp.json()
+
+
+async def arequest(method: str, path: str, params: dict | None = None, json: dict | None = None) -> dict:
+    """request() without blocking the event loop."""
+    import asyncio
+
+    return await asyncio.to_thread(request, method, path, params, json)
+
+
+def iter_calls(agent_id: str, page_size: int = 50, expand: str = "transcript"):
+    """Yield the agent's calls, newest first, fetching pages only as they're consumed."""
+    params = {"agent_id": agent_id, "expand": expand, "limit": page_size}
+    while True:
+        page = request("GET", "/agents/calls", params=dict(params))
+        data = page.get("data", [])
+        yield from data
+        if not data or not page.get("has_more"):
+            return
+        params["starting_after"] = page.get("next_page") or data[-1]["id"]
+
+
+def start_outbound_call(phone_number: str, agent_id: str) -> dict:
+    """Have the agent call phone_number."""
+    return request("POST", "/twilio/call/outbound", json={
+        "target_numbers": [phone_number],
+        "agent_id": agent_id,
+    })
+
+
+async def astart_outbound_call(phone_number: str, agent_id: str) -> dict:
+    import asyncio
+
+    return await asyncio.to_thread(start_outbound_call, phone_number, agent_id)
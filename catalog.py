@@ -0,0 +1,133 @@
+"""Direct HTTP client for the SFPL catalog (BiblioCommons gateway).
+
+Answers "is this title available, and where?" with two JSON requests instead
+of a browser agent clicking through search results and detail pages. Any
+title it can't resolve confidently comes back as None so the caller can fall
+back to the agent.
+
+Point CATALOG_BASE_URL at fake_catalog.py to run against recorded fixtures.
+"""
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import availability_cache
+import metrics
+from parsing import normalize_author, normalize_title
+
+CATALOG_BASE_URL = os.getenv(
+    "CATALOG_BASE_URL", "https://gateway.bibliocommons.com/v2/libraries/sfpl"
+)
+CATALOG_TIMEOUT = float(os.getenv("CATALOG_TIMEOUT", "8"))
+CATALOG_WORKERS = int(os.getenv("CATALOG_WORKERS", "6"))
+
+# Formats with no copy on a branch shelf; never a valid pick.
+SKIP_FORMATS = {"EBOOK", "EAUDIOBOOK", "AB", "DVD", "BLURAY", "MUSIC_CD"}
+
+_session = None
+
+
+class CatalogError(Exception):
+    """A catalog request failed (network error, timeout or error status)."""
+
+
+def _http():
+    """Shared keep-alive session, created (and requests imported) on first use."""
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+    return _session
+
+
+def _get(path: str, params: dict | None = None) -> dict:
+    """GET a gateway path as JSON. Transport and HTTP errors raise CatalogError."""
+    session = _http()
+    import requests
+
+    try:
+        with metrics.timed("http_seconds", host="catalog"):
+            resp = session.get(f"{CATALOG_BASE_URL}{path}", params=params, timeout=CATALOG_TIMEOUT)
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        raise CatalogError(str(e)) from e
+    return resp.json()
+
+
+def _title_matches(candidate: str, wanted: str) -> bool:
+    """Catalog titles often carry a subtitle, so a prefix match counts."""
+    candidate, wanted = normalize_title(candidate), normalize_title(wanted)
+    return candidate == wanted or candidate.startswith(wanted + " ")
+
+
+def _author_matches(authors: list[str], wanted: str) -> bool:
+    surname = normalize_author(wanted)
+    if not surname:
+        return True
+    return any(surname in normalize_title(a).split() for a in authors)
+
+
+def search(title: str, author: str = "") -> str | None:
+    """Return the bib ID of the best book match for title/author, or None."""
+    data = _get("/bibs/search", {"query": f"{title} {author}".strip(), "searchType": "keyword"})
+    bibs = data.get("entities", {}).get("bibs", {})
+    for result in data.get("catalogSearch", {}).get("results", []):
+        # grouped searches wrap each hit as {"representative": bib_id, ...}
+        bib_id = result.get("representative") if isinstance(result, dict) else result
+        info = bibs.get(bib_id, {}).get("briefInfo", {})
+        if info.get("format") in SKIP_FORMATS:
+            continue
+        if _title_matches(info.get("title", ""), title) and _author_matches(
+            info.get("authors", []), author
+        ):
+            return bib_id
+    return None
+
+
+def available_branches(bib_id: str) -> list[str]:
+    """Branches with a copy on the shelf right now."""
+    data = _get(f"/bibs/{bib_id}/availability")
+    branches = []
+    for item in data.get("entities", {}).get("bibItems", {}).values():
+        if item.get("availability", {}).get("statusType") != "AVAILABLE":
+            continue
+        name = item.get("branch", {}).get("name", "")
+        if name and name not in branches:
+            branches.append(name)
+    return branches
+
+
+def check_availability(title: str, author: str = "") -> dict | None:
+    """Look up one title. None means unresolved — let the agent check it.
+
+    A resolved result has "branches" (empty when every copy is in use).
+    Fresh entries in availability_cache are returned without any request.
+    """
+    cached = availability_cache.get(title, author)
+    if cached is not None:
+        return cached
+    try:
+        bib_id = search(title, author)
+        if bib_id is None:
+            return None
+        branches = available_branches(bib_id)
+    except (CatalogError, ValueError) as e:
+        print(f'  Catalog lookup failed for "{title}": {e}')
+        return None
+    availability_cache.put(title, author, branches, bib_id)
+    return {"title": title, "author": author, "bib_id": bib_id, "branches": branches}
+
+
+def check_many(books: list[tuple[str, str]]) -> list[dict | None]:
+    """check_availability for (title, author) pairs in parallel, results in input order.
+
+    Each lookup runs in a copy of the caller's context, so its metrics keep
+    the stage and family labels.
+    """
+    if not books:
+        return []
+    with ThreadPoolExecutor(max_workers=min(CATALOG_WORKERS, len(books))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, check_availability, *b) for b in books]
+        return [f.result() for f in futures]
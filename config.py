@@ -1,13 +1,220 @@
-from firestore_client import get_db
+"""Family config (families/{family_id} in storage), cached.
+
+Every stage calls load_family(), so documents are cached in-process for
+FAMILY_CACHE_TTL seconds and, when FAMILY_CACHE_PATH is set, on disk so the
+separate stage jobs of one run share a single read. load_families() fetches
+many families in one round trip (the runner primes the cache with it), and
+watch_families() keeps the cache current from the backend's change feed —
+while it is active, cached entries never expire.
+
+A family's own accounts live in its config too: the Cartesia agent its child
+talks to (whose calls become its summaries) and its SFPL library card. The
+card's PIN is never stored there — the config names the env var holding it
+(sfpl_password_env), resolved at runtime. See account().
+"""
+
+import json
+import os
+import threading
+import time
+
+import metrics
+import storage
 
 DEFAULT_FAMILY_ID = "leo"
 
+FAMILY_CACHE_TTL = float(os.getenv("FAMILY_CACHE_TTL", "300"))
+# Optional JSON file shared by every process on the machine; empty disables it.
+FAMILY_CACHE_PATH = os.getenv("FAMILY_CACHE_PATH", "")
+
+# Account field -> env var it falls back to when the family has none.
+ACCOUNT_ENV = {
+    "cartesia_agent_id": "CARTESIA_AGENT_ID",
+    "sfpl_username": "SFPL_USERNAME",
+    "sfpl_password": "SFPL_PASSWORD",
+}
+# Secret account fields: the family config holds <field>_env, the name of the
+# env var with the value, never the value itself.
+SECRET_FIELDS = {"sfpl_password"}
+
+_lock = threading.Lock()
+_cache: dict[str, tuple[float, dict]] = {}  # family_id -> (loaded_at, data)
+_disk_loaded = False
+_watching = False
+_shared_accounts = True
+
+
+def _with_id(family_id: str, data: dict) -> dict:
+    return {**data, "family_id": family_id}
+
+
+def _load_disk() -> None:
+    """Merge the on-disk cache into memory, once per process."""
+    global _disk_loaded
+    if _disk_loaded or not FAMILY_CACHE_PATH:
+        return
+    _disk_loaded = True
+    try:
+        with open(FAMILY_CACHE_PATH) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return
+    for family_id, entry in entries.items():
+        if family_id not in _cache:
+            _cache[family_id] = (entry["loaded_at"], entry["data"])
+
+
+def _save_disk() -> None:
+    if not FAMILY_CACHE_PATH:
+        return
+    # Account secrets never go to disk, even ones left in an old-style config.
+    entries = {
+        fid: {"loaded_at": t, "data": {k: v for k, v in data.items() if k not in SECRET_FIELDS}}
+        for fid, (t, data) in _cache.items()
+    }
+    os.makedirs(os.path.dirname(FAMILY_CACHE_PATH) or ".", exist_ok=True)
+    tmp = FAMILY_CACHE_PATH + ".tmp"
+    with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        json.dump(entries, f, default=str)
+    os.replace(tmp, FAMILY_CACHE_PATH)
+
+
+def _cached(family_id: str) -> dict | None:
+    entry = _cache.get(family_id)
+    if entry is None:
+        return None
+    loaded_at, data = entry
+    if not _watching and time.time() - loaded_at > FAMILY_CACHE_TTL:
+        return None
+    return dict(data)
+
+
+def _store(families: dict[str, dict]) -> None:
+    now = time.time()
+    with _lock:
+        for family_id, data in families.items():
+            _cache[family_id] = (now, data)
+        _save_disk()
+
 
 def load_family(family_id: str = DEFAULT_FAMILY_ID) -> dict:
-    """Load family config from Firestore families/{family_id}."""
-    doc = get_db().collection("families").document(family_id).get()
-    if not doc.exists:
-        raise ValueError(f"Family '{family_id}' not found in Firestore")
-    data = doc.to_dict()
-    data["family_id"] = doc.id
-    return data
+    """Load family config, from the cache when it's fresh."""
+    with _lock:
+        _load_disk()
+        cached = _cached(family_id)
+    if cached is not None:
+        metrics.incr("family_cache_hits")
+        return cached
+
+    metrics.incr("family_cache_misses")
+    found = storage.get_families([family_id])
+    if family_id not in found:
+        raise ValueError(f"Family '{family_id}' not found in {storage.STORAGE_BACKEND}")
+    data = _with_id(family_id, found[family_id])
+    _store({family_id: data})
+    return dict(data)
+
+
+def load_families(family_ids: list[str] | None = None) -> dict[str, dict]:
+    """Load many families in one round trip and cache them.
+
+    With no IDs, reads every document under families/. Families that are
+    already cached and fresh are not fetched again; unknown IDs are left out.
+    """
+    families = {}
+    if family_ids is not None:
+        with _lock:
+            _load_disk()
+            for family_id in family_ids:
+                cached = _cached(family_id)
+                if cached is not None:
+                    families[family_id] = cached
+        missing = [fid for fid in family_ids if fid not in families]
+        metrics.incr("family_cache_hits", len(families))
+        if not missing:
+            return families
+        found = storage.get_families(missing)
+    else:
+        found = storage.get_families()
+
+    fetched = {fid: _with_id(fid, data) for fid, data in found.items()}
+    metrics.incr("family_cache_misses", len(fetched))
+    _store(fetched)
+    families.update({fid: dict(data) for fid, data in fetched.items()})
+    return families
+
+
+def invalidate(family_id: str | None = None) -> None:
+    """Drop one family (or every family) from the cache."""
+    with _lock:
+        if family_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(family_id, None)
+        _save_disk()
+
+
+def watch_families():
+    """Keep the cache current from the backend's change feed for families.
+
+    Returns the watch. From then on cached entries don't expire, since every
+    change is pushed to the cache; meant for long-lived processes.
+    """
+    global _watching
+
+    def on_change(family_id: str, data: dict | None):
+        with _lock:
+            if data is None:
+                _cache.pop(family_id, None)
+            else:
+                _cache[family_id] = (time.time(), _with_id(family_id, data))
+            _save_disk()
+
+    watch = storage.watch_families(on_change)
+    _watching = True
+    return watch
+
+
+def list_family_ids() -> list[str]:
+    """List the IDs of every family."""
+    return storage.list_family_ids()
+
+
+def allow_shared_accounts(allowed: bool) -> None:
+    """Whether families without their own accounts may use the ACCOUNT_ENV ones.
+
+    Fine for a single-family deployment; multi-family entry points turn it
+    off so one family's calls and holds never land on another family's.
+    """
+    global _shared_accounts
+    _shared_accounts = allowed
+
+
+def account(family: dict, field: str) -> str:
+    """The family's own account setting (an ACCOUNT_ENV field), or its env fallback.
+
+    Secret fields are read from the env var the config names in <field>_env.
+    Raises RuntimeError when the family has none it may use.
+    """
+    if field in SECRET_FIELDS:
+        ref = family.get(f"{field}_env")
+        value = os.getenv(ref) if ref else None
+    else:
+        value = family.get(field)
+    if not value and _shared_accounts:
+        value = os.getenv(ACCOUNT_ENV[field])
+    if not value:
+        where = f"the env var its {field}_env names" if field in SECRET_FIELDS else "its config"
+        raise RuntimeError(f"Family '{family.get('family_id')}' has no {field} in {where}")
+    return value
+
+
+def missing_accounts(family: dict) -> list[str]:
+    """ACCOUNT_ENV fields the family can't run without."""
+    missing = []
+    for field in ACCOUNT_ENV:
+        try:
+            account(family, field)
+        except RuntimeError:
+            missing.append(field)
+    return missing
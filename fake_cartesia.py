@@ -0,0 +1,117 @@
+"""Local stand-in for the Cartesia API used by the pipeline.
+
+Serves GET /agents/calls (cursor-paginated synthetic completed calls) and
+POST /twilio/call/outbound (accepts and counts outbound calls).
+
+    uv run fake_cartesia.py --port 8766 --calls 40
+    CARTESIA_BASE_URL=http://127.0.0.1:8766 uv run notify_parent.py
+"""
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TOPICS = ["dinosaurs", "construction trucks", "space rockets", "tacos and dragons", "bugs"]
+
+
+def make_calls(count: int) -> list[dict]:
+    """Synthetic completed calls, newest first."""
+    now = datetime.now(timezone.utc)
+    calls = []
+    for i in range(count):
+        topic = TOPICS[i % len(TOPICS)]
+        calls.append({
+            "id": f"call_{count - i:05d}",
+            "status": "completed",
+            "start_time": (now - timedelta(hours=i)).isoformat().replace("+00:00", "Z"),
+            "summary": f"The kid asked lots of questions about {topic}.",
+            "transcript": [
+                {"role": "user", "text": f"Tell me about {topic}!"},
+                {"role": "assistant", "text": f"Sure, let's talk about {topic}."},
+            ],
+        })
+    return calls
+
+
+class CartesiaHandler(BaseHTTPRequestHandler):
+    calls: list[dict] = []
+    outbound: list[dict] = []
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.latency:
+            time.sleep(self.latency)
+        if url.path != "/agents/calls":
+            self._send(404, {"error": "not found"})
+            return
+        query = parse_qs(url.query)
+        limit = int(query.get("limit", ["20"])[0])
+        after = query.get("starting_after", [None])[0]
+        start = 0
+        if after:
+            ids = [c["id"] for c in self.calls]
+            start = ids.index(after) + 1 if after in ids else len(ids)
+        page = self.calls[start:start + limit]
+        has_more = start + limit < len(self.calls)
+        self._send(200, {
+            "data": page,
+            "has_more": has_more,
+            "next_page": page[-1]["id"] if page and has_more else None,
+        })
+
+    def do_POST(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if urlparse(self.path).path != "/twilio/call/outbound":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.outbound.append(body)
+        self._send(200, {"status": "queued", "call_id": f"out_{len(self.outbound):05d}"})
+
+    def _send(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 8766, calls: int = 20, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread. server.RequestHandlerClass.outbound
+    collects every outbound call request."""
+    handler = type("Handler", (CartesiaHandler,), {
+        "calls": make_calls(calls), "outbound": [], "latency": latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Cartesia API")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--calls", type=int, default=20, help="synthetic calls to serve")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+    server = serve(args.port, args.calls, args.latency)
+    print(f"Fake Cartesia at http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
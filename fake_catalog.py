@@ -0,0 +1,262 @@
+"""Local stand-in for the SFPL catalog gateway, serving fixtures.
+
+    uv run fake_catalog.py serve --port 8765
+    CATALOG_BASE_URL=http://127.0.0.1:8765/v2/libraries/sfpl uv run main.py
+
+    uv run fake_catalog.py record '"Dragons Love Tacos" by Adam Rubin' ...
+
+Search responses live in fixtures/catalog/search/<query-slug>.json and
+availability responses in fixtures/catalog/availability/<bib_id>.json. The
+checked-in fixtures are synthetic: hand-written in the gateway's response
+shape with made-up bib IDs (S93C1234567, ...), not recorded from the live
+catalog. `record` overwrites them with real responses.
+Queries with no fixture get an empty result list, which catalog.py treats as
+unresolved. --error-status makes every request fail with that status, to
+exercise the fallback to the agent.
+
+Under /site it also serves the same fixtures as plain HTML pages shaped like
+sfpl.org's (home, search results, a book's detail page with its pickup
+branches, the account's holds), for browser agents to walk in the offline
+benchmark:
+
+    /site                       home page with the search box
+    /site/search?query=...      search results
+    /site/bib/<bib_id>          detail page with availability and "Place a Hold"
+    /site/holds                 the holds page, one row per fixture book
+"""
+
+import argparse
+import html
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote_plus, urlparse
+
+from parsing import normalize_title, split_title_author
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "catalog")
+PREFIX = "/v2/libraries/sfpl"
+
+SITE = "/site"
+
+EMPTY_SEARCH = {"catalogSearch": {"results": []}, "entities": {"bibs": {}}}
+
+# Pickup locations listed on a detail page, as on sfpl.org.
+BRANCHES = [
+    "Main Library", "Anza", "Bayview/Linda Brooks-Burton", "Bernal Heights", "Chinatown/Him Mark Lai",
+    "Eureka Valley/Harvey Milk Memorial", "Excelsior", "Glen Park", "Golden Gate Valley", "Ingleside",
+    "Marina", "Merced", "Mission", "Mission Bay", "Noe Valley", "North Beach", "Ocean View",
+    "Ortega", "Park", "Parkside", "Portola", "Potrero", "Presidio", "Richmond/Senator Milton Marks",
+    "Sunset", "Visitacion Valley", "West Portal", "Western Addition",
+]
+
+
+def query_slug(query: str) -> str:
+    return normalize_title(query).replace(" ", "-")
+
+
+def fixture_path(kind: str, key: str) -> str:
+    return os.path.join(FIXTURE_DIR, kind, f"{key}.json")
+
+
+def load_fixture(kind: str, key: str) -> dict | None:
+    try:
+        with open(fixture_path(kind, key)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def find_search(query: str) -> dict:
+    """The search fixture for query, or for the first fixture it's a prefix of
+    (a title-only search finds its "title author" fixture)."""
+    slug = query_slug(query)
+    data = load_fixture("search", slug)
+    if data is None and slug:
+        names = sorted(os.listdir(os.path.join(FIXTURE_DIR, "search")))
+        match = next((n for n in names if n.startswith(slug)), None)
+        data = match and load_fixture("search", match[:-len(".json")])
+    return data or EMPTY_SEARCH
+
+
+def _bibs(search: dict) -> list[dict]:
+    bibs = search["entities"]["bibs"]
+    return [bibs[r["representative"]] for r in search["catalogSearch"]["results"] if r["representative"] in bibs]
+
+
+def search_page_url(query: str) -> str:
+    return f"{SITE}/search?query={quote_plus(query)}"
+
+
+def bib_page_url(title: str) -> str | None:
+    """/site/bib/<id> of the first search result for title, if any."""
+    bibs = _bibs(find_search(title))
+    return f"{SITE}/bib/{bibs[0]['id']}" if bibs else None
+
+
+def _page(title: str, body: str) -> str:
+    nav = "".join(
+        f'<li><a href="{SITE}/{href}">{label}</a></li>'
+        for href, label in [("", "Home"), ("search?query=", "Catalog"), ("holds", "My Account"),
+                            ("holds", "Holds"), ("", "Events"), ("", "Locations &amp; Hours"), ("", "Help")]
+    )
+    return f"""<!doctype html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)} | San Francisco Public Library</title></head>
+<body>
+<header><a href="{SITE}">San Francisco Public Library</a><nav><ul>{nav}</ul></nav>
+<form action="{SITE}/search" method="get" role="search">
+<label for="q">Search the catalog</label><input id="q" name="query" type="search"><button>Search</button>
+</form></header>
+<main><h1>{html.escape(title)}</h1>{body}</main>
+<footer><p>100 Larkin Street, San Francisco, CA 94102</p></footer>
+</body></html>"""
+
+
+def home_page() -> str:
+    return _page("Welcome", "<p>Search the catalog or sign in to see your holds.</p>"
+                            f'<p><a href="{SITE}/holds">Log In</a></p>')
+
+
+def search_page(query: str) -> str:
+    rows = "".join(
+        f'<li><a href="{SITE}/bib/{b["id"]}">{html.escape(b["briefInfo"]["title"])}</a>'
+        f' by {html.escape(", ".join(b["briefInfo"].get("authors", [])))}'
+        f' <span>Book ({html.escape(b["briefInfo"].get("format", ""))})</span></li>'
+        for b in _bibs(find_search(query))
+    )
+    return _page(f"Search results for {query}", f"<ol>{rows}</ol>" if rows else "<p>No results found.</p>")
+
+
+def bib_page(bib_id: str) -> str | None:
+    availability = load_fixture("availability", bib_id)
+    if availability is None:
+        return None
+    items = "".join(
+        f'<tr><td>{html.escape(item["branch"]["name"])}</td>'
+        f'<td>{html.escape(item["availability"]["statusType"].replace("_", " ").title())}</td></tr>'
+        for item in availability["entities"]["bibItems"].values()
+    )
+    options = "".join(f"<option>{html.escape(b)}</option>" for b in BRANCHES)
+    return _page(f"Catalog record {bib_id}", f"""<table><tr><th>Location</th><th>Status</th></tr>{items}</table>
+<form method="get" action="{SITE}/holds"><label for="branch">Pickup location</label>
+<select id="branch" name="branch">{options}</select><button>Place a Hold</button></form>""")
+
+
+def holds_page() -> str:
+    rows = []
+    for name in sorted(os.listdir(os.path.join(FIXTURE_DIR, "search"))):
+        for b in _bibs(load_fixture("search", name[:-len(".json")])):
+            rows.append(f'<tr><td><a href="{SITE}/bib/{b["id"]}">{html.escape(b["briefInfo"]["title"])}</a></td>'
+                        "<td>Ready for pickup</td><td>Noe Valley</td></tr>")
+    return _page("Holds", "<table><tr><th>Title</th><th>Status</th><th>Pickup location</th></tr>"
+                          + "".join(rows) + "</table>")
+
+
+class CatalogHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_status = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.removeprefix(PREFIX)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_status:
+            self._send(self.error_status, {"error": "injected"})
+            return
+
+        if path == SITE or path.startswith(SITE + "/"):
+            self._send_site(path.removeprefix(SITE), parse_qs(url.query))
+        elif path == "/bibs/search":
+            query = parse_qs(url.query).get("query", [""])[0]
+            self._send(200, load_fixture("search", query_slug(query)) or EMPTY_SEARCH)
+        elif path.startswith("/bibs/") and path.endswith("/availability"):
+            bib_id = path.split("/")[2]
+            data = load_fixture("availability", bib_id)
+            self._send(200 if data else 404, data or {"error": "not found"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _send_site(self, page: str, query: dict) -> None:
+        if page in ("", "/"):
+            body = home_page()
+        elif page == "/search":
+            body = search_page(query.get("query", [""])[0])
+        elif page.startswith("/bib/"):
+            body = bib_page(page.removeprefix("/bib/"))
+        elif page == "/holds":
+            body = holds_page()
+        else:
+            body = None
+        self._send(200 if body else 404, body or _page("Page not found", ""), "text/html; charset=utf-8")
+
+    def _send(self, status: int, body: dict | str, content_type: str = "application/json") -> None:
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 8765, latency: float = 0.0, error_status: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in catalog on a background thread and return the server."""
+    import threading
+
+    handler = type("Handler", (CatalogHandler,), {"latency": latency, "error_status": error_status})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def record(books: list[str]) -> None:
+    """Fetch live catalog responses for each book and save them as fixtures."""
+    import catalog
+
+    for book in books:
+        title, author = split_title_author(book)
+        query = f"{title} {author}".strip()
+        data = catalog._get("/bibs/search", {"query": query, "searchType": "keyword"})
+        _write("search", query_slug(query), data)
+        bib_id = catalog.search(title, author)
+        if bib_id:
+            _write("availability", bib_id, catalog._get(f"/bibs/{bib_id}/availability"))
+        print(f'Recorded "{title}" ({bib_id or "no match"})')
+
+
+def _write(kind: str, key: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(fixture_path(kind, key)), exist_ok=True)
+    with open(fixture_path(kind, key), "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the SFPL catalog")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_cmd = sub.add_parser("serve", help="serve fixtures over HTTP")
+    serve_cmd.add_argument("--port", type=int, default=8765)
+    serve_cmd.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    serve_cmd.add_argument("--error-status", type=int, default=0, help="fail every request with this status")
+    record_cmd = sub.add_parser("record", help="record live responses as fixtures")
+    record_cmd.add_argument("books", nargs="+", help='"Title" by Author')
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.books)
+        return
+
+    server = serve(args.port, args.latency, args.error_status)
+    print(f"Fake catalog at http://127.0.0.1:{args.port}{PREFIX}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
 import os
+from typing import TYPE_CHECKING
 
-from google.cloud import firestore
+import metrics
+
+# google.cloud.firestore takes a noticeable share of a cold start; it is
+# imported on the first get_db() call instead of at module load.
+if TYPE_CHECKING:
+    from google.cloud import firestore
 
 os.environ.setdefault(
     "GOOGLE_APPLICATION_CREDENTIALS",
@@ -9,11 +15,42 @@ os.environ.setdefault(
 
 PROJECT_ID = "o-phone-c0b25"
 
+# Firestore rejects commits with more than 500 writes.
+BATCH_LIMIT = 500
+
 _client = None
 
 
-def get_db() -> firestore.Client:
+def get_db() -> "firestore.Client":
     global _client
     if _client is None:
+        from google.cloud import firestore
+
         _client = firestore.Client(project=PROJECT_ID)
     return _client
+
+
+def commit_writes(writes: list[tuple]) -> int:
+    """Commit (op, doc_ref, data) writes in as few WriteBatches as possible.
+
+    op is "set", "merge" (set with merge=True), "update" or "delete" (data is
+    ignored for deletes). Writes that fit in one batch are applied atomically;
+    longer lists are split at BATCH_LIMIT and each chunk is atomic on its own.
+    Returns the number of commits (round trips) made.
+    """
+    db = get_db()
+    commits = 0
+    for start in range(0, len(writes), BATCH_LIMIT):
+        batch = db.batch()
+        for op, ref, data in writes[start:start + BATCH_LIMIT]:
+            if op == "delete":
+                batch.delete(ref)
+            elif op == "merge":
+                batch.set(ref, data, merge=True)
+            else:
+                getattr(batch, op)(ref, data)
+        batch.commit()
+        metrics.incr("firestore_writes", len(writes[start:start + BATCH_LIMIT]))
+        metrics.incr("firestore_commits")
+        commits += 1
+    return commits
@@ -0,0 +1,402 @@
+"""Firestore storage backend (see storage.py).
+
+Layout:
+
+    families/{family_id}                          family config
+        summaries/{doc_id}                        call summaries
+        recommendations/{doc_id}                  recommendations
+        status_events/{seq:012d}                  status change log
+        search_runs/{auto}                        search stage runs
+        sync_state/{name}                         per-family state; also
+                                                  book_history and the
+                                                  status_events counter
+    pending_calls/{phone_number}                  voice agent context
+    hold_stats/{branch}, dispatch_state/notify    global documents
+
+Queries rely on the indexes in firestore.indexes.json.
+"""
+
+from datetime import datetime, timezone
+
+import metrics
+from firestore_client import BATCH_LIMIT, commit_writes, get_db
+
+EVENTS = "status_events"
+BOOK_HISTORY = "book_history"
+
+
+def _family_ref(family_id: str):
+    return get_db().collection("families").document(family_id)
+
+
+def _recs_ref(family_id: str):
+    return _family_ref(family_id).collection("recommendations")
+
+
+def _state_ref(family_id: str, name: str):
+    return _family_ref(family_id).collection("sync_state").document(name)
+
+
+def _family_of(doc) -> str:
+    return doc.reference.parent.parent.id
+
+
+# Families
+
+def get_families(family_ids: list[str] | None = None) -> dict[str, dict]:
+    families_ref = get_db().collection("families")
+    if family_ids is None:
+        docs = families_ref.stream()
+    elif len(family_ids) == 1:
+        docs = [families_ref.document(family_ids[0]).get()]
+    else:
+        docs = get_db().get_all([families_ref.document(fid) for fid in family_ids])
+    families = {doc.id: doc.to_dict() for doc in docs if doc.exists}
+    metrics.incr("firestore_reads", max(len(families), 1))
+    return families
+
+
+def list_family_ids() -> list[str]:
+    ids = sorted(ref.id for ref in get_db().collection("families").list_documents())
+    metrics.incr("firestore_reads", max(len(ids), 1))
+    return ids
+
+
+def put_family(family_id: str, data: dict) -> None:
+    commit_writes([("set", _family_ref(family_id), data)])
+
+
+def watch_families(on_change):
+    def on_snapshot(docs, changes, read_time):
+        for change in changes:
+            doc = change.document
+            on_change(doc.id, None if change.type.name == "REMOVED" else doc.to_dict())
+
+    return get_db().collection("families").on_snapshot(on_snapshot)
+
+
+# Call summaries
+
+def existing_call_ids(family_id: str, call_ids: list[str]) -> set[str]:
+    existing = set()
+    if not call_ids:
+        return existing
+    summaries_ref = _family_ref(family_id).collection("summaries")
+    for snap in get_db().get_all([summaries_ref.document(cid) for cid in call_ids], field_paths=["call_id"]):
+        if snap.exists:
+            existing.add(snap.id)
+    metrics.incr("firestore_reads", len(call_ids))
+    # "in" filters accept at most 30 values
+    for start in range(0, len(call_ids), 30):
+        chunk = call_ids[start:start + 30]
+        docs = list(summaries_ref.where("call_id", "in", chunk).select(["call_id"]).stream())
+        metrics.incr("firestore_reads", max(len(docs), 1))
+        existing.update(doc.to_dict()["call_id"] for doc in docs)
+    return existing
+
+
+def add_summaries(family_id: str, summaries: dict[str, dict]) -> None:
+    summaries_ref = _family_ref(family_id).collection("summaries")
+    commit_writes([("set", summaries_ref.document(doc_id), data) for doc_id, data in summaries.items()])
+
+
+def latest_summaries(family_id: str, limit: int, fields: list[str]) -> list[dict]:
+    docs = (
+        _family_ref(family_id).collection("summaries")
+        .order_by("created_at", direction="DESCENDING")
+        .limit(limit)
+        .select(fields)
+        .stream()
+    )
+    summaries = [doc.to_dict() for doc in docs]
+    metrics.incr("firestore_reads", max(len(summaries), 1))
+    return summaries
+
+
+# Recommendations
+
+def load_recommendations(
+    family_id: str,
+    statuses: list[str] | None,
+    fields: list[str] | None = None,
+    newest_first: bool = False,
+) -> list[dict]:
+    query = _recs_ref(family_id)
+    if statuses is not None and len(statuses) == 1:
+        query = query.where("status", "==", statuses[0])
+    elif statuses is not None:
+        query = query.where("status", "in", statuses)
+    if fields is not None:
+        query = query.select(sorted({*fields, "status"}))
+    if newest_first:
+        query = query.order_by("updated_at", direction="DESCENDING")
+
+    recs = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        data["doc_id"] = doc.id
+        recs.append(data)
+    # a query is billed at least one read even when it matches nothing
+    metrics.incr("firestore_reads", max(len(recs), 1))
+    return recs
+
+
+def get_recommendations(family_id: str, doc_ids: list[str], fields: list[str]) -> dict[str, dict]:
+    if not doc_ids:
+        return {}
+    recs_ref = _recs_ref(family_id)
+    snaps = get_db().get_all([recs_ref.document(doc_id) for doc_id in doc_ids], field_paths=fields)
+    metrics.incr("firestore_reads", len(doc_ids))
+    return {snap.id: snap.to_dict() for snap in snaps if snap.exists}
+
+
+def write_recommendations(
+    family_id: str,
+    updates: dict[str, dict],
+    creates: dict[str, dict],
+    deletes: list[str],
+    events: list[dict],
+    history: dict[str, dict],
+) -> None:
+    recs_ref = _recs_ref(family_id)
+    writes = [("delete", recs_ref.document(doc_id), None) for doc_id in deletes]
+    writes += [("set", recs_ref.document(doc_id), data) for doc_id, data in creates.items()]
+    writes += [("update", recs_ref.document(doc_id), data) for doc_id, data in updates.items()]
+    if history:
+        writes.append(("merge", _state_ref(family_id, BOOK_HISTORY), {"books": history}))
+    if events:
+        _commit_with_events(family_id, writes, events)
+    elif writes:
+        commit_writes(writes)
+
+
+def _commit_with_events(family_id: str, writes: list[tuple], events: list[dict]) -> int:
+    """Apply writes and append events in as few transactions as possible. Returns the last seq.
+
+    seq comes from sync_state/status_events.last_seq and is assigned in the
+    same transaction as the events, so seqs increase without gaps. A write
+    and the events for its document always commit together, so the log never
+    disagrees with the statuses; past BATCH_LIMIT operations the rest go in
+    further transactions, each atomic on its own (as in commit_writes).
+    """
+    units = _event_units(writes, events)
+    chunks = [[]]
+    for unit in units:
+        # one slot per transaction goes to the counter
+        if chunks[-1] and sum(map(len, chunks[-1])) + len(unit) > BATCH_LIMIT - 1:
+            chunks.append([])
+        chunks[-1].append(unit)
+    last = 0
+    for chunk in chunks:
+        last = _transact_with_events(family_id, [op for unit in chunk for op in unit])
+    return last
+
+
+def _event_units(writes: list[tuple], events: list[dict]) -> list[list[tuple]]:
+    """Group writes with the events of the document they write, as ("event", None, e) ops."""
+    by_doc: dict[str, list[tuple]] = {}
+    for e in events:
+        by_doc.setdefault(e["doc_id"], []).append(("event", None, e))
+    units = []
+    for write in writes:
+        ref = write[1]
+        own = by_doc.pop(ref.id, []) if ref.parent.id == "recommendations" else []
+        units.append([write, *own])
+    units += [[op] for ops in by_doc.values() for op in ops]
+    if len(max(units, key=len)) > BATCH_LIMIT - 1:
+        raise ValueError(f"More than {BATCH_LIMIT - 1} status events for one recommendation")
+    return units
+
+
+def _transact_with_events(family_id: str, ops: list[tuple]) -> int:
+    from google.cloud import firestore
+
+    counter = _state_ref(family_id, EVENTS)
+    events_ref = _family_ref(family_id).collection(EVENTS)
+
+    @firestore.transactional
+    def apply(transaction) -> int:
+        snap = counter.get(transaction=transaction)
+        seq = snap.to_dict().get("last_seq", 0) if snap.exists else 0
+        now = datetime.now(timezone.utc)
+        for op, ref, data in ops:
+            if op == "event":
+                seq += 1
+                transaction.set(events_ref.document(f"{seq:012d}"), {**data, "seq": seq, "at": now})
+            elif op == "delete":
+                transaction.delete(ref)
+            elif op == "merge":
+                transaction.set(ref, data, merge=True)
+            else:
+                getattr(transaction, op)(ref, data)
+        transaction.set(counter, {"last_seq": seq})
+        return seq
+
+    last = apply(get_db().transaction())
+    metrics.incr("firestore_reads")
+    metrics.incr("firestore_writes", len(ops) + 1)
+    metrics.incr("firestore_commits")
+    return last
+
+
+def families_with_status(statuses: list[str]) -> set[str]:
+    docs = (
+        get_db().collection_group("recommendations")
+        .where("status", "in", statuses)
+        .select(["status"])
+        .stream()
+    )
+    family_ids = {_family_of(doc) for doc in docs}
+    metrics.incr("firestore_reads", max(len(family_ids), 1))
+    return family_ids
+
+
+# Status events
+
+def last_event_seq(family_id: str) -> int:
+    return get_state(family_id, EVENTS).get("last_seq", 0)
+
+
+def events_since(family_id: str, cursor: int, limit: int | None = None) -> list[dict]:
+    query = (
+        _family_ref(family_id).collection(EVENTS)
+        .where("seq", ">", cursor)
+        .order_by("seq")
+    )
+    if limit:
+        query = query.limit(limit)
+    events = [doc.to_dict() for doc in query.stream()]
+    metrics.incr("firestore_reads", max(len(events), 1))
+    return events
+
+
+def event_history(family_id: str, doc_id: str) -> list[dict]:
+    docs = (
+        _family_ref(family_id).collection(EVENTS)
+        .where("doc_id", "==", doc_id)
+        .order_by("seq")
+        .stream()
+    )
+    events = [doc.to_dict() for doc in docs]
+    metrics.incr("firestore_reads", max(len(events), 1))
+    return events
+
+
+def families_with_event(status: str, since: datetime) -> set[str]:
+    docs = (
+        get_db().collection_group(EVENTS)
+        .where("status", "==", status)
+        .where("at", ">", since)
+        .select(["seq"])
+        .stream()
+    )
+    family_ids = {_family_of(doc) for doc in docs}
+    metrics.incr("firestore_reads", max(len(family_ids), 1))
+    return family_ids
+
+
+# Book history
+
+def load_book_history(family_id: str) -> dict[str, dict] | None:
+    doc = _state_ref(family_id, BOOK_HISTORY).get()
+    metrics.incr("firestore_reads")
+    data = doc.to_dict() if doc.exists else {}
+    # Status writes merge entries into the doc before any rebuild; only
+    # put_book_history sets built_at
+    if not data.get("built_at"):
+        return None
+    return data.get("books", {})
+
+
+def put_book_history(family_id: str, books: dict[str, dict]) -> None:
+    data = {"books": books, "built_at": datetime.now(timezone.utc)}
+    commit_writes([("set", _state_ref(family_id, BOOK_HISTORY), data)])
+
+
+# Pending calls
+
+def put_pending_call(phone_number: str, data: dict) -> None:
+    from google.cloud import firestore
+
+    get_db().collection("pending_calls").document(phone_number).set({
+        **data,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    })
+    metrics.incr("firestore_writes")
+
+
+# Per-family state
+
+def get_state(family_id: str, name: str) -> dict:
+    doc = _state_ref(family_id, name).get()
+    metrics.incr("firestore_reads")
+    return doc.to_dict() if doc.exists else {}
+
+
+def get_states(family_ids: list[str], name: str) -> dict[str, dict]:
+    if not family_ids:
+        return {}
+    snaps = get_db().get_all([_state_ref(fid, name) for fid in family_ids])
+    metrics.incr("firestore_reads", len(family_ids))
+    return {_family_of(snap): snap.to_dict() for snap in snaps if snap.exists}
+
+
+def set_state(family_id: str, name: str, data: dict, merge: bool = False) -> None:
+    commit_writes([("merge" if merge else "set", _state_ref(family_id, name), data)])
+
+
+def delete_state(family_id: str, name: str) -> None:
+    commit_writes([("delete", _state_ref(family_id, name), None)])
+
+
+def families_with_state(name: str, field: str) -> set[str]:
+    # Every family's sync_state docs share the collection group, so the field
+    # is only indexed on the ones that set it (see firestore.indexes.json).
+    docs = (
+        get_db().collection_group("sync_state")
+        .where(field, ">", 0)
+        .select([field])
+        .stream()
+    )
+    family_ids = {_family_of(doc) for doc in docs if doc.id == name}
+    metrics.incr("firestore_reads", max(len(family_ids), 1))
+    return family_ids
+
+
+def add_search_run(family_id: str, run: dict) -> None:
+    commit_writes([("set", _family_ref(family_id).collection("search_runs").document(), run)])
+
+
+# Global documents
+
+def get_docs(collection: str, doc_ids: list[str]) -> dict[str, dict]:
+    if not doc_ids:
+        return {}
+    collection_ref = get_db().collection(collection)
+    snaps = get_db().get_all([collection_ref.document(doc_id) for doc_id in doc_ids])
+    metrics.incr("firestore_reads", len(doc_ids))
+    return {snap.id: snap.to_dict() for snap in snaps if snap.exists}
+
+
+def set_docs(collection: str, docs: dict[str, dict]) -> None:
+    collection_ref = get_db().collection(collection)
+    commit_writes([("set", collection_ref.document(doc_id), data) for doc_id, data in docs.items()])
+
+
+def update_docs(collection: str, doc_ids: list[str], apply) -> None:
+    from google.cloud import firestore
+
+    collection_ref = get_db().collection(collection)
+
+    @firestore.transactional
+    def run(transaction) -> int:
+        snaps = transaction.get_all([collection_ref.document(doc_id) for doc_id in doc_ids])
+        docs = apply({snap.id: snap.to_dict() for snap in snaps if snap.exists})
+        for doc_id, data in docs.items():
+            transaction.set(collection_ref.document(doc_id), data)
+        return len(docs)
+
+    written = run(get_db().transaction())
+    metrics.incr("firestore_reads", len(doc_ids))
+    metrics.incr("firestore_writes", written)
+    metrics.incr("firestore_commits")
@@ -1,36 +1,33 @@
+import argparse
 import asyncio
 import os
-from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 
-from browser_use import Agent, Browser
-from browser_use.llm import ChatAnthropic
 from dotenv import load_dotenv
 
-from config import load_family
-from firestore_client import get_db
+import agent_cache
+import hold_timing
+import metrics
+import recommendations
+from browser_pool import SFPL_SITE, step_throttle
+from config import DEFAULT_FAMILY_ID, load_family
+from models import agent_limits, max_steps, run_validated
+from parsing import normalize_title, parse_hold_results
+from sessions import agent_kwargs, is_logged_in, login_step, run, session, sfpl_credentials, sfpl_sensitive_data
+
+if TYPE_CHECKING:
+    from browser_use import Tools
 
 load_dotenv()
 
-SFPL_USERNAME = os.environ["SFPL_USERNAME"]
-SFPL_PASSWORD = os.environ["SFPL_PASSWORD"]
+# Books per hold agent when fanning out; 0 runs one agent over every book.
+HOLD_GROUP_SIZE = int(os.getenv("HOLD_GROUP_SIZE", "0"))
 
 
-def load_recommendations(family_id: str) -> list[dict]:
-    """Load recommendations with status 'recommended' from Firestore."""
-    db = get_db()
-    docs = (
-        db.collection("families")
-        .document(family_id)
-        .collection("recommendations")
-        .where("status", "==", "recommended")
-        .stream()
-    )
-    recs = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["doc_id"] = doc.id
-        recs.append(data)
-    return recs
+def load_recommendations(family_id: str, retry_failed: bool = False) -> list[dict]:
+    """Load recommendations still waiting for a hold (optionally retrying failed ones)."""
+    statuses = ["recommended", "hold_failed"] if retry_failed else ["recommended"]
+    return recommendations.load(family_id, statuses, fields=["title", "author"])
 
 
 def format_books_for_prompt(recs: list[dict]) -> str:
@@ -41,31 +38,73 @@ def format_books_for_prompt(recs: list[dict]) -> str:
     return "\n".join(lines)
 
 
-def update_statuses_after_hold(family_id: str, recs: list[dict]) -> None:
-    """Update all recommendation docs to hold_placed after the agent runs."""
-    db = get_db()
-    now = datetime.now(timezone.utc)
+def match_rec(recs: list[dict], title: str) -> dict | None:
+    """Find the rec the agent means by title, tolerating subtitles and punctuation."""
+    wanted = normalize_title(title)
     for rec in recs:
-        db.collection("families").document(family_id).collection(
-            "recommendations"
-        ).document(rec["doc_id"]).update({
-            "status": "hold_placed",
-            "updated_at": now,
-        })
-    print(f"Updated {len(recs)} recommendations to hold_placed")
+        have = normalize_title(rec["title"])
+        if have == wanted or wanted.startswith(have + " ") or have.startswith(wanted + " "):
+            return rec
+    return None
+
+
+def record_outcome(family_id: str, rec: dict, placed: bool, branch: str = "", reason: str = "") -> None:
+    """Checkpoint one book's hold outcome to Firestore as soon as it's known."""
+    if placed:
+        recommendations.set_status(family_id, rec["doc_id"], "hold_placed", rec, pickup_branch=branch)
+        print(f'  "{rec["title"]}": hold placed')
+    else:
+        recommendations.set_status(family_id, rec["doc_id"], "hold_failed", rec, hold_error=reason)
+        print(f'  "{rec["title"]}": hold failed ({reason})')
 
 
-def build_task(books_text: str, preferred_branch: str) -> str:
+def build_tools(family_id: str, recs: list[dict], recorded: set[str]) -> "Tools":
+    """Agent tools with a per-book checkpoint action. Adds doc_ids to recorded."""
+    from browser_use import ActionResult, Tools
+
+    tools = Tools()
+
+    @tools.action(
+        "Record the outcome of ONE hold attempt right after you finish that book. "
+        "placed is true if the hold went through (or the book was already on hold); "
+        "detail is the pickup branch when placed, otherwise the reason it failed."
+    )
+    async def record_hold_result(title: str, placed: bool, detail: str) -> ActionResult:
+        rec = match_rec(recs, title)
+        if rec is None:
+            return ActionResult(error=f'"{title}" is not one of the books to place holds on')
+        branch, reason = (detail, "") if placed else ("", detail)
+        await asyncio.to_thread(record_outcome, family_id, rec, placed, branch, reason)
+        recorded.add(rec["doc_id"])
+        memory = f'Recorded hold result for "{rec["title"]}"'
+        return ActionResult(extracted_content=memory, long_term_memory=memory)
+
+    return tools
+
+
+def update_statuses_after_hold(family_id: str, recs: list[dict], agent_text: str, recorded: set[str]) -> None:
+    """Checkpoint any HOLD RESULTS the agent reported but never recorded.
+
+    Books with no reported outcome keep their status, so the next run retries them.
+    """
+    for result in parse_hold_results(agent_text):
+        rec = match_rec(recs, result["title"])
+        if rec is None or rec["doc_id"] in recorded:
+            continue
+        record_outcome(family_id, rec, result["placed"], result["branch"], result["reason"])
+        recorded.add(rec["doc_id"])
+    missing = len(recs) - len(recorded)
+    print(f"Recorded hold results for {len(recorded)}/{len(recs)} books"
+          + (f"; {missing} left for the next run" if missing else ""))
+
+
+def build_task(family: dict, books_text: str) -> str:
+    preferred_branch = family["preferred_branch"]
     return f"""\
 You need to log into the San Francisco Public Library website and place holds on books.
 
 ## STEP 1 — Log in
-Go to https://sfpl.org and log in:
-- Click "Log In" in the top navigation
-- Username/Barcode: {SFPL_USERNAME}
-- Password/PIN: {SFPL_PASSWORD}
-- After logging in, confirm you see your account (e.g. your name or "My Account").
-  If login fails, report the error and call "done" immediately.
+{login_step(sfpl_credentials(family)[0])}
 
 ## STEP 2 — Place holds on these books
 {books_text}
@@ -76,10 +115,11 @@ b) Click into the correct book from the results.
 c) Click the "Place a Hold" button (or similar).
 d) If it asks you to choose a pickup location, select "{preferred_branch}" as the branch.
 e) Confirm the hold was placed successfully.
-f) Move on to the next book.
+f) Call "record_hold_result" for this book straight away.
+g) Move on to the next book.
 
-If a hold can't be placed (already on hold, not available, etc.), note the reason
-and move on.
+If a hold can't be placed (already on hold, not available, etc.), record the
+reason with "record_hold_result" and move on.
 
 ## STEP 3 — Report results (this is the ONLY time you should call "done")
 After attempting all books, call "done" with a summary:
@@ -93,11 +133,88 @@ Do NOT call "done" until you have attempted holds for all books.
 """
 
 
-async def main():
-    family = load_family()
+async def place_holds(family: dict, recs: list[dict], recorded: set[str]) -> str:
+    """Run one agent over recs in a warm logged-in browser on the family's card; returns its HOLD RESULTS text.
+
+    If the stage's model neither records nor reports every book, the books
+    still unaccounted for are retried on its escalation model (when it has one).
+    """
+    from browser_use import Agent
+
+    family_id = family["family_id"]
+    username, _ = sfpl_credentials(family)
+    secrets = sfpl_sensitive_data(family)
+    texts: list[str] = []
+
+    def accounted_for() -> set[str]:
+        reported = (match_rec(recs, r["title"]) for r in parse_hold_results("\n".join(texts)))
+        return recorded | {rec["doc_id"] for rec in reported if rec}
+
+    async def attempt(llm) -> str:
+        done = accounted_for()
+        todo = [rec for rec in recs if rec["doc_id"] not in done]
+        task = build_task(family, format_books_for_prompt(todo))
+
+        async def run_live(on_step) -> str:
+            async with session(username) as browser:
+                tools = build_tools(family_id, todo, recorded)
+                agent = Agent(
+                    task=task, llm=llm, browser=browser, tools=tools, sensitive_data=secrets,
+                    register_new_step_callback=on_step,
+                    **agent_kwargs(), **agent_limits("hold"),
+                )
+                result = await agent.run(max_steps=max_steps("hold"), on_step_start=step_throttle(SFPL_SITE))
+            metrics.record_agent(result, agent="hold")
+            return result.final_result() or ""
+
+        texts.append(await agent_cache.run_agent("hold", task, llm, run_live))
+        return "\n".join(texts)
+
+    doc_ids = {rec["doc_id"] for rec in recs}
+    return await run_validated("hold", attempt, lambda _: doc_ids <= accounted_for())
+
+
+async def place_holds_parallel(family: dict, recs: list[dict], recorded: set[str], group_size: int) -> str:
+    """Fan recs out to one short-lived agent per group of group_size books.
+
+    Every agent gets its own browser from the sessions pool, sharing the saved
+    SFPL login; browser_pool caps how many run at once. If nobody is logged
+    in yet, the first group runs alone so the rest start from its session;
+    like any other group, its failure is logged and the rest still run.
+    """
+    groups = [recs[i:i + group_size] for i in range(0, len(recs), group_size)]
+    username, _ = sfpl_credentials(family)
+    results: list = []
+    if not is_logged_in(username):
+        try:
+            results.append(await place_holds(family, groups[0], recorded))
+        except Exception as e:
+            results.append(e)
+
+    results += await asyncio.gather(
+        *(place_holds(family, group, recorded) for group in groups[len(results):]),
+        return_exceptions=True,
+    )
+    texts = []
+    for group, result in zip(groups, results):
+        if isinstance(result, BaseException):
+            titles = ", ".join(f'"{rec["title"]}"' for rec in group)
+            print(f"Hold agent for {titles} failed: {result!r}")
+            continue
+        texts.append(result)
+    return "\n".join(texts)
+
+
+async def main(
+    family_id: str = DEFAULT_FAMILY_ID, retry_failed: bool = False, group_size: int = HOLD_GROUP_SIZE
+):
+    """Place holds for a family. group_size > 0 splits the books across parallel agents."""
+    family = load_family(family_id)
     family_id = family.get("family_id", "leo")
 
-    recs = load_recommendations(family_id)
+    # Books checkpointed as hold_placed by an earlier (possibly crashed) run
+    # are not loaded again, so a rerun only redoes unfinished work.
+    recs = load_recommendations(family_id, retry_failed)
     if not recs:
         print("No recommendations with status 'recommended' found. Nothing to hold.")
         return
@@ -106,20 +223,29 @@ async def main():
     for rec in recs:
         print(f'  - "{rec["title"]}" by {rec["author"]}')
 
-    books_text = format_books_for_prompt(recs)
-    task = build_task(books_text, family["preferred_branch"])
-
-    browser = Browser()
-    llm = ChatAnthropic(model="claude-sonnet-4-5-20250929")
-
-    agent = Agent(task=task, llm=llm, browser=browser)
-    result = await agent.run()
-
-    hold_results = result.final_result()
+    recorded: set[str] = set()
+    if group_size > 0 and len(recs) > group_size:
+        hold_results = await place_holds_parallel(family, recs, recorded, group_size)
+    else:
+        hold_results = await place_holds(family, recs, recorded)
     print(hold_results)
 
-    update_statuses_after_hold(family_id, recs)
+    update_statuses_after_hold(family_id, recs, hold_results, recorded)
+
+    placed = recommendations.load(
+        family_id, ["hold_placed"], fields=["branch", "pickup_branch", "updated_at", "hold_placed_at"]
+    )
+    hold_timing.pull_forward(family_id, placed)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Place SFPL holds on recommended books")
+    parser.add_argument("--family", default=DEFAULT_FAMILY_ID)
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="also retry books whose hold previously failed")
+    parser.add_argument("--group-size", type=int, default=HOLD_GROUP_SIZE,
+                        help="books per parallel agent (0 = one agent for all books)")
+    args = parser.parse_args()
+    with metrics.stage("hold", args.family):
+        run(main(args.family, args.retry_failed, args.group_size))
+    metrics.export()
@@ -0,0 +1,188 @@
+"""Learned hold transit times, used to schedule hold syncs.
+
+Recommendations stamp <status>_at whenever their status changes, and every
+change is logged in status_events. Each time a sync sees a hold move on from
+hold_placed or in_transit, the time it spent in that status is added to
+hold_stats/{branch} (and hold_stats/_all), keeping the newest MAX_SAMPLES
+per status. The time runs from when the status_events log says the hold
+entered the status to the midpoint between the last sync that still saw it
+there and now (see transitions()).
+
+A hold can't plausibly change before it has spent the EARLY_QUANTILE of its
+branch's observed time in its current status, so a family's next sync is
+the earliest such moment across its active holds, clamped to
+[SYNC_MIN_INTERVAL, SYNC_MAX_INTERVAL] from now. It's stored in the family's
+"holds" state.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import status_events
+import storage
+
+# status -> the status a hold moves to next
+NEXT_STATUS = {"hold_placed": "in_transit", "in_transit": "ready"}
+
+# Assumed time in each status until a branch has MIN_SAMPLES observations.
+PRIOR_HOURS = {"hold_placed": 12.0, "in_transit": 12.0}
+ALL_BRANCHES = "_all"
+MIN_SAMPLES = 5
+MAX_SAMPLES = 100
+EARLY_QUANTILE = 0.1
+
+SYNC_MIN_INTERVAL = timedelta(hours=float(os.getenv("SYNC_MIN_INTERVAL_HOURS", "1")))
+SYNC_MAX_INTERVAL = timedelta(hours=float(os.getenv("SYNC_MAX_INTERVAL_HOURS", "24")))
+
+
+def branch_of(rec: dict) -> str:
+    return rec.get("pickup_branch") or rec.get("branch") or ALL_BRANCHES
+
+
+def entered_at(rec: dict) -> datetime | None:
+    """When the rec entered its current status."""
+    return rec.get(f"{rec.get('status')}_at") or rec.get("updated_at")
+
+
+def later_statuses(status: str) -> list[str]:
+    """The statuses a hold in status can still move on to, in order."""
+    later = []
+    while status in NEXT_STATUS:
+        status = NEXT_STATUS[status]
+        later.append(status)
+    return later
+
+
+def status_entered(family_id: str, rec: dict) -> datetime | None:
+    """When rec entered its current status, per the status_events log
+    (falling back to its own <status>_at stamp)."""
+    times = [e["at"] for e in status_events.history(family_id, rec["doc_id"]) if e.get("status") == rec.get("status")]
+    return times[-1] if times else entered_at(rec)
+
+
+def transitions(
+    family_id: str, recs: list[dict], changes: dict[str, str], synced_at: datetime | None, now: datetime
+) -> list[tuple[str, str, float]]:
+    """(branch, from_status, seconds) for each rec that has moved on from its status.
+
+    The hold left its status some time between the last sync that still saw
+    it there (synced_at, or its entry if no sync has) and now; the midpoint
+    is a fairer exit time than now, which would add up to a whole sync
+    interval to every sample. A hold that skipped a status (hold_placed
+    straight to ready) still gives its hold_placed sample; how long it spent
+    in the skipped status is unknown, so nothing is recorded for that.
+    """
+    found = []
+    for rec in recs:
+        new_status = changes.get(rec["doc_id"])
+        if new_status not in later_statuses(rec.get("status")):
+            continue
+        since = status_entered(family_id, rec)
+        if since is None:
+            continue
+        last_seen = max(synced_at, since) if synced_at else since
+        left = last_seen + (now - last_seen) / 2
+        found.append((branch_of(rec), rec["status"], (left - since).total_seconds()))
+    return found
+
+
+def _stats_id(branch: str) -> str:
+    return branch.replace("/", "_")
+
+
+def load_stats(branches: set[str]) -> dict[str, dict[str, list[float]]]:
+    """{branch: {status: [seconds spent in status, oldest first]}} for branches (plus _all)."""
+    ids = {_stats_id(b): b for b in branches | {ALL_BRANCHES}}
+    docs = storage.get_docs("hold_stats", list(ids))
+    return {branch: docs.get(doc_id, {}) for doc_id, branch in ids.items()}
+
+
+def record_transitions(transitions: list[tuple[str, str, float]]) -> None:
+    """Add (branch, from_status, seconds) observations to the per-branch stats.
+
+    The stats are read and rewritten in one transaction, so families syncing
+    at the same time don't drop each other's samples.
+    """
+    if not transitions:
+        return
+    doc_ids = {_stats_id(b) for b, _, _ in transitions} | {_stats_id(ALL_BRANCHES)}
+
+    def add(docs: dict[str, dict]) -> dict[str, dict]:
+        stats = {doc_id: {status: list(s) for status, s in data.items()} for doc_id, data in docs.items()}
+        for branch, status, seconds in transitions:
+            for doc_id in {_stats_id(branch), _stats_id(ALL_BRANCHES)}:
+                samples = stats.setdefault(doc_id, {}).setdefault(status, [])
+                samples.append(seconds)
+                del samples[:-MAX_SAMPLES]
+        return stats
+
+    storage.update_docs("hold_stats", sorted(doc_ids), add)
+
+
+def quantile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def earliest_change(rec: dict, stats: dict, now: datetime) -> datetime:
+    """Earliest time rec's status could plausibly move on."""
+    status = rec.get("status")
+    since = entered_at(rec) or now
+    samples = stats.get(branch_of(rec), {}).get(status, [])
+    if len(samples) < MIN_SAMPLES:
+        samples = stats.get(ALL_BRANCHES, {}).get(status, [])
+    if len(samples) >= MIN_SAMPLES:
+        wait = timedelta(seconds=quantile(samples, EARLY_QUANTILE))
+    else:
+        wait = timedelta(hours=PRIOR_HOURS.get(status, 0.0))
+    return since + wait
+
+
+def next_sync_at(recs: list[dict], stats: dict, now: datetime) -> datetime:
+    """When to next look at these active holds."""
+    earliest = min((earliest_change(rec, stats, now) for rec in recs), default=now + SYNC_MAX_INTERVAL)
+    return min(max(earliest, now + SYNC_MIN_INTERVAL), now + SYNC_MAX_INTERVAL)
+
+
+def load_next_sync(family_id: str) -> datetime | None:
+    return storage.get_state(family_id, "holds").get("next_sync_at")
+
+
+def last_synced(family_id: str) -> datetime | None:
+    """When the family's holds were last synced (None before the first sync)."""
+    return storage.get_state(family_id, "holds").get("synced_at")
+
+
+def save_next_sync(family_id: str, when: datetime, synced_at: datetime | None = None) -> None:
+    """Store the next sync time (and, after a sync, when it ran)."""
+    data = {"next_sync_at": when}
+    if synced_at:
+        data["synced_at"] = synced_at
+    storage.set_state(family_id, "holds", data, merge=True)
+
+
+def pull_forward(family_id: str, recs: list[dict]) -> None:
+    """Move the family's next sync earlier if any of recs (e.g. holds just
+    placed) could change before it. A family with no sync time is left due."""
+    current = load_next_sync(family_id)
+    if current is None or not recs:
+        return
+    now = datetime.now(timezone.utc)
+    when = next_sync_at(recs, load_stats({branch_of(rec) for rec in recs}), now)
+    if when < current:
+        save_next_sync(family_id, when)
+
+
+def clear_next_sync(family_id: str) -> None:
+    """Forget the family's next sync time (it has no active holds left)."""
+    storage.delete_state(family_id, "holds")
+
+
+def due_families(family_ids: list[str], now: datetime | None = None) -> list[str]:
+    """The families whose next sync time has come (or was never set)."""
+    if not family_ids:
+        return []
+    now = now or datetime.now(timezone.utc)
+    states = storage.get_states(family_ids, "holds")
+    not_yet = {fid for fid, state in states.items() if state.get("next_sync_at") and state["next_sync_at"] > now}
+    return [fid for fid in family_ids if fid not in not_yet]
@@ -0,0 +1,80 @@
+"""Import-time budget check for each pipeline entry point.
+
+Every stage runs as a short-lived job, so importing its module must stay
+cheap: heavy dependencies (browser_use, google.cloud.firestore, requests)
+are only imported on the code paths that use them. This imports each entry
+point in a fresh interpreter under `python -X importtime`, reports the
+cumulative import time, and fails if a budget is exceeded or a heavy
+dependency is loaded at import.
+
+    uv run import_budget.py
+    uv run import_budget.py --runs 5 notify_parent
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Milliseconds allowed for `import <entry point>` in a fresh interpreter.
+BUDGETS_MS = {
+    "main": 150,
+    "hold": 120,
+    "sync_holds": 120,
+    "notify_parent": 100,
+    "runner": 100,
+    "orchestrator": 120,
+}
+
+# Packages that must not be imported until a stage actually needs them.
+HEAVY = ("browser_use", "google.cloud.firestore", "requests")
+
+
+def measure(module: str) -> tuple[float, list[str]]:
+    """(cumulative import ms, heavy packages loaded) for importing module once."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    cumulative_us = 0
+    heavy = set()
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == module:
+            cumulative_us = int(cumulative)
+        heavy.update(h for h in HEAVY if name == h or name.startswith(h + "."))
+    return cumulative_us / 1000, sorted(heavy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry-point import times against budgets")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS), help="entry points to check")
+    parser.add_argument("--runs", type=int, default=3, help="fresh imports per module; the fastest counts")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'entry point':<15}{'import ms':>10}{'budget':>8}  heavy deps at import")
+    for module in args.modules:
+        results = [measure(module) for _ in range(args.runs)]
+        ms = min(r[0] for r in results)
+        heavy = results[0][1]
+        budget = BUDGETS_MS.get(module)
+        over = budget is not None and ms > budget
+        failed |= over or bool(heavy)
+        flag = "  OVER BUDGET" if over else ""
+        print(f"{module:<15}{ms:>10.1f}{budget or '-':>8}  {', '.join(heavy) or '-'}{flag}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Per-family interest profiles from call summaries.
+
+Each call gets a few `topics` (its most frequent content words). A family's
+interest profile is a TF-IDF vector over the words of its recent summaries,
+transcripts and topics — each summary is one document, and the vocabulary is
+whatever those documents contain minus STOPWORDS — L2-normalised and cut to
+its INTEREST_TERMS heaviest terms so it fits in a Firestore map.
+
+The search stage compares the current profile with the one from its last
+successful search (the family's "interests" state) to decide whether a
+new search is worth running, and logs every run to the family's
+search_runs.
+"""
+
+import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+import storage
+
+TOPICS_PER_CALL = 5
+INTEREST_TERMS = 20
+
+STOPWORDS = set("""
+a about after again all also am an and any are around as ask asked asking at
+back be because been before being big but by can could did do does doing
+don done down each even ever every for from fun get gets getting go goes
+going good got great had has have having he her here him his how i if in
+into is it its just kid kids know let like liked likes little lot lots love
+loved loves make many maybe me more most much my new no not now of off oh ok
+okay on one only or other our out over play played really said say says see
+she so some something sure talk talked talking tell telling than that the
+their them then there these they thing things think this those time to too
+told up us very want wanted wants was way we well were what when where which
+while who why will with would yeah yes you your
+question questions conversation call called chat chatted discussed mentioned
+seemed seems enjoyed interested interest excited today favorite favourite
+everything everywhere someone people
+""".split())
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def _stem(word: str) -> str:
+    """Fold simple plurals so "dinosaurs" and "dinosaur" are one term."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> list[str]:
+    """Content words of text, lowercased and singularised."""
+    words = (_stem(w) for w in _WORD.findall(text.lower()))
+    return [w for w in words if len(w) > 2 and w not in STOPWORDS]
+
+
+def extract_topics(text: str, count: int = TOPICS_PER_CALL) -> list[str]:
+    """The most frequent content words of one call, most frequent first."""
+    return [term for term, _ in Counter(terms(text)).most_common(count)]
+
+
+def summary_text(summary: dict) -> str:
+    """All the words a summary doc contributes to the profile."""
+    parts = [summary.get("summary_text", "")]
+    parts += summary.get("user_turns") or []
+    parts += summary.get("topics") or []
+    return " ".join(parts)
+
+
+def interest_vector(summaries: list[dict]) -> dict[str, float]:
+    """TF-IDF profile over summary docs, L2-normalised, top INTEREST_TERMS terms."""
+    docs = [Counter(terms(summary_text(s))) for s in summaries]
+    docs = [d for d in docs if d]
+    if not docs:
+        return {}
+    df = Counter(term for doc in docs for term in doc)
+    n = len(docs)
+    weights: Counter = Counter()
+    for doc in docs:
+        length = sum(doc.values())
+        for term, count in doc.items():
+            # smoothed idf, so a word every call mentions still counts
+            weights[term] += count / length * (math.log((1 + n) / (1 + df[term])) + 1)
+    top = dict(weights.most_common(INTEREST_TERMS))
+    norm = math.sqrt(sum(w * w for w in top.values()))
+    return {term: round(w / norm, 4) for term, w in top.items()}
+
+
+def similarity(a: dict[str, float], b: dict[str, float]) -> float:
+    """Cosine similarity of two profiles (0.0 if either is empty)."""
+    if not a or not b:
+        return 0.0
+    dot = sum(w * b.get(term, 0.0) for term, w in a.items())
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def new_topics(current: dict[str, float], previous: dict[str, float], count: int = 5) -> list[str]:
+    """Terms whose weight grew the most since the previous profile."""
+    growth = {term: w - previous.get(term, 0.0) for term, w in current.items()}
+    return [t for t, g in sorted(growth.items(), key=lambda kv: kv[1], reverse=True)[:count] if g > 0]
+
+
+def load_last_search(family_id: str) -> dict:
+    """Profile and time of the last search that saved picks ({} if none)."""
+    return storage.get_state(family_id, "interests")
+
+
+def record_run(family_id: str, vector: dict[str, float], score: float, mode: str, saved: bool) -> None:
+    """Log a search run; a run that saved picks becomes the new comparison baseline."""
+    now = datetime.now(timezone.utc)
+    storage.add_search_run(family_id, {
+        "interests": vector,
+        "similarity": round(score, 4),
+        "mode": mode,
+        "saved": saved,
+        "created_at": now,
+    })
+    if saved:
+        storage.set_state(family_id, "interests", {"vector": vector, "searched_at": now})
@@ -1,27 +1,61 @@
 import asyncio
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-import requests
-from browser_use import Agent, Browser
-from browser_use.llm import ChatAnthropic
 from dotenv import load_dotenv
 
-from config import load_family
-from firestore_client import get_db
-from parsing import parse_agent_picks
+import agent_cache
+import availability_cache
+import book_history
+import cartesia
+import catalog
+import config
+import interests
+import metrics
+import recommendations
+import storage
+from browser_pool import SFPL_SITE, step_throttle
+from config import DEFAULT_FAMILY_ID, load_family
+from models import agent_limits, max_steps, run_validated
+from parsing import book_key, parse_agent_picks, parse_verification
+from sessions import agent_kwargs, run, session
 
 load_dotenv()
 
-CARTESIA_API_KEY = os.getenv("CARTESIA_API_KEY", "")
-CARTESIA_AGENT_ID = os.getenv("CARTESIA_AGENT_ID", "")
+CANDIDATE_COUNT = 10
+TARGET_PICKS = 3
+MIN_PICKS = 2
+BRAINSTORM_ROUNDS = 2
+VERIFY_CONCURRENCY = int(os.getenv("VERIFY_CONCURRENCY", "3"))
 
+# Interest-profile gate: skip the search when the profile is at least this
+# similar to the last search's (and that search is recent), narrow it to the
+# new topics above INTEREST_NARROW_SIMILARITY.
+INTEREST_SKIP_SIMILARITY = float(os.getenv("INTEREST_SKIP_SIMILARITY", "0.9"))
+INTEREST_NARROW_SIMILARITY = float(os.getenv("INTEREST_NARROW_SIMILARITY", "0.6"))
+INTEREST_MAX_AGE = timedelta(days=float(os.getenv("INTEREST_MAX_AGE_DAYS", "7")))
 
-def build_task(family: dict, summaries: list[str]) -> str:
-    child = family["child_name"]
+CALLS_PAGE_SIZE = 50
+# Calls younger than this that aren't "completed" yet may still produce a summary.
+CALL_SETTLE_WINDOW = timedelta(hours=1)
+
+
+def build_brainstorm_prompt(
+    family: dict, summaries: list[str], exclude: list[str], focus: list[str] | None = None
+) -> str:
     age = family["child_age"]
     persona = f"{age}-year-old boy, showing signs of being nerdy"
     summary_block = "\n".join(f"  - {s}" for s in summaries)
+    focus_block = ""
+    if focus:
+        focus_block = (
+            f"\n## What's new\nLately they've started talking about: {', '.join(focus)}.\n"
+            "Favor books about these new interests.\n"
+        )
+    exclude_block = ""
+    if exclude:
+        titles = "\n".join(f"  - {t}" for t in exclude)
+        exclude_block = f"\n## Already considered — do NOT suggest these again\n{titles}\n"
     return f"""\
 You are a children's librarian helping pick books for a kid.
 
@@ -30,105 +64,232 @@ You are a children's librarian helping pick books for a kid.
 
 ## What they've been interested in lately
 {summary_block}
+{focus_block}{exclude_block}
+## Your task
+Think of {CANDIDATE_COUNT} children's books that would be a great fit. Consider picture
+books, early readers, and engaging non-fiction appropriate for the age. Only suggest
+real, published books a public library is likely to carry.
 
-## STEP 1 — Brainstorm candidates in your head
-Before you interact with the browser, think of 8-10 children's books that would be
-a great fit. Consider picture books, early readers, and engaging non-fiction
-appropriate for the age. Keep this ranked list in your memory — you'll work through
-it in order. Do NOT call the "done" action yet. You are nowhere near done.
-
-## STEP 2 — Search SFPL catalog
-Now go to https://sfpl.org and search for your #1 candidate using the search bar.
-
-For each search:
-a) Type the book title into the search box and submit.
-b) Look at the results list. Find the matching book.
-c) CLICK INTO the book's detail page to check its availability status.
-d) If the detail page shows "Available" copies at any branch → this book is CONFIRMED.
-   Record it as a winner and note which branch has it.
-e) If it shows "All copies in use" or no results → SKIP it and search your next candidate.
-f) Go back to the search bar and repeat with the next candidate.
-
-IMPORTANT RULES:
-- You must CLICK INTO each book's detail page. Do NOT judge availability from the
-  search results list alone — it is not reliable.
-- NEVER report a book you did not actually find and verify on sfpl.org.
-- If you run out of candidates, brainstorm a few more and keep searching.
-
-## STEP 3 — Report your final picks (this is the ONLY time you should call "done")
-Aim for 3 confirmed books, but 2 is acceptable if the browser crashes or the site
-becomes unresponsive. Call "done" with:
-
-FINAL PICKS:
-1. "Title" by Author — Why it fits + which SFPL branch has it available
-2. "Title" by Author — Why it fits + which SFPL branch has it available
-3. "Title" by Author — Why it fits + which SFPL branch has it available
-
-Only include books you personally verified as available on sfpl.org in Step 2.
-Do NOT call "done" until you have at least 2 confirmed books.
-"""
-
+Reply with ONLY a ranked list, best fit first, one book per line:
 
-def save_recommendations(family_id: str, agent_result) -> None:
-    """Parse agent picks and write to Firestore as recommendations."""
-    text = agent_result.final_result()
-    books = parse_agent_picks(text)
-    if not books:
-        print("Warning: could not parse any books from agent result")
-        return
-
-    db = get_db()
-    recs_ref = db.collection("families").document(family_id).collection("recommendations")
-
-    # Delete stale "recommended" docs from previous runs
-    stale = recs_ref.where("status", "==", "recommended").stream()
-    for doc in stale:
-        doc.reference.delete()
+1. "Title" by Author — Why it fits
+2. "Title" by Author — Why it fits
+"""
 
-    now = datetime.now(timezone.utc)
-    for book in books:
-        recs_ref.add({
-            "title": book["title"],
-            "author": book["author"],
-            "why": book["why"],
-            "branch": "",
-            "status": "recommended",
-            "searched_at": now,
-            "updated_at": now,
-        })
 
-    print(f"Saved {len(books)} recommendations to Firestore")
+def build_verify_task(book: dict) -> str:
+    return f"""\
+Check whether one book is available at the San Francisco Public Library.
+
+Book: "{book["title"]}" by {book["author"]}
+
+a) Go to https://sfpl.org and type the book title into the search box and submit.
+b) Look at the results list. Find the matching book (a physical book, not an eBook).
+c) CLICK INTO the book's detail page to check its availability status. Do NOT judge
+   availability from the search results list alone — it is not reliable.
+d) Call "done" with exactly one line:
+   AVAILABLE at <branch>, <branch>   — if any branch shows an available copy
+   NOT AVAILABLE                     — if all copies are in use
+   NOT FOUND                         — if the catalog doesn't have it
+"""
 
 
-def sync_call_summaries(family_id: str) -> int:
-    """Fetch recent calls from Cartesia, backfill any missing summaries to Firestore."""
-    if not CARTESIA_API_KEY or not CARTESIA_AGENT_ID:
+async def brainstorm(
+    family: dict, summaries: list[str], exclude: list[str], focus: list[str] | None = None
+) -> list[dict]:
+    """Ranked candidate books from a single LLM call — no browser involved."""
+    from browser_use.llm.messages import UserMessage
+
+    prompt = build_brainstorm_prompt(family, summaries, exclude, focus)
+
+    async def attempt(llm) -> str:
+        response = await llm.ainvoke([UserMessage(content=prompt)])
+        metrics.record_llm_usage(response.usage, agent="brainstorm")
+        return response.completion
+
+    completion = await run_validated("search", attempt, parse_agent_picks)
+    candidates = parse_agent_picks(completion)
+    print(f"Brainstormed {len(candidates)} candidates:")
+    for book in candidates:
+        print(f'  - "{book["title"]}" by {book["author"]}')
+    return candidates
+
+
+async def verify_with_agent(book: dict) -> list[str] | None:
+    """Check one book on sfpl.org with a short browser agent. None if it couldn't tell."""
+    from browser_use import Agent
+
+    task = build_verify_task(book)
+
+    async def attempt(llm) -> str:
+        async def run_live(on_step) -> str:
+            async with session() as browser:
+                agent = Agent(
+                    task=task, llm=llm, browser=browser, register_new_step_callback=on_step,
+                    **agent_kwargs(), **agent_limits("verify"),
+                )
+                result = await agent.run(
+                    max_steps=max_steps("verify"), on_step_start=step_throttle(SFPL_SITE)
+                )
+            metrics.record_agent(result, agent="verify")
+            return result.final_result() or ""
+
+        return await agent_cache.run_agent("verify", task, llm, run_live)
+
+    text = await run_validated("verify", attempt, lambda t: parse_verification(t) is not None)
+    branches = parse_verification(text)
+    if branches is not None:
+        availability_cache.put(book["title"], book["author"], branches)
+    return branches
+
+
+async def verify_candidates(candidates: list[dict], target: int) -> list[dict]:
+    """Confirm up to target available books, best-ranked first.
+
+    All candidates go through the catalog fast path in parallel; only the ones
+    it can't resolve, and that rank above the target-th book confirmed so far,
+    get a browser agent, at most VERIFY_CONCURRENCY at a time. Outstanding
+    agents are cancelled once no unchecked candidate can displace the best
+    target confirmed books.
+    """
+    found = await asyncio.to_thread(
+        catalog.check_many, [(c["title"], c["author"]) for c in candidates]
+    )
+    confirmed: dict[int, dict] = {}  # candidate index -> book with its branch
+    unresolved = []
+    for i, (book, result) in enumerate(zip(candidates, found)):
+        if result is None:
+            unresolved.append(i)
+        elif result["branches"]:
+            confirmed[i] = {**book, "branch": result["branches"][0]}
+    print(f"Catalog fast path: {len(confirmed)} available, "
+          f"{len(unresolved)} need a browser check")
+
+    def cutoff() -> int:
+        """Only candidates ranked above this can still make the top target."""
+        best = sorted(confirmed)[:target]
+        return best[-1] if len(best) >= target else len(candidates)
+
+    slots = asyncio.Semaphore(VERIFY_CONCURRENCY)
+
+    async def check(i: int) -> list[str] | None:
+        async with slots:
+            return await verify_with_agent(candidates[i])
+
+    pending = {asyncio.create_task(check(i)): i for i in unresolved if i < cutoff()}
+    try:
+        while any(i < cutoff() for i in pending.values()):
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = pending.pop(task)
+                try:
+                    branches = task.result()
+                except Exception as e:
+                    print(f"  Browser check failed: {e!r}")
+                    continue
+                if branches:
+                    print(f'  Confirmed "{candidates[i]["title"]}" at {branches[0]}')
+                    confirmed[i] = {**candidates[i], "branch": branches[0]}
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return [confirmed[i] for i in sorted(confirmed)[:target]]
+
+
+async def search_books(
+    family: dict, summaries: list[str], focus: list[str] | None = None, rounds: int = BRAINSTORM_ROUNDS
+) -> list[dict]:
+    """Brainstorm candidates, then verify them until TARGET_PICKS are confirmed.
+
+    Books already in the family's book_history (any status) are dropped
+    before any lookup, and the most recent of them are listed in the prompt.
+    """
+    history = book_history.load(family["family_id"])
+    seen = set(history)
+    exclude = book_history.recent_titles(history)
+    picks: list[dict] = []
+    for _ in range(rounds):
+        candidates = await brainstorm(family, summaries, exclude, focus)
+        fresh = [c for c in candidates if book_key(c["title"], c["author"]) not in seen]
+        if len(fresh) < len(candidates):
+            print(f"Dropped {len(candidates) - len(fresh)} already-seen candidates")
+        if not fresh:
+            break
+        seen.update(book_key(c["title"], c["author"]) for c in fresh)
+        exclude += [f'"{c["title"]}" by {c["author"]}' for c in fresh]
+        picks += await verify_candidates(fresh, TARGET_PICKS - len(picks))
+        if len(picks) >= TARGET_PICKS:
+            break
+    return picks
+
+
+def save_recommendations(family_id: str, books: list[dict]) -> bool:
+    """Write confirmed picks as recommendations. Returns whether it saved."""
+    if len(books) < MIN_PICKS:
+        print(f"Warning: only {len(books)} confirmed books, not saving recommendations")
+        return False
+
+    # Replace stale "recommended" docs from previous runs
+    recommendations.replace_recommended(family_id, books)
+    print(f"Saved {len(books)} recommendations")
+    availability_cache.record_picks(books)
+    return True
+
+
+def _call_start(call: dict) -> datetime:
+    return datetime.fromisoformat(call["start_time"].replace("Z", "+00:00"))
+
+
+def load_sync_watermark(family_id: str) -> dict:
+    """Last Cartesia call already synced for a family ({} before the first sync)."""
+    return storage.get_state(family_id, "cartesia")
+
+
+def fetch_new_calls(agent_id: str, watermark: dict) -> list[dict]:
+    """Page through the agent's Cartesia calls, newest first, until reaching the watermark."""
+    since = watermark.get("start_time")
+    since_id = watermark.get("call_id")
+    calls = []
+    for call in cartesia.iter_calls(agent_id, page_size=CALLS_PAGE_SIZE):
+        if since and (call["id"] == since_id or _call_start(call) < since):
+            break
+        calls.append(call)
+    return calls
+
+
+def next_watermark(calls: list[dict], watermark: dict) -> dict:
+    """Advance past fetched calls, but not past one that may still complete."""
+    settle_cutoff = datetime.now(timezone.utc) - CALL_SETTLE_WINDOW
+    pending = [
+        _call_start(c) for c in calls
+        if c.get("status") != "completed" and _call_start(c) > settle_cutoff
+    ]
+    settled = [c for c in calls if not pending or _call_start(c) < min(pending)]
+    if not settled:
+        return watermark
+    newest = max(settled, key=_call_start)
+    return {"start_time": _call_start(newest), "call_id": newest["id"]}
+
+
+def sync_call_summaries(family: dict) -> int:
+    """Fetch the family's calls newer than its sync watermark, backfill missing summaries to storage.
+
+    Only calls to the family's own Cartesia agent are read, so one family's
+    transcripts never reach another family's summaries.
+    """
+    if not cartesia.configured():
         print("Cartesia credentials not set, skipping call sync")
         return 0
 
-    resp = requests.get(
-        "https://api.cartesia.ai/agents/calls",
-        params={"agent_id": CARTESIA_AGENT_ID, "expand": "transcript", "limit": 20},
-        headers={"X-API-Key": CARTESIA_API_KEY, "Cartesia-Version": "2025-04-16"},
-        timeout=10,
-    )
-    resp.raise_for_status()
-    calls = resp.json().get("data", [])
-
-    db = get_db()
-    summaries_ref = db.collection("families").document(family_id).collection("summaries")
-
-    # Get existing call_ids from Firestore
-    existing_docs = summaries_ref.stream()
-    existing_ids = set()
-    for doc in existing_docs:
-        d = doc.to_dict()
-        # Check both doc ID and call_id field
-        existing_ids.add(doc.id)
-        if d.get("call_id"):
-            existing_ids.add(d["call_id"])
-
-    backfilled = 0
+    family_id = family["family_id"]
+    agent_id = config.account(family, "cartesia_agent_id")
+    watermark = load_sync_watermark(family_id)
+    calls = fetch_new_calls(agent_id, watermark)
+
+    existing_ids = storage.existing_call_ids(family_id, [c["id"] for c in calls])
+
+    summaries = {}
     for call in calls:
         call_id = call["id"]
         if call_id in existing_ids:
@@ -144,52 +305,52 @@ def sync_call_summaries(family_id: str) -> int:
         user_texts = [
             t["text"] for t in call.get("transcript", []) if t.get("role") == "user"
         ]
+        topics = interests.extract_topics(" ".join([summary, *user_texts]))
 
-        summaries_ref.document(call_id).set({
+        summaries[call_id] = {
             "summary_text": summary,
-            "topics": [],
+            "topics": topics,
             "mode": "standard",
             "call_id": call_id,
             "source": "cartesia_backfill",
-            "created_at": datetime.fromisoformat(call["start_time"].replace("Z", "+00:00")),
+            "created_at": _call_start(call),
             "user_turns": user_texts,
-        })
+        }
         print(f"  Backfilled summary for call {call_id}")
-        backfilled += 1
 
-    return backfilled
+    # Summaries first: if the watermark write is lost, the next sync only
+    # refetches calls that storage.existing_call_ids() then skips.
+    storage.add_summaries(family_id, summaries)
+    new_watermark = next_watermark(calls, watermark)
+    if new_watermark != watermark:
+        storage.set_state(family_id, "cartesia", new_watermark)
 
+    print(f"Checked {len(calls)} calls newer than the sync watermark")
+    return len(summaries)
 
-def load_summaries(family_id: str) -> list[str]:
-    """Load summaries from Firestore."""
+
+def load_summaries(family_id: str) -> list[dict]:
+    """Load the latest summaries (summary_text, topics, user_turns) from storage."""
     try:
-        db = get_db()
-        docs = (
-            db.collection("families")
-            .document(family_id)
-            .collection("summaries")
-            .order_by("created_at", direction="DESCENDING")
-            .limit(5)
-            .stream()
-        )
-        summaries = [doc.to_dict().get("summary_text", "") for doc in docs]
-        summaries = [s for s in summaries if s]  # drop blanks
+        summaries = storage.latest_summaries(family_id, 5, ["summary_text", "topics", "user_turns"])
+        summaries = [s for s in summaries if s.get("summary_text")]  # drop blanks
         if summaries:
-            print(f"Loaded {len(summaries)} summaries from Firestore")
+            print(f"Loaded {len(summaries)} summaries")
             return summaries
     except Exception as e:
-        print(f"Warning: could not load summaries from Firestore: {e}")
+        print(f"Warning: could not load summaries: {e}")
 
     return []
 
 
-async def main():
-    family = load_family()
+async def main(family_id: str = DEFAULT_FAMILY_ID):
+    family = load_family(family_id)
     family_id = family.get("family_id", "leo")
 
     # Sync any missed call summaries from Cartesia before loading
     print("Syncing call summaries from Cartesia...")
-    backfilled = sync_call_summaries(family_id)
+    # Cartesia rate limiting and retry backoff sleep; keep them off the event loop
+    backfilled = await asyncio.to_thread(sync_call_summaries, family)
     print(f"Synced {backfilled} new summaries from Cartesia")
 
     summaries = load_summaries(family_id)
@@ -197,15 +358,36 @@ async def main():
         print("No summaries found — nothing to search for. Exiting.")
         return
 
-    task = build_task(family, summaries)
-
-    browser = Browser()
-    llm = ChatAnthropic(model="claude-sonnet-4-5-20250929")
-
-    agent = Agent(task=task, llm=llm, browser=browser)
-    result = await agent.run()
-    save_recommendations(family_id, result)
+    profile = interests.interest_vector(summaries)
+    last = interests.load_last_search(family_id)
+    score = interests.similarity(profile, last.get("vector", {}))
+    recent = bool(last) and datetime.now(timezone.utc) - last["searched_at"] < INTEREST_MAX_AGE
+    texts = [s["summary_text"] for s in summaries]
+    focus = None
+    mode, rounds = "full", BRAINSTORM_ROUNDS
+    if recent and score >= INTEREST_SKIP_SIMILARITY:
+        print(f"Interests unchanged since the last search (similarity {score:.2f}), skipping")
+        metrics.incr("searches_skipped")
+        interests.record_run(family_id, profile, score, "skip", saved=False)
+        return
+    if recent and score >= INTEREST_NARROW_SIMILARITY:
+        focus = interests.new_topics(profile, last["vector"]) or None
+        if focus:
+            focused = [s["summary_text"] for s in summaries
+                       if set(interests.terms(interests.summary_text(s))) & set(focus)]
+            texts = focused or texts
+        mode, rounds = "narrow", 1
+        print(f"Interests shifted a little (similarity {score:.2f}), narrowing the search"
+              + (f" to: {', '.join(focus)}" if focus else ""))
+
+    picks = await search_books(family, texts, focus, rounds)
+    for book in picks:
+        print(f'  - "{book["title"]}" by {book["author"]} — {book["why"]} ({book["branch"]})')
+    saved = save_recommendations(family_id, picks)
+    interests.record_run(family_id, profile, score, mode, saved)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    with metrics.stage("search", DEFAULT_FAMILY_ID):
+        run(main())
+    metrics.export()
@@ -0,0 +1,150 @@
+"""Per-run instrumentation: stage wall time, Firestore and HTTP counts, agent usage.
+
+Counters and timings are labelled with the current stage and family (set by
+stage()) and accumulate in-process. export() appends every timing observation
+and each counter's increase since the previous export to METRICS_JSONL as one
+JSON object per line, so summing a counter's lines gives its total, and
+rewrites METRICS_PROM with cumulative totals in Prometheus text format
+(node_exporter textfile style).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_JSONL = os.getenv("METRICS_JSONL", os.path.join(os.path.dirname(__file__), "metrics", "metrics.jsonl"))
+METRICS_PROM = os.getenv("METRICS_PROM", os.path.join(os.path.dirname(__file__), "metrics", "metrics.prom"))
+PREFIX = "answering_machine_"
+
+_context: ContextVar[dict] = ContextVar("metrics_context", default={})
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = {}
+_exported: dict[tuple[str, tuple], float] = {}  # counter values as of the last export()
+_timings: dict[tuple[str, tuple], list[float]] = {}  # name/labels -> [count, sum, max]
+_events: list[dict] = []
+
+
+def _labels(extra: dict) -> tuple:
+    return tuple(sorted({**_context.get(), **extra}.items()))
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    """Add value to a counter, e.g. incr("firestore_reads", 3)."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """Record one duration, e.g. observe("http_seconds", 0.4, host="api.cartesia.ai")."""
+    key = (name, _labels(labels))
+    with _lock:
+        count, total, peak = _timings.get(key, (0, 0.0, 0.0))
+        _timings[key] = [count + 1, total + seconds, max(peak, seconds)]
+        _events.append({"ts": time.time(), "metric": name, "seconds": round(seconds, 4), **dict(key[1])})
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """Observe the wall time of the block under name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def stage(name: str, family_id: str):
+    """Time a pipeline stage and label everything recorded inside it."""
+    token = _context.set({"stage": name, "family": family_id})
+    try:
+        with timed("stage_seconds"):
+            yield
+    finally:
+        _context.reset(token)
+
+
+def record_agent(history, agent: str = "agent") -> None:
+    """Record step count, token usage and per-action step timings of an agent run."""
+    incr("agent_runs", agent=agent)
+    incr("agent_steps", history.number_of_steps(), agent=agent)
+    observe("agent_seconds", history.total_duration_seconds(), agent=agent)
+    if history.usage:
+        incr("llm_prompt_tokens", history.usage.total_prompt_tokens, agent=agent)
+        incr("llm_completion_tokens", history.usage.total_completion_tokens, agent=agent)
+        incr("llm_cost_usd", history.usage.total_cost, agent=agent)
+    for item in history.history:
+        if item.metadata is None or item.model_output is None:
+            continue
+        actions = [next(iter(a.model_dump(exclude_unset=True)), "") for a in item.model_output.action]
+        observe("agent_step_seconds", item.metadata.duration_seconds, agent=agent,
+                action=actions[0] if actions else "")
+
+
+def record_llm_usage(usage, agent: str = "llm") -> None:
+    """Record tokens from a direct llm.ainvoke() call (ChatInvokeCompletion.usage)."""
+    if usage is None:
+        return
+    incr("llm_prompt_tokens", usage.prompt_tokens, agent=agent)
+    incr("llm_completion_tokens", usage.completion_tokens, agent=agent)
+
+
+def _prom_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in labels)
+    return "{" + inner + "}"
+
+
+def total(name: str) -> float:
+    """A counter summed over all its labels."""
+    with _lock:
+        return sum(value for (n, _), value in _counters.items() if n == name)
+
+
+def prometheus_text() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        timings = sorted(_timings.items())
+    for name in sorted({n for (n, _), _ in counters}):
+        lines.append(f"# TYPE {PREFIX}{name}_total counter")
+        for (n, labels), value in counters:
+            if n == name:
+                lines.append(f"{PREFIX}{name}_total{_prom_labels(labels)} {value:g}")
+    for name in sorted({n for (n, _), _ in timings}):
+        series = [(labels, v) for (n, labels), v in timings if n == name]
+        lines.append(f"# TYPE {PREFIX}{name} summary")
+        for labels, (count, total, _) in series:
+            lines.append(f"{PREFIX}{name}_count{_prom_labels(labels)} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_prom_labels(labels)} {total:.4f}")
+        lines.append(f"# TYPE {PREFIX}{name}_max gauge")
+        for labels, (_, _, peak) in series:
+            lines.append(f"{PREFIX}{name}_max{_prom_labels(labels)} {peak:.4f}")
+    return "\n".join(lines) + "\n"
+
+
+def export() -> None:
+    """Append pending observations and counter increases to METRICS_JSONL and
+    rewrite METRICS_PROM."""
+    with _lock:
+        events = _events[:]
+        _events.clear()
+        counters = [
+            {"ts": time.time(), "metric": name, "value": value - _exported.get((name, labels), 0), **dict(labels)}
+            for (name, labels), value in _counters.items()
+            if value != _exported.get((name, labels), 0)
+        ]
+        _exported.update(_counters)
+    for path in (METRICS_JSONL, METRICS_PROM):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(METRICS_JSONL, "a") as f:
+        for event in events + counters:
+            f.write(json.dumps(event) + "\n")
+    with open(METRICS_PROM + ".tmp", "w") as f:
+        f.write(prometheus_text())
+    os.replace(METRICS_PROM + ".tmp", METRICS_PROM)
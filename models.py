@@ -0,0 +1,92 @@
+"""Chat model and budget used by each pipeline stage.
+
+Stages ask for their model through get_llm() instead of constructing one, so
+benchmarks and offline runs can swap in a stand-in with use(), and
+agent_cache can record or replay every call (AGENT_CACHE).
+
+Each stage has a tier: a model, an optional stronger escalation model, and a
+budget (agent steps, output tokens, per-LLM-call and per-step timeouts).
+Simple stages — reading one holds page, checking one book — run on a cheap
+model and only escalate when run_validated() finds their output doesn't
+parse. Every setting can be overridden per stage from the environment, e.g.
+MODEL_SYNC, ESCALATE_MODEL_SYNC (empty disables escalation), MAX_STEPS_SYNC,
+MAX_TOKENS_SYNC, LLM_TIMEOUT_SYNC, STEP_TIMEOUT_SYNC.
+"""
+
+import os
+
+import agent_cache
+import metrics
+
+DEFAULT_MODEL = "claude-sonnet-4-5-20250929"
+CHEAP_MODEL = "claude-haiku-4-5-20251001"
+
+# stage -> (model, escalation model, max agent steps, max output tokens,
+#           seconds per LLM call, seconds per agent step)
+TIERS = {
+    "search": (DEFAULT_MODEL, "", 0, 2048, 60, 0),
+    "verify": (CHEAP_MODEL, DEFAULT_MODEL, 15, 2048, 45, 90),
+    "hold": (DEFAULT_MODEL, "", 60, 4096, 90, 180),
+    "sync": (CHEAP_MODEL, DEFAULT_MODEL, 12, 2048, 45, 90),
+}
+
+_factory = None
+
+
+def budget(stage: str) -> dict:
+    """{model, escalate_to, max_steps, max_tokens, llm_timeout, step_timeout} for a stage."""
+    model, escalate_to, max_steps, max_tokens, llm_timeout, step_timeout = TIERS.get(
+        stage, (DEFAULT_MODEL, "", 0, 4096, 90, 180)
+    )
+    suffix = stage.upper()
+    return {
+        "model": os.getenv(f"MODEL_{suffix}", model),
+        "escalate_to": os.getenv(f"ESCALATE_MODEL_{suffix}", escalate_to),
+        "max_steps": int(os.getenv(f"MAX_STEPS_{suffix}", max_steps)),
+        "max_tokens": int(os.getenv(f"MAX_TOKENS_{suffix}", max_tokens)),
+        "llm_timeout": int(os.getenv(f"LLM_TIMEOUT_{suffix}", llm_timeout)),
+        "step_timeout": int(os.getenv(f"STEP_TIMEOUT_{suffix}", step_timeout)),
+    }
+
+
+def get_llm(stage: str, escalated: bool = False):
+    """Chat model for a stage ("search", "verify", "hold", "sync").
+
+    escalated picks the stage's stronger model, when it has one.
+    """
+    if _factory is not None:
+        return agent_cache.wrap(_factory(stage), stage)
+    from browser_use.llm import ChatAnthropic
+
+    tier = budget(stage)
+    model = tier["escalate_to"] if escalated and tier["escalate_to"] else tier["model"]
+    llm = ChatAnthropic(model=model, max_tokens=tier["max_tokens"], timeout=tier["llm_timeout"])
+    return agent_cache.wrap(llm, stage)
+
+
+def max_steps(stage: str) -> int:
+    """Step limit for the stage's agent (0 means browser_use's default)."""
+    return budget(stage)["max_steps"] or 500
+
+
+def agent_limits(stage: str) -> dict:
+    """Agent() timeouts for the stage."""
+    tier = budget(stage)
+    return {"llm_timeout": tier["llm_timeout"], "step_timeout": tier["step_timeout"]}
+
+
+async def run_validated(stage: str, attempt, validate):
+    """Await attempt(llm) on the stage's model; if validate(output) is false,
+    retry once on its escalation model. Returns the last output."""
+    output = await attempt(get_llm(stage))
+    if validate(output) or not budget(stage)["escalate_to"]:
+        return output
+    print(f"{stage}: output didn't validate, retrying with {budget(stage)['escalate_to']}")
+    metrics.incr("llm_escalations", agent=stage)
+    return await attempt(get_llm(stage, escalated=True))
+
+
+def use(factory) -> None:
+    """Route every get_llm() call through factory(stage); None restores the default."""
+    global _factory
+    _factory = factory
@@ -1,41 +1,134 @@
+"""Call parents about books that are ready for pickup.
+
+Ready books are coalesced: a family is called once its oldest un-announced
+ready book has waited NOTIFY_WINDOW (so books that turn ready close together
+share one call), and never twice within NOTIFY_MIN_INTERVAL. Books the parent
+was already told about carry notified_at and are never announced again.
+
+Newly ready books are found by reading the family's status_events log from
+the cursor kept in the family's "notify" state, so a run only reads what
+changed.
+
+    uv run notify_parent.py --family leo   # one family
+    uv run notify_parent.py --all          # every family with ready books, concurrently
+"""
+
+import argparse
+import asyncio
 import os
+from datetime import datetime, timedelta, timezone
 
-import requests
 from dotenv import load_dotenv
 
-from config import load_family
-from firestore_client import get_db
+import cartesia
+import config
+import metrics
+import recommendations
+import status_events
+import storage
+from config import DEFAULT_FAMILY_ID, load_families, load_family
 
 load_dotenv()
 
-CARTESIA_API_KEY = os.environ["CARTESIA_API_KEY"]
-CARTESIA_AGENT_ID = os.environ["CARTESIA_AGENT_ID"]
+NOTIFY_WINDOW = timedelta(minutes=float(os.getenv("NOTIFY_WINDOW_MINUTES", "30")))
+NOTIFY_MIN_INTERVAL = timedelta(hours=float(os.getenv("NOTIFY_MIN_INTERVAL_HOURS", "12")))
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "8"))
 
-CARTESIA_URL = "https://api.cartesia.ai/twilio/call/outbound"
+BOOK_FIELDS = ["title", "author", "branch", "why", "status", "notified_at"]
 
 
-def load_ready_books(family_id: str) -> list[dict]:
-    """Load recommendations with status 'ready' from Firestore."""
-    db = get_db()
-    docs = (
-        db.collection("families")
-        .document(family_id)
-        .collection("recommendations")
-        .where("status", "==", "ready")
-        .stream()
-    )
+def load_notify_state(family_id: str) -> dict:
+    """{cursor, pending: [{doc_id, ready_since}], pending_count, last_called_at, titles}"""
+    return storage.get_state(family_id, "notify")
+
+
+def collect_ready(family_id: str, state: dict) -> tuple[dict, int]:
+    """Fold status changes since the notify cursor into the family's pending ready books.
+
+    Returns ({doc_id: ready_since}, new cursor). The first time a family is
+    seen, pending is seeded from its current un-announced ready books.
+    """
+    pending = {p["doc_id"]: p["ready_since"] for p in state.get("pending", [])}
+    if "cursor" in state:
+        cursor = state["cursor"]
+    else:
+        cursor = status_events.last_seq(family_id)
+        for rec in recommendations.load(family_id, ["ready"], fields=["updated_at", "notified_at"]):
+            if not rec.get("notified_at"):
+                pending[rec["doc_id"]] = rec.get("updated_at")
+    for event in status_events.changes_since(family_id, cursor):
+        if event["status"] == "ready":
+            pending[event["doc_id"]] = event["at"]
+        else:
+            pending.pop(event["doc_id"], None)
+        cursor = event["seq"]
+    return pending, cursor
+
+
+def load_ready_books(family_id: str, pending: dict) -> list[dict]:
+    """Fetch just the pending books, keeping those still ready and not yet announced."""
+    if not pending:
+        return []
     books = []
-    for doc in docs:
-        data = doc.to_dict()
+    for doc_id, data in recommendations.get_many(family_id, list(pending), BOOK_FIELDS).items():
+        if data.get("status") != "ready" or data.get("notified_at"):
+            continue
         books.append({
+            "doc_id": doc_id,
             "title": data["title"],
             "author": data["author"],
             "branch": data.get("branch", ""),
             "why": data.get("why", ""),
+            "ready_since": pending[doc_id],
         })
     return books
 
 
+def pending_books(family_id: str) -> tuple[list[dict], dict]:
+    """The family's new ready books, read as deltas from the status log, and its notify state."""
+    state = load_notify_state(family_id)
+    pending, cursor = collect_ready(family_id, state)
+    books = load_ready_books(family_id, pending)
+    # a list, so a merge replaces it rather than merging into the old entries
+    pending = [{"doc_id": b["doc_id"], "ready_since": b["ready_since"]} for b in books]
+    if cursor != state.get("cursor") or pending != state.get("pending", []):
+        storage.set_state(family_id, "notify", {
+            "cursor": cursor, "pending": pending, "pending_count": len(pending),
+        }, merge=True)
+    return books, state
+
+
+def families_with_pending() -> set[str]:
+    """Families holding ready books that are still waiting to coalesce."""
+    return storage.families_with_state("notify", "pending_count")
+
+
+def is_due(books: list[dict], last_called: datetime | None, window: timedelta, now: datetime) -> bool:
+    """Whether books have coalesced long enough, and the parent wasn't called too recently."""
+    if not books:
+        return False
+    if last_called and now - last_called < NOTIFY_MIN_INTERVAL:
+        return False
+    oldest = min((b["ready_since"] for b in books if b["ready_since"]), default=None)
+    return oldest is None or now - oldest >= window
+
+
+def mark_notified(family_id: str, books: list[dict]) -> None:
+    """Stamp books as announced, then remember when the parent was called.
+
+    Books are stamped first: if the state write is lost, the next run drops
+    the already-announced books from pending by their notified_at.
+    """
+    now = datetime.now(timezone.utc)
+    recommendations.update(family_id, {b["doc_id"]: {"notified_at": now} for b in books})
+    storage.set_state(family_id, "notify", {
+        "last_called_at": now,
+        "titles": [b["title"] for b in books],
+        "pending": [],
+        "pending_count": 0,
+    }, merge=True)
+
+
 def format_books_context(books: list[dict]) -> str:
     """Format books into a readable string for the voice agent."""
     lines = []
@@ -48,58 +141,123 @@ def format_books_context(books: list[dict]) -> str:
     )
 
 
-def write_to_firestore(phone_number: str, books_context: str, parent_name: str, child_name: str) -> None:
-    """Write book context and family names to Firestore so the voice agent can read it."""
-    from google.cloud import firestore as fs
-    db = get_db()
-    db.collection("pending_calls").document(phone_number).set({
+def write_call_context(phone_number: str, books_context: str, parent_name: str, child_name: str) -> None:
+    """Write book context and family names to pending_calls so the voice agent can read it."""
+    storage.put_pending_call(phone_number, {
         "books_context": books_context,
         "parent_name": parent_name,
         "child_name": child_name,
-        "created_at": fs.SERVER_TIMESTAMP,
     })
-    print(f"Book context written to Firestore: pending_calls/{phone_number}")
+    print(f"Book context written: pending_calls/{phone_number}")
 
 
-def trigger_call(books: list[dict], phone_number: str, parent_name: str, child_name: str) -> None:
-    """Write context to Firestore, then POST to Cartesia outbound call API."""
+def trigger_call(books: list[dict], family: dict) -> None:
+    """Write the call context, then POST to Cartesia outbound call API."""
+    # fail before staging context for a call we can't place
+    cartesia.api_key()
+    agent_id = config.account(family, "cartesia_agent_id")
     books_context = format_books_context(books)
 
-    write_to_firestore(phone_number, books_context, parent_name, child_name)
-
-    headers = {
-        "X-API-Key": CARTESIA_API_KEY,
-        "Cartesia-Version": "2025-04-16",
-        "Content-Type": "application/json",
-    }
-    body = {
-        "target_numbers": [phone_number],
-        "agent_id": CARTESIA_AGENT_ID,
-    }
-    resp = requests.post(CARTESIA_URL, headers=headers, json=body)
-    resp.raise_for_status()
-    print(f"Call triggered successfully. Response: {resp.status_code}")
-    print(resp.json())
-
-
-def main():
-    family = load_family()
+    write_call_context(family["phone_number"], books_context, family["parent_name"], family["child_name"])
+
+    response = cartesia.start_outbound_call(family["phone_number"], agent_id)
+    print("Call triggered successfully.")
+    print(response)
+
+
+async def notify_family(family: dict, books: list[dict]) -> None:
+    """Stage the context, place the call and mark the books announced."""
+    cartesia.api_key()
+    agent_id = config.account(family, "cartesia_agent_id")
+    await asyncio.to_thread(
+        write_call_context, family["phone_number"], format_books_context(books),
+        family["parent_name"], family["child_name"],
+    )
+    response = await cartesia.astart_outbound_call(family["phone_number"], agent_id)
+    print(f"[{family['family_id']}] Call triggered for {len(books)} book(s): {response}")
+    await asyncio.to_thread(mark_notified, family["family_id"], books)
+
+
+def load_last_scan() -> datetime | None:
+    return storage.get_docs("dispatch_state", ["notify"]).get("notify", {}).get("scanned_at")
+
+
+async def dispatch(window: timedelta = NOTIFY_WINDOW, max_concurrent: int = NOTIFY_CONCURRENCY) -> int:
+    """Call every family whose ready books are due, at most max_concurrent at once.
+
+    Each call goes out from the family's own Cartesia agent (cartesia_agent_id).
+
+    Only families with a "ready" event since the last dispatch, or with books
+    still coalescing, are looked at (every family on the first dispatch).
+    Returns the number of calls placed.
+    """
+    scan_started = datetime.now(timezone.utc)
+    scanned_at = await asyncio.to_thread(load_last_scan)
+    if scanned_at is None:
+        candidates = set(await asyncio.to_thread(load_families))
+    else:
+        candidates = await asyncio.to_thread(status_events.families_with, "ready", scanned_at)
+        candidates |= await asyncio.to_thread(families_with_pending)
+    family_ids = sorted(candidates)
+    families = await asyncio.to_thread(load_families, family_ids)
+
+    slots = asyncio.Semaphore(max_concurrent)
+
+    async def one(family_id: str) -> bool:
+        async with slots:
+            with metrics.stage("notify", family_id):
+                try:
+                    books, state = await asyncio.to_thread(pending_books, family_id)
+                    if not is_due(books, state.get("last_called_at"), window, datetime.now(timezone.utc)):
+                        return False
+                    await notify_family(families[family_id], books)
+                    return True
+                except Exception as e:
+                    print(f"[{family_id}] notify: failed: {e!r}")
+                    return False
+
+    placed = sum(await asyncio.gather(*(one(fid) for fid in family_ids if fid in families)))
+    await asyncio.to_thread(storage.set_docs, "dispatch_state", {"notify": {"scanned_at": scan_started}})
+    print(f"Checked {len(family_ids)} families with new or waiting ready books, placed {placed} calls")
+    metrics.incr("notify_calls", placed)
+    return placed
+
+
+def main(family_id: str = DEFAULT_FAMILY_ID, window: timedelta = NOTIFY_WINDOW):
+    family = load_family(family_id)
     family_id = family.get("family_id", "leo")
-    phone_number = family["phone_number"]
-    parent_name = family["parent_name"]
-    child_name = family["child_name"]
 
-    books = load_ready_books(family_id)
+    books, state = pending_books(family_id)
     if not books:
-        print("No books are ready for pickup. No call needed.")
+        print("No new books are ready for pickup. No call needed.")
         return
 
     print(f"Found {len(books)} book(s) ready for pickup:")
     for b in books:
         print(f'  - "{b["title"]}" by {b["author"]}')
 
-    trigger_call(books, phone_number, parent_name, child_name)
+    if not is_due(books, state.get("last_called_at"), window, datetime.now(timezone.utc)):
+        print("Waiting for more books to coalesce (or the parent was called recently). No call yet.")
+        return
+
+    trigger_call(books, family)
+    mark_notified(family_id, books)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Call parents about books ready for pickup")
+    parser.add_argument("--family", default=DEFAULT_FAMILY_ID)
+    parser.add_argument("--all", action="store_true", help="dispatch calls for every family that's due")
+    parser.add_argument("--window", type=float, default=NOTIFY_WINDOW.total_seconds() / 60,
+                        help="minutes a ready book waits for others to join its call")
+    parser.add_argument("--max-concurrent", type=int, default=NOTIFY_CONCURRENCY,
+                        help="outbound calls placed at once with --all")
+    args = parser.parse_args()
+    window = timedelta(minutes=args.window)
+    if args.all:
+        config.allow_shared_accounts(False)
+        asyncio.run(dispatch(window, args.max_concurrent))
+    else:
+        with metrics.stage("notify", args.family):
+            main(args.family, window)
+    metrics.export()
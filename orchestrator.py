@@ -0,0 +1,177 @@
+"""Event-driven pipeline: start stage work as soon as Firestore changes.
+
+Snapshot listeners across every family trigger:
+- a new summary                → search (main.py)
+- a new "recommended" book     → hold (hold.py)
+
+Hold statuses change on sfpl.org, not in Firestore, so sync_holds.py still
+runs on a timer — but only for families that have active holds and whose
+predicted earliest status change (hold_timing.py) has come. Parent calls
+go out from notify_parent.dispatch() every NOTIFY_DISPATCH_INTERVAL, which
+coalesces ready books across all families.
+
+Events are debounced per (family, stage) so a burst of writes (e.g. the
+three recommendations a search saves) starts one run, and each family runs
+one stage at a time. Families with no changes never launch a browser.
+Every family runs on its own Cartesia agent and SFPL card from its config;
+one missing them fails its stage runs instead of borrowing the env ones.
+The listeners are Firestore snapshot listeners, so the orchestrator only
+runs with STORAGE_BACKEND=firestore.
+
+    uv run orchestrator.py
+"""
+
+import argparse
+import asyncio
+import os
+
+import config
+import hold_timing
+import metrics
+import notify_parent
+import sessions
+import storage
+from config import watch_families
+from firestore_client import get_db
+from runner import run_stage
+
+DEBOUNCE_SECONDS = float(os.getenv("ORCHESTRATOR_DEBOUNCE", "20"))
+# How often to look for families whose next hold sync is due.
+SYNC_INTERVAL_SECONDS = float(os.getenv("ORCHESTRATOR_SYNC_INTERVAL", str(30 * 60)))
+NOTIFY_DISPATCH_INTERVAL = float(os.getenv("NOTIFY_DISPATCH_INTERVAL", str(5 * 60)))
+
+_loop: asyncio.AbstractEventLoop | None = None
+_timers: dict[tuple[str, str], asyncio.TimerHandle] = {}
+_family_locks: dict[str, asyncio.Lock] = {}
+_running: set[asyncio.Task] = set()
+
+
+def schedule(family_id: str, stage: str) -> None:
+    """(Re)start the debounce timer for a family's stage. Loop thread only."""
+    key = (family_id, stage)
+    if key in _timers:
+        _timers[key].cancel()
+    _timers[key] = _loop.call_later(DEBOUNCE_SECONDS, _start, family_id, stage)
+
+
+def _start(family_id: str, stage: str) -> None:
+    _timers.pop((family_id, stage), None)
+    task = _loop.create_task(_run_serialized(family_id, stage))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def _run_serialized(family_id: str, stage: str) -> None:
+    lock = _family_locks.setdefault(family_id, asyncio.Lock())
+    async with lock:
+        print(f"[{family_id}] {stage}: starting")
+        try:
+            await run_stage(stage, family_id)
+        except Exception as e:
+            print(f"[{family_id}] {stage}: failed: {e!r}")
+        metrics.export()
+
+
+def _listener(stage: str, accept=lambda data: True):
+    """Build an on_snapshot callback that schedules stage for newly matching docs.
+
+    The first snapshot replays every existing match and is skipped; the
+    callback runs on Firestore's watch thread, so scheduling hops to the loop.
+    """
+    seen_initial = False
+
+    def on_snapshot(docs, changes, read_time):
+        nonlocal seen_initial
+        if not seen_initial:
+            seen_initial = True
+            return
+        for change in changes:
+            if change.type.name != "ADDED":
+                continue
+            if not accept(change.document.to_dict()):
+                continue
+            family_id = change.document.reference.parent.parent.id
+            _loop.call_soon_threadsafe(schedule, family_id, stage)
+
+    return on_snapshot
+
+
+def watch() -> list:
+    """Subscribe the stage listeners. Returns watches to unsubscribe."""
+    db = get_db()
+    recs = db.collection_group("recommendations")
+    return [
+        # Keeps the family config cache current for every stage run below
+        watch_families(),
+        # Backfilled summaries are written by the search stage itself
+        db.collection_group("summaries").on_snapshot(
+            _listener("search", lambda d: d.get("source") != "cartesia_backfill")
+        ),
+        recs.where("status", "==", "recommended").on_snapshot(_listener("hold")),
+    ]
+
+
+def families_with_active_holds() -> set[str]:
+    """Family IDs with at least one hold that could still change on sfpl.org."""
+    return storage.families_with_status(["hold_placed", "in_transit"])
+
+
+async def sync_periodically() -> None:
+    while True:
+        try:
+            active = await asyncio.to_thread(families_with_active_holds)
+            family_ids = await asyncio.to_thread(hold_timing.due_families, sorted(active))
+            for family_id in family_ids:
+                schedule(family_id, "sync")
+        except Exception as e:
+            print(f"hold sync scheduling failed: {e!r}")
+        await asyncio.sleep(SYNC_INTERVAL_SECONDS)
+
+
+async def dispatch_periodically() -> None:
+    while True:
+        try:
+            await notify_parent.dispatch()
+        except Exception as e:
+            print(f"notify dispatch failed: {e!r}")
+        metrics.export()
+        await asyncio.sleep(NOTIFY_DISPATCH_INTERVAL)
+
+
+async def orchestrate() -> None:
+    global _loop
+    _loop = asyncio.get_running_loop()
+    config.allow_shared_accounts(False)
+    watches = watch()
+    print(f"Listening for changes (debounce {DEBOUNCE_SECONDS:.0f}s, "
+          f"hold syncs checked every {SYNC_INTERVAL_SECONDS / 60:.0f}m)")
+    try:
+        await asyncio.gather(sync_periodically(), dispatch_periodically())
+    finally:
+        for w in watches:
+            w.unsubscribe()
+        await asyncio.gather(*_running, return_exceptions=True)
+        await sessions.close_all()
+
+
+def main():
+    global DEBOUNCE_SECONDS, SYNC_INTERVAL_SECONDS
+    parser = argparse.ArgumentParser(description="Run pipeline stages on Firestore changes")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS,
+                        help="seconds of quiet before a triggered stage starts")
+    parser.add_argument("--sync-interval", type=float, default=SYNC_INTERVAL_SECONDS,
+                        help="seconds between checks for families whose hold sync is due")
+    args = parser.parse_args()
+    if storage.STORAGE_BACKEND != "firestore":
+        raise SystemExit("The orchestrator listens for Firestore changes; set STORAGE_BACKEND=firestore")
+    DEBOUNCE_SECONDS = args.debounce
+    SYNC_INTERVAL_SECONDS = args.sync_interval
+
+    try:
+        asyncio.run(orchestrate())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,80 @@ def parse_agent_picks(text: str) -> list[dict]:
         title = match.group(1)
         author = match.group(2).strip().strip("*")
         reason = (match.group(3) or "").strip().rstrip(". ")
+        branch = ""
         if ". Available at" in reason:
-            reason = reason.split(". Available at")[0]
-        books.append({"title": title, "author": author, "why": reason})
+            reason, branch = reason.split(". Available at", 1)
+            branch = branch.strip().removeprefix("the ").split(" branch")[0].strip()
+        books.append({"title": title, "author": author, "why": reason, "branch": branch})
     return books
+
+
+def normalize_title(text: str) -> str:
+    """Lowercase, drop punctuation and a leading article, collapse whitespace."""
+    words = re.sub(r"[^\w\s]", " ", text.lower()).split()
+    if words and words[0] in ("the", "a", "an"):
+        words = words[1:]
+    return " ".join(words)
+
+
+def normalize_author(text: str) -> str:
+    """Reduce an author to a lowercase surname ('Rubin, Adam' and 'Adam Rubin' agree)."""
+    name = text.split(",")[0] if "," in text else text
+    words = normalize_title(name).split()
+    return words[-1] if words else ""
+
+
+def book_key(title: str, author: str = "") -> str:
+    """Stable key for a book across catalog, agent and Firestore spellings."""
+    return f"{normalize_title(title)}|{normalize_author(author)}"
+
+
+def split_title_author(text: str) -> tuple[str, str]:
+    """Split '"Title" by Author' (quotes optional) into (title, author)."""
+    title, _, author = text.strip().rpartition(" by ")
+    if not title:
+        title, author = author, ""
+    return title.strip().strip('"'), author.strip()
+
+
+def parse_verification(text: str) -> list[str] | None:
+    """Parse a single-book check: branches if available, [] if not, None if unclear."""
+    match = re.search(r"\bAVAILABLE at (.+)", text, re.IGNORECASE)
+    if match and not re.search(r"\bNOT AVAILABLE\b", text, re.IGNORECASE):
+        return [b.strip().rstrip(".") for b in match.group(1).split(",") if b.strip()]
+    if re.search(r"\bNOT (AVAILABLE|FOUND)\b", text, re.IGNORECASE):
+        return []
+    return None
+
+
+def parse_hold_results(text: str) -> list[dict]:
+    """Parse HOLD RESULTS lines into {"title", "placed", "branch", "reason"} dicts."""
+    results = []
+    for match in re.finditer(r'^\s*\d+\.\s+"([^"]+)"\s*[—-]+\s*(.+?)\s*$', text or "", re.MULTILINE):
+        outcome = match.group(2)
+        lowered = outcome.lower()
+        # "Failed: already on hold" still means the account holds the book
+        placed = ("hold placed" in lowered and not lowered.startswith("failed")) or (
+            "already" in lowered and "hold" in lowered
+        )
+        branch = re.search(r"pickup at ([^)]+)", outcome, re.IGNORECASE)
+        reason = "" if placed else outcome.split(":", 1)[-1].strip()
+        results.append({
+            "title": match.group(1),
+            "placed": placed,
+            "branch": branch.group(1).strip() if branch else "",
+            "reason": reason,
+        })
+    return results
+
+
+def parse_hold_statuses(text: str) -> dict[str, str]:
+    """Parse HOLD STATUSES lines into {lowercased title: lowercased status text}."""
+    statuses = {}
+    # - "Title" by Author | Status: <status> | Branch: <branch>
+    for match in re.finditer(
+        r'-\s+"([^"]+)"\s+by\s+([^|]+)\|\s*Status:\s*([^|]+)\|\s*Branch:\s*([^|\n]+)',
+        text or "",
+    ):
+        statuses[match.group(1).strip().lower()] = match.group(3).strip().lower()
+    return statuses
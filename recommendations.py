@@ -0,0 +1,108 @@
+"""Reads and writes for a family's recommendations.
+
+Every stage goes through here so status queries are a single "in" query with
+a field projection, and status writes go out as one transaction.
+
+Status lifecycle: recommended → hold_placed → in_transit → ready → picked_up
+(a hold the agent couldn't place is parked as hold_failed). Every status
+write also stamps <status>_at, so hold_timing can learn transit times, and
+appends to the family's status_events log and book_history index in the
+same transaction.
+"""
+
+from datetime import datetime, timezone
+
+import book_history
+import status_events
+import storage
+
+
+def load(
+    family_id: str,
+    statuses: list[str],
+    fields: list[str] | None = None,
+    newest_first: bool = False,
+) -> list[dict]:
+    """Load recommendations whose status is any of statuses, in one query.
+
+    fields projects the documents down to just those fields ("status" is always
+    included). newest_first orders by updated_at and, on Firestore, needs the
+    composite index in firestore.indexes.json.
+    """
+    return storage.load_recommendations(family_id, statuses, fields, newest_first)
+
+
+def get_many(family_id: str, doc_ids: list[str], fields: list[str]) -> dict[str, dict]:
+    """{doc_id: rec projected to fields} for the doc_ids that still exist."""
+    return storage.get_recommendations(family_id, doc_ids, fields)
+
+
+def update(family_id: str, fields: dict[str, dict]) -> None:
+    """Write {doc_id: fields} that aren't status changes (no event is logged)."""
+    storage.write_recommendations(family_id, updates=fields)
+
+
+def set_statuses(family_id: str, statuses: dict[str, str], recs: list[dict] | None = None) -> None:
+    """Write {doc_id: new_status} in one transaction, stamping updated_at.
+
+    Pass the loaded recs (with title/author) so book_history and the status
+    events carry the books' titles.
+    """
+    if not statuses:
+        return
+    now = datetime.now(timezone.utc)
+    by_id = {rec["doc_id"]: rec for rec in recs or []}
+    changed = [{**by_id[doc_id], "status": status} for doc_id, status in statuses.items() if doc_id in by_id]
+    storage.write_recommendations(
+        family_id,
+        updates={
+            doc_id: {"status": status, "updated_at": now, f"{status}_at": now}
+            for doc_id, status in statuses.items()
+        },
+        events=[status_events.event(doc_id, by_id.get(doc_id), status) for doc_id, status in statuses.items()],
+        history=book_history.entries(changed),
+    )
+
+
+def set_status(family_id: str, doc_id: str, status: str, book: dict | None = None, **fields) -> None:
+    """Write one doc's status (plus any extra fields) immediately.
+
+    Pass the rec (with title/author) as book so book_history and the status
+    event carry its title.
+    """
+    now = datetime.now(timezone.utc)
+    storage.write_recommendations(
+        family_id,
+        updates={doc_id: {"status": status, "updated_at": now, f"{status}_at": now, **fields}},
+        events=[status_events.event(doc_id, book, status)],
+        history=book_history.entries([book] if book else [], status),
+    )
+
+
+def replace_recommended(family_id: str, books: list[dict]) -> None:
+    """Swap the family's "recommended" docs for books in a single transaction,
+    so readers never see the list half-deleted or duplicated."""
+    stale = load(family_id, ["recommended"], fields=["title", "author"])
+    events = [status_events.event(rec["doc_id"], rec, "replaced") for rec in stale]
+    # Dropped picks stay in the history so they aren't suggested again
+    history = book_history.entries(stale, "replaced")
+
+    now = datetime.now(timezone.utc)
+    creates = {}
+    for book in books:
+        doc_id = storage.new_id()
+        creates[doc_id] = {
+            "title": book["title"],
+            "author": book["author"],
+            "why": book["why"],
+            "branch": book.get("branch", ""),
+            "status": "recommended",
+            "searched_at": now,
+            "updated_at": now,
+            "recommended_at": now,
+        }
+        events.append(status_events.event(doc_id, book, "recommended"))
+    history.update(book_history.entries(books, "recommended"))
+    storage.write_recommendations(
+        family_id, creates=creates, deletes=[rec["doc_id"] for rec in stale], events=events, history=history
+    )
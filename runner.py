@@ -0,0 +1,137 @@
+"""Run the pipeline for many families concurrently.
+
+Each family runs its stages in order (search → hold → sync → notify) while
+families run side by side. Browser sessions are capped by browser_pool, so
+the number of live Chromium instances stays bounded no matter how many
+families are in flight.
+
+Every family runs on its own accounts (config.ACCOUNT_ENV fields in its
+config); a family missing any of them is refused rather than run on the
+shared env credentials.
+"""
+
+import argparse
+import asyncio
+import importlib
+import time
+
+import browser_pool
+import config
+import metrics
+import sessions
+from config import load_families
+
+# stage name -> module whose main(family_id) runs it
+STAGES = {
+    "search": "main",
+    "hold": "hold",
+    "sync": "sync_holds",
+    "notify": "notify_parent",
+}
+
+
+async def run_stage(stage: str, family_id: str) -> None:
+    """Run a single stage's main() for one family."""
+    module = importlib.import_module(STAGES[stage])
+    with metrics.stage(stage, family_id):
+        if asyncio.iscoroutinefunction(module.main):
+            await module.main(family_id)
+        else:
+            await asyncio.to_thread(module.main, family_id)
+
+
+async def run_family(family_id: str, stages: list[str], family_slots: asyncio.Semaphore) -> list[str]:
+    """Run stages in order for one family. Returns the stages that failed."""
+    failed = []
+    async with family_slots:
+        for stage in stages:
+            print(f"[{family_id}] {stage}: starting")
+            try:
+                await run_stage(stage, family_id)
+            except Exception as e:
+                print(f"[{family_id}] {stage}: failed: {e!r}")
+                failed.append(stage)
+    return failed
+
+
+async def run(family_ids: list[str], stages: list[str], max_families: int) -> dict[str, list[str]]:
+    """Run stages for every family, at most max_families at a time."""
+    family_slots = asyncio.Semaphore(max_families)
+    config.allow_shared_accounts(False)
+    # One read for every family up front; each stage's load_family() then hits the cache
+    families = await asyncio.to_thread(load_families, family_ids)
+    results = {}
+    for family_id in family_ids:
+        missing = config.missing_accounts(families.get(family_id, {"family_id": family_id}))
+        if missing:
+            print(f"[{family_id}] refusing to run: family config lacks {', '.join(missing)}")
+            results[family_id] = list(stages)
+    runnable = [fid for fid in family_ids if fid not in results]
+    try:
+        done = await asyncio.gather(
+            *(run_family(fid, stages, family_slots) for fid in runnable)
+        )
+    finally:
+        await sessions.close_all()
+        metrics.export()
+    results.update(zip(runnable, done))
+    return {fid: results[fid] for fid in family_ids}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--stages", default=",".join(STAGES),
+        help=f"comma-separated stages to run, in order (default: {','.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--families", default="",
+        help="comma-separated family IDs (default: every document under families/)",
+    )
+    parser.add_argument(
+        "--max-browsers", type=int, default=browser_pool.MAX_BROWSERS,
+        help="maximum simultaneous browser sessions",
+    )
+    parser.add_argument(
+        "--max-families", type=int, default=32,
+        help="maximum families in flight at once",
+    )
+    parser.add_argument(
+        "--site-min-interval", type=float, default=browser_pool.SITE_MIN_INTERVAL,
+        help="minimum seconds between agent steps against the same site",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {', '.join(unknown)}")
+
+    browser_pool.configure(
+        max_browsers=args.max_browsers, site_min_interval=args.site_min_interval,
+    )
+
+    family_ids = [f.strip() for f in args.families.split(",") if f.strip()]
+    if not family_ids:
+        family_ids = sorted(load_families())
+    if not family_ids:
+        print("No families found. Nothing to run.")
+        return
+
+    print(f"Running {', '.join(stages)} for {len(family_ids)} families "
+          f"(max {args.max_browsers} browsers)")
+    start = time.monotonic()
+    results = asyncio.run(run(family_ids, stages, args.max_families))
+    elapsed = time.monotonic() - start
+
+    failures = {fid: failed for fid, failed in results.items() if failed}
+    print(f"Finished {len(family_ids)} families in {elapsed:.1f}s, {len(failures)} with failures")
+    for fid, failed in failures.items():
+        print(f"  - {fid}: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
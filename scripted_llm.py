@@ -0,0 +1,128 @@
+"""Scripted stand-in chat model for offline benchmarks.
+
+Implements the browser_use chat-model interface without any API calls. It
+recognises which pipeline prompt it was handed and answers it the way a
+well-behaved model would: a ranked book list for the brainstorm, and a
+"done" action carrying the expected report for browser agents. Given the
+fake_catalog.py site, browser agents first walk its pages one navigation per
+step (home, then each book's search results and detail page, or the holds
+page), so page loads and DOM extraction are part of what's measured.
+Install it with models.use(lambda stage: ScriptedLLM(books, site=...)).
+"""
+
+import re
+
+from browser_use.llm.views import ChatInvokeCompletion
+
+import fake_catalog
+
+# Titles with recorded fixtures in fixtures/catalog.
+FIXTURE_BOOKS = [
+    ("Dragons Love Tacos", "Adam Rubin"),
+    ("Rosie Revere, Engineer", "Andrea Beaty"),
+    ("National Geographic Little Kids First Big Book of Dinosaurs", "Catherine D. Hughes"),
+    ("The Very Hungry Caterpillar", "Eric Carle"),
+]
+
+
+def _text(messages) -> str:
+    parts = []
+    for message in messages:
+        content = getattr(message, "content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(getattr(p, "text", "") for p in content or [])
+    return "\n".join(parts)
+
+
+def _placeholder(output_format):
+    """Fill a structured output model (e.g. the judge verdict) with benign defaults."""
+    defaults = {bool: True, str: "", int: 0, float: 0.0}
+    data = {}
+    for name, field in output_format.model_fields.items():
+        if field.is_required():
+            data[name] = defaults.get(field.annotation, None)
+    return output_format.model_validate(data)
+
+
+class ScriptedLLM:
+    _verified_api_keys = True
+
+    def __init__(self, books=FIXTURE_BOOKS, hold_status: str = "Ready for pickup", branch: str = "Noe Valley",
+                 site: str | None = None):
+        """site is the fake catalog's origin (http://127.0.0.1:<port>); without
+        it browser agents report straight away."""
+        self.model = "scripted"
+        self.books = list(books)
+        self.hold_status = hold_status
+        self.branch = branch
+        self.site = site
+        self.calls = 0
+
+    @property
+    def provider(self) -> str:
+        return "scripted"
+
+    @property
+    def name(self) -> str:
+        return self.model
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    def reply(self, prompt: str) -> str:
+        """The report a model would write for this prompt."""
+        if "place holds on books" in prompt:
+            titles = re.findall(r'^\d+\.\s+"([^"]+)" by ', prompt, re.MULTILINE)
+            lines = [f'{i}. "{t}" — Hold placed successfully (pickup at {self.branch})'
+                     for i, t in enumerate(titles, 1)]
+            return "HOLD RESULTS:\n" + "\n".join(lines)
+        if "check the status of my holds" in prompt:
+            lines = [f'- "{t}" by {a} | Status: {self.hold_status} | Branch: {self.branch}'
+                     for t, a in self.books]
+            return "HOLD STATUSES:\n" + "\n".join(lines)
+        if "Check whether one book is available" in prompt:
+            return f"AVAILABLE at {self.branch}"
+        return "\n".join(
+            f'{i}. "{t}" by {a} — A good fit for their interests'
+            for i, (t, a) in enumerate(self.books, 1)
+        )
+
+    def route(self, prompt: str) -> list[str]:
+        """The fake catalog pages a model would visit for this prompt, in order."""
+        if not self.site:
+            return []
+        if "place holds on books" in prompt:
+            titles = re.findall(r'^\d+\.\s+"([^"]+)" by ', prompt, re.MULTILINE)
+        elif "Check whether one book is available" in prompt:
+            titles = re.findall(r'^Book: "([^"]+)"', prompt, re.MULTILINE)[:1]
+        elif "check the status of my holds" in prompt:
+            return [self.site + fake_catalog.SITE, self.site + fake_catalog.SITE + "/holds"]
+        else:
+            return []
+        pages = [fake_catalog.SITE]
+        for title in titles:
+            pages += [fake_catalog.search_page_url(title), fake_catalog.bib_page_url(title)]
+        return [self.site + page for page in pages if page]
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        self.calls += 1
+        prompt = _text(messages)
+        text = self.reply(prompt)
+        if output_format is None:
+            completion = text
+        elif "action" in output_format.model_fields:
+            # browser_use keeps "Navigated to <url>" in the agent history
+            todo = [url for url in self.route(prompt) if f"Navigated to {url}" not in prompt]
+            action = {"navigate": {"url": todo[0]}} if todo else {"done": {"text": text, "success": True}}
+            completion = output_format.model_validate({
+                "evaluation_previous_goal": "",
+                "memory": "",
+                "next_goal": f"Open {todo[0]}" if todo else "Report the result",
+                "action": [action],
+            })
+        else:
+            completion = _placeholder(output_format)
+        return ChatInvokeCompletion(completion=completion, usage=None)
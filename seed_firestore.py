@@ -1,22 +1,28 @@
-"""One-time script to seed the families/leo document in Firestore."""
+"""One-time script to seed the families/leo document (in the configured storage backend)."""
+
+import os
 
 from dotenv import load_dotenv
 
-from firestore_client import get_db
+import storage
 
 load_dotenv()
 
 
 def seed():
-    db = get_db()
-    db.collection("families").document("leo").set({
+    storage.put_family("leo", {
         "parent_name": "Dalton",
         "child_name": "Leo",
         "child_age": 4,
         "preferred_branch": "Noe Valley",
         "phone_number": "+19492806125",
+        # The family's own accounts (see config.ACCOUNT_ENV), taken from .env;
+        # the PIN stays in the environment, the doc only names its variable
+        "cartesia_agent_id": os.getenv("CARTESIA_AGENT_ID", ""),
+        "sfpl_username": os.getenv("SFPL_USERNAME", ""),
+        "sfpl_password_env": "SFPL_PASSWORD",
     })
-    print("Seeded families/leo")
+    print(f"Seeded families/leo ({storage.STORAGE_BACKEND})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,258 @@
+"""Warm, reusable SFPL browser sessions.
+
+Cookies for each library account are persisted to SESSION_DIR/<account>.json
+through browser_use's storage_state support, so a login done by hold.py is
+picked up by sync_holds.py (or the next run) without another trip through the
+login form. Within one process, browsers are kept alive after an agent
+finishes and handed to the next caller instead of launching a cold Chromium.
+Set BROWSER_CDP_URL to attach to a long-lived Chromium shared by every run.
+
+Browsers use a lean profile unless BROWSER_LEAN=0: headless, images off,
+analytics/ad hosts resolved to nothing (BROWSER_BLOCKED_HOSTS), a fixed
+viewport, shorter page-load waits and no element highlighting. agent_kwargs()
+has the matching Agent settings — text-only page state and a capped history
+— so the LLM is fed less per step.
+
+BROWSER_ALLOWED_HOSTS (any profile) limits where a browser may navigate, and
+AGENT_OPEN_TASK_URL=0 stops agents opening the URL in their task before the
+LLM's first step; the offline benchmark uses both to stay on localhost.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+import config
+from browser_pool import browser_slot
+
+# browser_use (and Chromium tooling) is only imported once a browser is
+# actually needed, so stages that never browse start quickly.
+if TYPE_CHECKING:
+    from browser_use import Browser
+
+SESSION_DIR = os.getenv("SESSION_DIR", os.path.join(os.path.dirname(__file__), ".sessions"))
+BROWSER_CDP_URL = os.getenv("BROWSER_CDP_URL", "")
+MAX_WARM_BROWSERS = int(os.getenv("MAX_WARM_BROWSERS", "2"))
+
+BROWSER_LEAN = os.getenv("BROWSER_LEAN", "1") != "0"
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "1") != "0"
+BROWSER_VIEWPORT = tuple(int(n) for n in os.getenv("BROWSER_VIEWPORT", "1280x900").split("x"))
+# Third-party hosts sfpl.org / BiblioCommons pages pull in that agents never need.
+BROWSER_BLOCKED_HOSTS = [h for h in os.getenv("BROWSER_BLOCKED_HOSTS", ",".join([
+    "*.google-analytics.com",
+    "*.googletagmanager.com",
+    "*.doubleclick.net",
+    "*.googlesyndication.com",
+    "*.facebook.net",
+    "*.facebook.com",
+    "*.hotjar.com",
+    "*.newrelic.com",
+    "*.nr-data.net",
+    "*.siteimprove.com",
+    "*.siteimproveanalytics.io",
+    "*.addthis.com",
+    "*.twitter.com",
+    "fonts.googleapis.com",
+    "fonts.gstatic.com",
+])).split(",") if h]
+# Hosts a browser may navigate to (empty allows any).
+BROWSER_ALLOWED_HOSTS = [h for h in os.getenv("BROWSER_ALLOWED_HOSTS", "").split(",") if h]
+AGENT_OPEN_TASK_URL = os.getenv("AGENT_OPEN_TASK_URL", "1") != "0"
+AGENT_USE_VISION = os.getenv("AGENT_USE_VISION", "0") == "1"
+AGENT_SCREENSHOT_SIZE = (1024, 720)
+AGENT_MAX_HISTORY_ITEMS = int(os.getenv("AGENT_MAX_HISTORY_ITEMS", "12"))
+
+# Account key for browsing that doesn't need a login (catalog search).
+ANONYMOUS = "anonymous"
+
+# Cookies that only exist while an SFPL (BiblioCommons) login is valid.
+AUTH_COOKIE_DOMAINS = ("sfpl.org", "bibliocommons.com")
+AUTH_COOKIE_NAMES = tuple(
+    os.getenv("SFPL_AUTH_COOKIES", "bc_access_token,session_id").split(",")
+)
+
+_idle: dict[str, list["Browser"]] = {}
+
+
+def storage_state_path(account: str) -> str:
+    """Path of the persisted cookie/localStorage file for a library account."""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", account)
+    return os.path.join(SESSION_DIR, f"{safe}.json")
+
+
+def is_logged_in(account: str) -> bool:
+    """Cheap session check: does the saved state hold an unexpired auth cookie?
+
+    Reads the storage state file only — no browser or network round trip.
+    """
+    try:
+        with open(storage_state_path(account)) as f:
+            cookies = json.load(f).get("cookies", [])
+    except (OSError, ValueError):
+        return False
+
+    now = time.time()
+    for cookie in cookies:
+        if not any(d in cookie.get("domain", "") for d in AUTH_COOKIE_DOMAINS):
+            continue
+        if cookie.get("name") not in AUTH_COOKIE_NAMES:
+            continue
+        expires = cookie.get("expires", -1)
+        # -1 is a session cookie; it survives as long as the saved state does
+        if expires == -1 or expires > now:
+            return True
+    return False
+
+
+def sfpl_credentials(family: dict) -> tuple[str, str]:
+    """(username, password) of the family's SFPL card, read when a stage needs them."""
+    return config.account(family, "sfpl_username"), config.account(family, "sfpl_password")
+
+
+def sfpl_sensitive_data(family: dict) -> dict:
+    """Agent(sensitive_data=...) for the family's SFPL card.
+
+    The task and the model only ever see the x_username / x_password
+    placeholders (so neither lands in prompts, cache keys or recordings);
+    browser_use fills them in on SFPL's own domains.
+    """
+    username, password = sfpl_credentials(family)
+    secrets = {"x_username": username, "x_password": password}
+    return {f"https://*.{domain}": secrets for domain in AUTH_COOKIE_DOMAINS}
+
+
+def login_step(username: str) -> str:
+    """Prompt text for the login step, shortened when a saved session is still valid.
+
+    The credentials themselves are sfpl_sensitive_data() placeholders.
+    """
+    if is_logged_in(username):
+        return """\
+Go to https://sfpl.org. You should already be logged in from a previous session —
+confirm you see your account (e.g. your name or "My Account") and move on.
+Only if you see a "Log In" link instead, log in:
+- Username/Barcode: <secret>x_username</secret>
+- Password/PIN: <secret>x_password</secret>
+If login fails, report the error and call "done" immediately."""
+    return """\
+Go to https://sfpl.org and log in:
+- Click "Log In" in the top navigation
+- Username/Barcode: <secret>x_username</secret>
+- Password/PIN: <secret>x_password</secret>
+- After logging in, confirm you see your account (e.g. your name or "My Account").
+  If login fails, report the error and call "done" immediately."""
+
+
+def configure(lean: bool | None = None) -> None:
+    """Override BROWSER_LEAN. Call before any browser is started."""
+    global BROWSER_LEAN
+    if lean is not None:
+        BROWSER_LEAN = lean
+
+
+def profile_kwargs() -> dict:
+    """Browser settings of the lean profile (empty when BROWSER_LEAN=0).
+
+    browser_use has no request-interception hook, so blocking is done with
+    Chromium flags: images are switched off in Blink and blocked hosts fail
+    DNS resolution immediately.
+    """
+    if not BROWSER_LEAN:
+        return {}
+    width, height = BROWSER_VIEWPORT
+    args = ["--blink-settings=imagesEnabled=false"]
+    if BROWSER_BLOCKED_HOSTS:
+        rules = ", ".join(f"MAP {host} ~NOTFOUND" for host in BROWSER_BLOCKED_HOSTS)
+        args.append(f"--host-resolver-rules={rules}")
+    return {
+        "headless": BROWSER_HEADLESS,
+        "args": args,
+        "viewport": {"width": width, "height": height},
+        "window_size": {"width": width, "height": height},
+        "minimum_wait_page_load_time": 0.1,
+        "wait_for_network_idle_page_load_time": 0.25,
+        "wait_between_actions": 0.05,
+        "highlight_elements": False,
+        "cross_origin_iframes": False,
+    }
+
+
+def agent_kwargs() -> dict:
+    """Agent settings that trim the page state sent to the LLM each step."""
+    kwargs = {} if AGENT_OPEN_TASK_URL else {"directly_open_url": False}
+    if BROWSER_LEAN:
+        kwargs.update({
+            "use_vision": AGENT_USE_VISION,
+            "llm_screenshot_size": AGENT_SCREENSHOT_SIZE,
+            "max_history_items": AGENT_MAX_HISTORY_ITEMS,
+        })
+    return kwargs
+
+
+def _new_browser(account: str) -> "Browser":
+    from browser_use import Browser
+
+    if BROWSER_CDP_URL:
+        # Launch flags belong to whoever started that Chromium; only the
+        # page-load and highlight settings apply when attaching.
+        profile = {k: v for k, v in profile_kwargs().items()
+                   if k not in ("headless", "args", "window_size")}
+    else:
+        profile = profile_kwargs()
+        profile["storage_state"] = storage_state_path(account)
+        os.makedirs(SESSION_DIR, exist_ok=True)
+    if BROWSER_ALLOWED_HOSTS:
+        profile["allowed_domains"] = BROWSER_ALLOWED_HOSTS
+    if BROWSER_CDP_URL:
+        return Browser(cdp_url=BROWSER_CDP_URL, keep_alive=True, **profile)
+    return Browser(keep_alive=True, **profile)
+
+
+async def save(browser: "Browser") -> None:
+    """Flush the browser's cookies to its storage state file now."""
+    from browser_use.browser.events import SaveStorageStateEvent
+
+    await browser.event_bus.dispatch(SaveStorageStateEvent())
+
+
+@asynccontextmanager
+async def session(account: str = ANONYMOUS):
+    """Check out a warm browser for account, holding a browser_pool slot.
+
+    The browser is returned to the idle list afterwards; a browser that raised
+    is killed rather than reused.
+    """
+    async with browser_slot():
+        idle = _idle.setdefault(account, [])
+        browser = idle.pop() if idle else _new_browser(account)
+        try:
+            yield browser
+        except BaseException:
+            await browser.kill()
+            raise
+        await save(browser)
+        if sum(len(b) for b in _idle.values()) < MAX_WARM_BROWSERS:
+            idle.append(browser)
+        else:
+            await browser.kill()
+
+
+async def close_all() -> None:
+    """Kill every idle browser. Call once before the process exits."""
+    browsers = [b for idle in _idle.values() for b in idle]
+    _idle.clear()
+    await asyncio.gather(*(b.kill() for b in browsers), return_exceptions=True)
+
+
+def run(coro) -> None:
+    """asyncio.run(coro), then shut down any warm browsers it left behind."""
+    async def wrapper():
+        try:
+            await coro
+        finally:
+            await close_all()
+    asyncio.run(wrapper())
@@ -0,0 +1,484 @@
+"""Embedded SQLite storage backend (see storage.py).
+
+One WAL-mode database file at STORAGE_PATH, shared by every thread and
+process of a run. Documents are stored as JSON, with the columns queries
+filter or sort on (family_id, status, updated_at, seq, ...) pulled out and
+indexed. Datetimes are tagged in the JSON so they round-trip as
+timezone-aware datetimes, and are kept as UTC epoch seconds in the indexed
+columns.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+STORAGE_PATH = os.getenv(
+    "STORAGE_PATH", os.path.join(os.path.dirname(__file__), ".storage", "pipeline.sqlite3")
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS families (
+    family_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    family_id TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    call_id TEXT,
+    created_at REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (family_id, doc_id)
+);
+CREATE INDEX IF NOT EXISTS summaries_created ON summaries (family_id, created_at);
+CREATE INDEX IF NOT EXISTS summaries_call ON summaries (family_id, call_id);
+CREATE TABLE IF NOT EXISTS recommendations (
+    family_id TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    status TEXT,
+    updated_at REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (family_id, doc_id)
+);
+CREATE INDEX IF NOT EXISTS recommendations_status ON recommendations (family_id, status, updated_at);
+CREATE INDEX IF NOT EXISTS recommendations_status_all ON recommendations (status, family_id);
+CREATE TABLE IF NOT EXISTS status_events (
+    family_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    doc_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (family_id, seq)
+);
+CREATE INDEX IF NOT EXISTS status_events_doc ON status_events (family_id, doc_id, seq);
+CREATE INDEX IF NOT EXISTS status_events_status ON status_events (status, at);
+CREATE TABLE IF NOT EXISTS book_history (
+    family_id TEXT NOT NULL,
+    book_key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (family_id, book_key)
+);
+CREATE TABLE IF NOT EXISTS pending_calls (
+    phone_number TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    family_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (family_id, name)
+);
+CREATE INDEX IF NOT EXISTS state_name ON state (name);
+CREATE TABLE IF NOT EXISTS search_runs (
+    family_id TEXT NOT NULL,
+    created_at REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_runs_family ON search_runs (family_id, created_at);
+CREATE TABLE IF NOT EXISTS docs (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+_watchers: list = []
+
+
+def _connect() -> sqlite3.Connection:
+    """This thread's connection; stages call storage from worker threads."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    with _init_lock:
+        if not _initialized:
+            os.makedirs(os.path.dirname(STORAGE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(STORAGE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not _initialized:
+            conn.executescript(_SCHEMA)
+            _initialized = True
+    _local.conn = conn
+    return conn
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so read-modify-writes (seqs, merges) don't race."""
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn = _connect()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _hook(obj: dict):
+    if len(obj) == 1 and "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, default=_default)
+
+
+def _loads(text: str) -> dict:
+    return json.loads(text, object_hook=_hook)
+
+
+def _epoch(value) -> float | None:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+def _project(data: dict, fields: list[str] | None) -> dict:
+    if fields is None:
+        return data
+    return {k: v for k, v in data.items() if k in fields}
+
+
+def _merge(old: dict, new: dict) -> dict:
+    """Firestore set(merge=True): nested dicts merge key by key, other values replace."""
+    merged = dict(old)
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _marks(values: list) -> str:
+    return ", ".join("?" for _ in values)
+
+
+# Families
+
+def get_families(family_ids: list[str] | None = None) -> dict[str, dict]:
+    conn = _connect()
+    if family_ids is None:
+        rows = conn.execute("SELECT family_id, data FROM families").fetchall()
+    else:
+        rows = conn.execute(
+            f"SELECT family_id, data FROM families WHERE family_id IN ({_marks(family_ids)})", family_ids
+        ).fetchall()
+    return {family_id: _loads(data) for family_id, data in rows}
+
+
+def list_family_ids() -> list[str]:
+    return [row[0] for row in _connect().execute("SELECT family_id FROM families ORDER BY family_id")]
+
+
+def put_family(family_id: str, data: dict) -> None:
+    _connect().execute(
+        "INSERT OR REPLACE INTO families (family_id, data) VALUES (?, ?)", (family_id, _dumps(data))
+    )
+    for on_change in list(_watchers):
+        on_change(family_id, dict(data))
+
+
+class _Watch:
+    """Changes made through put_family() in this process, delivered synchronously."""
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        _watchers.append(on_change)
+
+    def unsubscribe(self) -> None:
+        if self.on_change in _watchers:
+            _watchers.remove(self.on_change)
+
+
+def watch_families(on_change) -> _Watch:
+    return _Watch(on_change)
+
+
+# Call summaries
+
+def existing_call_ids(family_id: str, call_ids: list[str]) -> set[str]:
+    if not call_ids:
+        return set()
+    marks = _marks(call_ids)
+    rows = _connect().execute(
+        f"SELECT doc_id FROM summaries WHERE family_id = ? AND doc_id IN ({marks}) "
+        f"UNION SELECT call_id FROM summaries WHERE family_id = ? AND call_id IN ({marks})",
+        [family_id, *call_ids, family_id, *call_ids],
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def add_summaries(family_id: str, summaries: dict[str, dict]) -> None:
+    with _Transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO summaries (family_id, doc_id, call_id, created_at, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (family_id, doc_id, data.get("call_id"), _epoch(data.get("created_at")), _dumps(data))
+                for doc_id, data in summaries.items()
+            ],
+        )
+
+
+def latest_summaries(family_id: str, limit: int, fields: list[str]) -> list[dict]:
+    rows = _connect().execute(
+        "SELECT data FROM summaries WHERE family_id = ? ORDER BY created_at DESC LIMIT ?",
+        (family_id, limit),
+    ).fetchall()
+    return [_project(_loads(row[0]), fields) for row in rows]
+
+
+# Recommendations
+
+def load_recommendations(
+    family_id: str,
+    statuses: list[str] | None,
+    fields: list[str] | None = None,
+    newest_first: bool = False,
+) -> list[dict]:
+    sql = "SELECT doc_id, data FROM recommendations WHERE family_id = ?"
+    params = [family_id]
+    if statuses is not None:
+        sql += f" AND status IN ({_marks(statuses)})"
+        params += statuses
+    if newest_first:
+        sql += " ORDER BY updated_at DESC"
+    keep = None if fields is None else {*fields, "status"}
+    recs = []
+    for doc_id, data in _connect().execute(sql, params):
+        rec = _project(_loads(data), keep)
+        rec["doc_id"] = doc_id
+        recs.append(rec)
+    return recs
+
+
+def get_recommendations(family_id: str, doc_ids: list[str], fields: list[str]) -> dict[str, dict]:
+    if not doc_ids:
+        return {}
+    rows = _connect().execute(
+        f"SELECT doc_id, data FROM recommendations WHERE family_id = ? AND doc_id IN ({_marks(doc_ids)})",
+        [family_id, *doc_ids],
+    ).fetchall()
+    return {doc_id: _project(_loads(data), fields) for doc_id, data in rows}
+
+
+def _put_rec(conn: sqlite3.Connection, family_id: str, doc_id: str, data: dict) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO recommendations (family_id, doc_id, status, updated_at, data) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (family_id, doc_id, data.get("status"), _epoch(data.get("updated_at")), _dumps(data)),
+    )
+
+
+def write_recommendations(
+    family_id: str,
+    updates: dict[str, dict],
+    creates: dict[str, dict],
+    deletes: list[str],
+    events: list[dict],
+    history: dict[str, dict],
+) -> None:
+    with _Transaction() as conn:
+        if deletes:
+            conn.execute(
+                f"DELETE FROM recommendations WHERE family_id = ? AND doc_id IN ({_marks(deletes)})",
+                [family_id, *deletes],
+            )
+        for doc_id, data in creates.items():
+            _put_rec(conn, family_id, doc_id, data)
+        for doc_id, fields in updates.items():
+            row = conn.execute(
+                "SELECT data FROM recommendations WHERE family_id = ? AND doc_id = ?", (family_id, doc_id)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"No recommendation {doc_id} for family {family_id}")
+            _put_rec(conn, family_id, doc_id, {**_loads(row[0]), **fields})
+        conn.executemany(
+            "INSERT OR REPLACE INTO book_history (family_id, book_key, data) VALUES (?, ?, ?)",
+            [(family_id, key, _dumps(entry)) for key, entry in history.items()],
+        )
+        if events:
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM status_events WHERE family_id = ?", (family_id,)
+            ).fetchone()[0]
+            now = datetime.now(timezone.utc)
+            rows = []
+            for e in events:
+                seq += 1
+                rows.append((family_id, seq, e["doc_id"], e["status"], now.timestamp(),
+                             _dumps({**e, "seq": seq, "at": now})))
+            conn.executemany(
+                "INSERT INTO status_events (family_id, seq, doc_id, status, at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+def families_with_status(statuses: list[str]) -> set[str]:
+    rows = _connect().execute(
+        f"SELECT DISTINCT family_id FROM recommendations WHERE status IN ({_marks(statuses)})", statuses
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+# Status events
+
+def last_event_seq(family_id: str) -> int:
+    return _connect().execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM status_events WHERE family_id = ?", (family_id,)
+    ).fetchone()[0]
+
+
+def events_since(family_id: str, cursor: int, limit: int | None = None) -> list[dict]:
+    sql = "SELECT data FROM status_events WHERE family_id = ? AND seq > ? ORDER BY seq"
+    params = [family_id, cursor]
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [_loads(row[0]) for row in _connect().execute(sql, params)]
+
+
+def event_history(family_id: str, doc_id: str) -> list[dict]:
+    rows = _connect().execute(
+        "SELECT data FROM status_events WHERE family_id = ? AND doc_id = ? ORDER BY seq", (family_id, doc_id)
+    ).fetchall()
+    return [_loads(row[0]) for row in rows]
+
+
+def families_with_event(status: str, since: datetime) -> set[str]:
+    rows = _connect().execute(
+        "SELECT DISTINCT family_id FROM status_events WHERE status = ? AND at > ?", (status, since.timestamp())
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+# Book history
+
+def load_book_history(family_id: str) -> dict[str, dict] | None:
+    conn = _connect()
+    rows = conn.execute("SELECT book_key, data FROM book_history WHERE family_id = ?", (family_id,)).fetchall()
+    # Status writes add entries before any rebuild; only put_book_history marks it built
+    if not get_state(family_id, "book_history").get("built_at"):
+        return None
+    return {key: _loads(data) for key, data in rows}
+
+
+def put_book_history(family_id: str, books: dict[str, dict]) -> None:
+    with _Transaction() as conn:
+        conn.execute("DELETE FROM book_history WHERE family_id = ?", (family_id,))
+        conn.executemany(
+            "INSERT INTO book_history (family_id, book_key, data) VALUES (?, ?, ?)",
+            [(family_id, key, _dumps(entry)) for key, entry in books.items()],
+        )
+        _put_state(conn, family_id, "book_history", {"built_at": datetime.now(timezone.utc)})
+
+
+# Pending calls
+
+def put_pending_call(phone_number: str, data: dict) -> None:
+    _connect().execute(
+        "INSERT OR REPLACE INTO pending_calls (phone_number, data) VALUES (?, ?)",
+        (phone_number, _dumps({**data, "created_at": datetime.now(timezone.utc)})),
+    )
+
+
+# Per-family state
+
+def _put_state(conn: sqlite3.Connection, family_id: str, name: str, data: dict) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO state (family_id, name, data) VALUES (?, ?, ?)", (family_id, name, _dumps(data))
+    )
+
+
+def get_state(family_id: str, name: str) -> dict:
+    row = _connect().execute(
+        "SELECT data FROM state WHERE family_id = ? AND name = ?", (family_id, name)
+    ).fetchone()
+    return _loads(row[0]) if row else {}
+
+
+def get_states(family_ids: list[str], name: str) -> dict[str, dict]:
+    if not family_ids:
+        return {}
+    rows = _connect().execute(
+        f"SELECT family_id, data FROM state WHERE name = ? AND family_id IN ({_marks(family_ids)})",
+        [name, *family_ids],
+    ).fetchall()
+    return {family_id: _loads(data) for family_id, data in rows}
+
+
+def set_state(family_id: str, name: str, data: dict, merge: bool = False) -> None:
+    with _Transaction() as conn:
+        if merge:
+            row = conn.execute(
+                "SELECT data FROM state WHERE family_id = ? AND name = ?", (family_id, name)
+            ).fetchone()
+            data = _merge(_loads(row[0]) if row else {}, data)
+        _put_state(conn, family_id, name, data)
+
+
+def delete_state(family_id: str, name: str) -> None:
+    _connect().execute("DELETE FROM state WHERE family_id = ? AND name = ?", (family_id, name))
+
+
+def families_with_state(name: str, field: str) -> set[str]:
+    rows = _connect().execute(
+        "SELECT family_id FROM state WHERE name = ? AND json_extract(data, ?) > 0", (name, f"$.{field}")
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def add_search_run(family_id: str, run: dict) -> None:
+    _connect().execute(
+        "INSERT INTO search_runs (family_id, created_at, data) VALUES (?, ?, ?)",
+        (family_id, _epoch(run.get("created_at")) or time.time(), _dumps(run)),
+    )
+
+
+# Global documents
+
+def get_docs(collection: str, doc_ids: list[str]) -> dict[str, dict]:
+    if not doc_ids:
+        return {}
+    rows = _connect().execute(
+        f"SELECT doc_id, data FROM docs WHERE collection = ? AND doc_id IN ({_marks(doc_ids)})",
+        [collection, *doc_ids],
+    ).fetchall()
+    return {doc_id: _loads(data) for doc_id, data in rows}
+
+
+def set_docs(collection: str, docs: dict[str, dict]) -> None:
+    with _Transaction() as conn:
+        _put_docs(conn, collection, docs)
+
+
+def update_docs(collection: str, doc_ids: list[str], apply) -> None:
+    with _Transaction() as conn:
+        rows = conn.execute(
+            f"SELECT doc_id, data FROM docs WHERE collection = ? AND doc_id IN ({_marks(doc_ids)})",
+            [collection, *doc_ids],
+        ).fetchall()
+        _put_docs(conn, collection, apply({doc_id: _loads(data) for doc_id, data in rows}))
+
+
+def _put_docs(conn: sqlite3.Connection, collection: str, docs: dict[str, dict]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO docs (collection, doc_id, data) VALUES (?, ?, ?)",
+        [(collection, doc_id, _dumps(data)) for doc_id, data in docs.items()],
+    )
@@ -0,0 +1,49 @@
+"""Append-only log of recommendation status changes, per family.
+
+Every status write in recommendations.py also appends one event per book to
+the family's log (families/{family_id}/status_events/{seq} on Firestore):
+
+    {seq, doc_id, title, author, from_status, status, at}
+
+seq is assigned by the storage backend in the same transaction as the
+status writes, so the log never disagrees with the statuses and seqs
+increase without gaps. A consumer keeps a cursor (the last seq it has
+processed) and reads changes_since(cursor) instead of rescanning every
+recommendation.
+"""
+
+from datetime import datetime
+
+import storage
+
+
+def event(doc_id: str, rec: dict | None, status: str) -> dict:
+    """A status change of one recommendation (rec supplies title/author/old status)."""
+    rec = rec or {}
+    return {
+        "doc_id": doc_id,
+        "title": rec.get("title", ""),
+        "author": rec.get("author", ""),
+        "from_status": rec.get("status", ""),
+        "status": status,
+    }
+
+
+def last_seq(family_id: str) -> int:
+    """The newest seq in the family's log (0 if it's empty)."""
+    return storage.last_event_seq(family_id)
+
+
+def changes_since(family_id: str, cursor: int, limit: int | None = None) -> list[dict]:
+    """Events with seq > cursor, oldest first."""
+    return storage.events_since(family_id, cursor, limit)
+
+
+def history(family_id: str, doc_id: str) -> list[dict]:
+    """Every status change of one recommendation, oldest first."""
+    return storage.event_history(family_id, doc_id)
+
+
+def families_with(status: str, since: datetime) -> set[str]:
+    """Families that logged a change to status after since, across all families."""
+    return storage.families_with_event(status, since)
@@ -0,0 +1,254 @@
+"""Storage for families, call summaries, recommendations and pending calls.
+
+Stages read and write pipeline data through these functions instead of
+reaching into Firestore, so the same code runs against either backend:
+
+    STORAGE_BACKEND=firestore   firestore_storage.py (default)
+    STORAGE_BACKEND=sqlite      sqlite_storage.py, an embedded SQLite file at
+                                STORAGE_PATH — in-process, no network, for
+                                local runs, tests and benchmarks
+
+Besides the four entities, a backend keeps what must change with them: the
+status_events log and book_history index (written in the same transaction
+as recommendation statuses), small per-family state documents
+(families/{id}/sync_state/{name}), a couple of global documents (hold_stats,
+dispatch_state) and the search_runs log.
+
+Timestamps go in and come out as timezone-aware datetimes on both backends.
+
+With STORAGE_READ_ONLY=1 (the default under AGENT_CACHE=replay, so replayed
+agent runs can't change real statuses) reads go through and every write is
+skipped and counted in storage_writes_skipped.
+"""
+
+import importlib
+import os
+import string
+
+import metrics
+
+BACKENDS = {"firestore": "firestore_storage", "sqlite": "sqlite_storage"}
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+STORAGE_READ_ONLY = os.getenv(
+    "STORAGE_READ_ONLY", "1" if os.getenv("AGENT_CACHE") == "replay" else "0"
+) == "1"
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+_backend = None
+
+
+def backend():
+    """The configured backend module, imported on first use."""
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND not in BACKENDS:
+            raise RuntimeError(f"STORAGE_BACKEND must be one of {', '.join(BACKENDS)}")
+        _backend = importlib.import_module(BACKENDS[STORAGE_BACKEND])
+    return _backend
+
+
+def use(name: str) -> None:
+    """Switch backend ("firestore" or "sqlite"). Call before any storage access."""
+    global STORAGE_BACKEND, _backend
+    STORAGE_BACKEND = name
+    _backend = None
+
+
+def _writable(what: str) -> bool:
+    if STORAGE_READ_ONLY:
+        print(f"Read-only storage, skipped {what}")
+        metrics.incr("storage_writes_skipped", op=what)
+    return not STORAGE_READ_ONLY
+
+
+def new_id() -> str:
+    """A random 20-character document ID, like Firestore's auto IDs."""
+    import secrets
+
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+
+# Families
+
+def get_families(family_ids: list[str] | None = None) -> dict[str, dict]:
+    """{family_id: config} for family_ids (every family when None); unknown IDs are left out."""
+    return backend().get_families(family_ids)
+
+
+def list_family_ids() -> list[str]:
+    return backend().list_family_ids()
+
+
+def put_family(family_id: str, data: dict) -> None:
+    if _writable("put_family"):
+        backend().put_family(family_id, data)
+
+
+def watch_families(on_change):
+    """Call on_change(family_id, config or None if deleted) for every family change.
+
+    Returns a watch with unsubscribe().
+    """
+    return backend().watch_families(on_change)
+
+
+# Call summaries
+
+def existing_call_ids(family_id: str, call_ids: list[str]) -> set[str]:
+    """Which of call_ids already have a summary, by doc ID or call_id field."""
+    return backend().existing_call_ids(family_id, call_ids)
+
+
+def add_summaries(family_id: str, summaries: dict[str, dict]) -> None:
+    """Write {doc_id: summary}; each summary carries created_at."""
+    if _writable("add_summaries"):
+        backend().add_summaries(family_id, summaries)
+
+
+def latest_summaries(family_id: str, limit: int, fields: list[str]) -> list[dict]:
+    """The family's newest summaries by created_at, projected to fields."""
+    return backend().latest_summaries(family_id, limit, fields)
+
+
+# Recommendations
+
+def load_recommendations(
+    family_id: str,
+    statuses: list[str] | None,
+    fields: list[str] | None = None,
+    newest_first: bool = False,
+) -> list[dict]:
+    """Recommendations (each with doc_id) in any of statuses, or all when None.
+
+    fields projects them ("status" is always included); newest_first orders
+    by updated_at.
+    """
+    return backend().load_recommendations(family_id, statuses, fields, newest_first)
+
+
+def get_recommendations(family_id: str, doc_ids: list[str], fields: list[str]) -> dict[str, dict]:
+    """{doc_id: projected rec} for the doc_ids that exist."""
+    return backend().get_recommendations(family_id, doc_ids, fields)
+
+
+def write_recommendations(
+    family_id: str,
+    updates: dict[str, dict] | None = None,
+    creates: dict[str, dict] | None = None,
+    deletes: list[str] | None = None,
+    events: list[dict] | None = None,
+    history: dict[str, dict] | None = None,
+) -> None:
+    """Apply rec changes, append status events and merge book_history entries atomically.
+
+    updates merge fields into existing recs, creates writes new recs by doc_id,
+    events (see status_events.event) get the next seqs and an "at" time, and
+    history maps book_key to its new book_history entry.
+    """
+    if not _writable("write_recommendations"):
+        return
+    backend().write_recommendations(
+        family_id, updates or {}, creates or {}, deletes or [], events or [], history or {}
+    )
+
+
+def families_with_status(statuses: list[str]) -> set[str]:
+    """Families with at least one recommendation in any of statuses."""
+    return backend().families_with_status(statuses)
+
+
+# Status events
+
+def last_event_seq(family_id: str) -> int:
+    return backend().last_event_seq(family_id)
+
+
+def events_since(family_id: str, cursor: int, limit: int | None = None) -> list[dict]:
+    return backend().events_since(family_id, cursor, limit)
+
+
+def event_history(family_id: str, doc_id: str) -> list[dict]:
+    return backend().event_history(family_id, doc_id)
+
+
+def families_with_event(status: str, since) -> set[str]:
+    return backend().families_with_event(status, since)
+
+
+# Book history
+
+def load_book_history(family_id: str) -> dict[str, dict] | None:
+    """The family's book_history index, or None until put_book_history has built it.
+
+    Entries merged by write_recommendations alone don't count as built.
+    """
+    return backend().load_book_history(family_id)
+
+
+def put_book_history(family_id: str, books: dict[str, dict]) -> None:
+    """Replace the family's whole book_history index."""
+    if _writable("put_book_history"):
+        backend().put_book_history(family_id, books)
+
+
+# Pending calls
+
+def put_pending_call(phone_number: str, data: dict) -> None:
+    """Stage the voice agent's context for phone_number, stamping created_at."""
+    if _writable("put_pending_call"):
+        backend().put_pending_call(phone_number, data)
+
+
+# Per-family state (families/{family_id}/sync_state/{name})
+
+def get_state(family_id: str, name: str) -> dict:
+    """The family's name state document ({} if it doesn't exist)."""
+    return backend().get_state(family_id, name)
+
+
+def get_states(family_ids: list[str], name: str) -> dict[str, dict]:
+    """{family_id: state} for the families that have a name document."""
+    return backend().get_states(family_ids, name)
+
+
+def set_state(family_id: str, name: str, data: dict, merge: bool = False) -> None:
+    if _writable("set_state"):
+        backend().set_state(family_id, name, data, merge)
+
+
+def delete_state(family_id: str, name: str) -> None:
+    if _writable("delete_state"):
+        backend().delete_state(family_id, name)
+
+
+def families_with_state(name: str, field: str) -> set[str]:
+    """Families whose name state has field > 0."""
+    return backend().families_with_state(name, field)
+
+
+def add_search_run(family_id: str, run: dict) -> None:
+    """Append to the family's search_runs log."""
+    if _writable("add_search_run"):
+        backend().add_search_run(family_id, run)
+
+
+# Global documents (hold_stats, dispatch_state)
+
+def get_docs(collection: str, doc_ids: list[str]) -> dict[str, dict]:
+    """{doc_id: data} for the doc_ids that exist."""
+    return backend().get_docs(collection, doc_ids)
+
+
+def set_docs(collection: str, docs: dict[str, dict]) -> None:
+    if _writable("set_docs"):
+        backend().set_docs(collection, docs)
+
+
+def update_docs(collection: str, doc_ids: list[str], apply) -> None:
+    """Read doc_ids and write apply({doc_id: data}) -> {doc_id: new data} in one transaction.
+
+    Concurrent updates never lose each other's changes; on Firestore apply
+    may run more than once, so it must only depend on the docs it's given.
+    """
+    if _writable("update_docs"):
+        backend().update_docs(collection, doc_ids, apply)
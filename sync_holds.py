@@ -1,19 +1,20 @@
-import asyncio
-import os
-import re
+import argparse
 from datetime import datetime, timezone
 
-from browser_use import Agent, Browser
-from browser_use.llm import ChatAnthropic
 from dotenv import load_dotenv
 
-from config import load_family
-from firestore_client import get_db
+import agent_cache
+import hold_timing
+import metrics
+import recommendations
+from browser_pool import SFPL_SITE, step_throttle
+from config import DEFAULT_FAMILY_ID, load_family
+from models import agent_limits, max_steps, run_validated
+from parsing import parse_hold_statuses
+from sessions import agent_kwargs, login_step, run, session, sfpl_credentials, sfpl_sensitive_data
 
 load_dotenv()
 
-SFPL_USERNAME = os.environ["SFPL_USERNAME"]
-SFPL_PASSWORD = os.environ["SFPL_PASSWORD"]
 
 def map_sfpl_status(status_text: str) -> str | None:
     """Map SFPL status text to our status lifecycle value."""
@@ -29,68 +30,59 @@ def map_sfpl_status(status_text: str) -> str | None:
 
 def load_active_holds(family_id: str) -> list[dict]:
     """Load recommendations with active hold statuses from Firestore."""
-    db = get_db()
-    recs = []
-    for status in ("hold_placed", "in_transit"):
-        docs = (
-            db.collection("families")
-            .document(family_id)
-            .collection("recommendations")
-            .where("status", "==", status)
-            .stream()
-        )
-        for doc in docs:
-            data = doc.to_dict()
-            data["doc_id"] = doc.id
-            recs.append(data)
-    return recs
-
-
-def update_statuses_from_sync(family_id: str, recs: list[dict], agent_text: str) -> None:
-    """Parse agent output and update recommendation statuses."""
-    db = get_db()
-    now = datetime.now(timezone.utc)
+    return recommendations.load(
+        family_id, ["hold_placed", "in_transit"],
+        fields=["title", "author", "branch", "pickup_branch", "updated_at", "hold_placed_at", "in_transit_at"],
+    )
+
+
+def update_statuses_from_sync(family_id: str, recs: list[dict], agent_text: str) -> dict[str, str]:
+    """Parse agent output and update recommendation statuses. Returns {doc_id: new_status}."""
+    parsed = parse_hold_statuses(agent_text)
 
-    # Parse agent results: - "Title" by Author | Status: <status> | Branch: <branch>
-    parsed = {}
-    for match in re.finditer(
-        r'-\s+"([^"]+)"\s+by\s+([^|]+)\|\s*Status:\s*([^|]+)\|\s*Branch:\s*([^|\n]+)',
-        agent_text,
-    ):
-        title = match.group(1).strip().lower()
-        status_text = match.group(3).strip().lower()
-        parsed[title] = status_text
-
-    updated = 0
+    changes = {}
     for rec in recs:
         title_lower = rec["title"].lower()
         if title_lower not in parsed:
             continue
         new_status = map_sfpl_status(parsed[title_lower])
         if new_status and new_status != rec.get("status"):
-            db.collection("families").document(family_id).collection(
-                "recommendations"
-            ).document(rec["doc_id"]).update({
-                "status": new_status,
-                "updated_at": now,
-            })
-            updated += 1
+            changes[rec["doc_id"]] = new_status
             print(f'  "{rec["title"]}": {rec.get("status")} → {new_status}')
 
-    print(f"Updated {updated} recommendation statuses")
+    recommendations.set_statuses(family_id, changes, recs)
+    print(f"Updated {len(changes)} recommendation statuses")
+    return changes
+
+
+def schedule_next_sync(family_id: str, recs: list[dict], changes: dict[str, str]) -> None:
+    """Learn from the transitions just seen, then store when the holds next need a look."""
+    now = datetime.now(timezone.utc)
+    synced_at = hold_timing.last_synced(family_id)
+    hold_timing.record_transitions(hold_timing.transitions(family_id, recs, changes, synced_at, now))
+    active = []
+    for rec in recs:
+        new_status = changes.get(rec["doc_id"])
+        if new_status:
+            rec = {**rec, "status": new_status, f"{new_status}_at": now}
+        if rec["status"] in hold_timing.NEXT_STATUS:
+            active.append(rec)
+
+    if not active:
+        hold_timing.clear_next_sync(family_id)
+        return
+    stats = hold_timing.load_stats({hold_timing.branch_of(rec) for rec in active})
+    when = hold_timing.next_sync_at(active, stats, now)
+    hold_timing.save_next_sync(family_id, when, synced_at=now)
+    print(f"Next hold sync due {when:%Y-%m-%d %H:%M} UTC")
 
 
-def build_task() -> str:
+def build_task(family: dict) -> str:
     return f"""\
 You need to log into the San Francisco Public Library website and check the status of my holds.
 
 ## STEP 1 — Log in
-Go to https://sfpl.org and log in:
-- Click "Log In" in the top navigation
-- Username/Barcode: {SFPL_USERNAME}
-- Password/PIN: {SFPL_PASSWORD}
-- After logging in, confirm you see your account.
-  If login fails, report the error and call "done" immediately.
+{login_step(sfpl_credentials(family)[0])}
 
 ## STEP 2 — Check hold statuses
 Navigate to your holds page (usually under "My Account" → "Holds" or similar).
@@ -112,31 +104,59 @@ the site shows. Do NOT call "done" until you have checked all holds.
 """
 
 
-async def main():
-    family = load_family()
+async def main(family_id: str = DEFAULT_FAMILY_ID, force: bool = False):
+    """Sync hold statuses, unless no hold can plausibly have changed yet (force overrides)."""
+    family = load_family(family_id)
     family_id = family.get("family_id", "leo")
 
+    next_sync = hold_timing.load_next_sync(family_id)
+    if not force and next_sync and next_sync > datetime.now(timezone.utc):
+        print(f"No hold can plausibly change before {next_sync:%Y-%m-%d %H:%M} UTC, skipping sync")
+        metrics.incr("syncs_skipped")
+        return
+
     recs = load_active_holds(family_id)
     if not recs:
         print("No active holds to sync.")
         return
 
+    from browser_use import Agent
+
     print(f"Found {len(recs)} active holds to check:")
     for rec in recs:
         print(f'  - "{rec["title"]}" ({rec.get("status")})')
 
-    task = build_task()
+    task = build_task(family)
+
+    username, _ = sfpl_credentials(family)
+    secrets = sfpl_sensitive_data(family)
 
-    browser = Browser()
-    llm = ChatAnthropic(model="claude-sonnet-4-5-20250929")
+    async def attempt(llm) -> str:
+        async def run_live(on_step) -> str:
+            async with session(username) as browser:
+                agent = Agent(
+                    task=task, llm=llm, browser=browser, sensitive_data=secrets,
+                    register_new_step_callback=on_step,
+                    **agent_kwargs(), **agent_limits("sync"),
+                )
+                result = await agent.run(max_steps=max_steps("sync"), on_step_start=step_throttle(SFPL_SITE))
+            metrics.record_agent(result, agent="sync_holds")
+            return result.final_result() or ""
 
-    agent = Agent(task=task, llm=llm, browser=browser)
-    result = await agent.run()
+        return await agent_cache.run_agent("sync", task, llm, run_live)
 
-    agent_text = result.final_result()
+    agent_text = await run_validated("sync", attempt, parse_hold_statuses)
     print(agent_text)
-    update_statuses_from_sync(family_id, recs, agent_text)
+    changes = update_statuses_from_sync(family_id, recs, agent_text)
+    schedule_next_sync(family_id, recs, changes)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Sync SFPL hold statuses into Firestore")
+    parser.add_argument("--family", default=DEFAULT_FAMILY_ID)
+    parser.add_argument("--force", action="store_true",
+                        help="sync even if no hold is predicted to have changed yet")
+    args = parser.parse_args()
+    with metrics.stage("sync", args.family):
+        run(main(args.family, args.force))
+    metrics.export()
@@ -0,0 +1,28 @@
+"""Base test case running storage against a throwaway SQLite file."""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import sqlite_storage
+import storage
+
+
+class SQLiteStorageTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.patch(storage, "STORAGE_BACKEND", "sqlite")
+        self.patch(storage, "STORAGE_READ_ONLY", False)
+        self.patch(storage, "_backend", None)
+        self.patch(sqlite_storage, "STORAGE_PATH", os.path.join(tmp.name, "storage.sqlite3"))
+        self.patch(sqlite_storage, "_initialized", False)
+        # connections are cached per thread; a fresh local drops the old file's
+        self.patch(sqlite_storage, "_local", threading.local())
+
+    def patch(self, target, name: str, value) -> None:
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
@@ -0,0 +1,110 @@
+"""agent_cache record/replay, and what replay protects."""
+
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+import agent_cache
+import sessions
+import storage
+from browser_use.llm.messages import UserMessage
+from scripted_llm import ScriptedLLM
+from tests.sqlite_case import SQLiteStorageTest
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_dates_are_blanked(self):
+        self.assertEqual(agent_cache._normalize("Today:2026-05-01 at 2026-05-01T09:30:00Z"),
+                         "Today:<date> at <date>")
+
+    def test_tab_ids_are_renumbered_in_order(self):
+        a = agent_cache._normalize(["Tab 9F3A: sfpl.org", "Current tab: 9f3a", "Tab 0B12: search"])
+        b = agent_cache._normalize(["Tab 77C1: sfpl.org", "Current tab: 77C1", "Tab E4D0: search"])
+        self.assertEqual(a, ["Tab #1: sfpl.org", "Current tab: #1", "Tab #2: search"])
+        self.assertEqual(a, b)
+
+    def test_words_ending_in_tab_are_left_alone(self):
+        self.assertEqual(agent_cache._normalize("Stab 1234"), "Stab 1234")
+
+    def test_nested_values(self):
+        self.assertEqual(agent_cache._normalize({"content": [{"text": "Tab ABCD"}], "n": 1}),
+                         {"content": [{"text": "Tab #1"}], "n": 1})
+
+
+class RecordReplayTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(agent_cache, "AGENT_CACHE_DIR", tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mode(self, mode: str) -> None:
+        patcher = mock.patch.object(agent_cache, "AGENT_CACHE", mode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_replayed_run_skips_the_browser(self):
+        llm = ScriptedLLM()
+        self.mode("record")
+        self.assertEqual(asyncio.run(agent_cache.run_agent("sync", "task", llm, self.live("ok"))), "ok")
+        self.mode("replay")
+        run = mock.AsyncMock()
+        self.assertEqual(asyncio.run(agent_cache.run_agent("sync", "task", llm, run)), "ok")
+        run.assert_not_called()
+
+    def test_replay_miss_raises_instead_of_going_live(self):
+        self.mode("replay")
+        run = mock.AsyncMock()
+        with self.assertRaises(agent_cache.CacheMiss):
+            asyncio.run(agent_cache.run_agent("sync", "unrecorded", ScriptedLLM(), run))
+        run.assert_not_called()
+
+    def test_llm_replay_ignores_date_and_tab_ids(self):
+        self.mode("record")
+        recorded = asyncio.run(agent_cache.wrap(ScriptedLLM(), "search").ainvoke(
+            [UserMessage(content="Today:2026-05-01 Tab 9F3A brainstorm")]))
+        self.mode("replay")
+        replayed = asyncio.run(agent_cache.wrap(ScriptedLLM(), "search").ainvoke(
+            [UserMessage(content="Today:2026-05-02 Tab 1C2D brainstorm")]))
+        self.assertEqual(replayed.completion, recorded.completion)
+        with self.assertRaises(agent_cache.CacheMiss):
+            asyncio.run(agent_cache.wrap(ScriptedLLM(), "search").ainvoke([UserMessage(content="other")]))
+
+    @staticmethod
+    def live(result: str):
+        async def run(on_step) -> str:
+            return result
+        return run
+
+
+class CredentialsTest(unittest.TestCase):
+    family = {"family_id": "f1", "sfpl_username": "card-1", "sfpl_password_env": "TEST_SFPL_PIN"}
+
+    def test_task_carries_placeholders_only(self):
+        with mock.patch.object(sessions, "is_logged_in", return_value=False):
+            step = sessions.login_step("card-1")
+        self.assertIn("<secret>x_username</secret>", step)
+        self.assertIn("<secret>x_password</secret>", step)
+        self.assertNotIn("card-1", step)
+
+    def test_sensitive_data_is_scoped_to_sfpl(self):
+        with mock.patch.dict("os.environ", {"TEST_SFPL_PIN": "4321"}):
+            secrets = sessions.sfpl_sensitive_data(self.family)
+        self.assertEqual(secrets["https://*.sfpl.org"], {"x_username": "card-1", "x_password": "4321"})
+        self.assertEqual(set(secrets), {"https://*.sfpl.org", "https://*.bibliocommons.com"})
+
+
+class ReadOnlyStorageTest(SQLiteStorageTest):
+    def test_writes_are_skipped_and_reads_go_through(self):
+        storage.set_state("f1", "holds", {"n": 1})
+        self.patch(storage, "STORAGE_READ_ONLY", True)
+        storage.set_state("f1", "holds", {"n": 2})
+        storage.write_recommendations("f1", creates={"d1": {"title": "A", "status": "recommended"}})
+        self.assertEqual(storage.get_state("f1", "holds"), {"n": 1})
+        self.assertEqual(storage.load_recommendations("f1", None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""availability_cache: TTL, eviction and concurrent first use."""
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import availability_cache
+
+
+class AvailabilityCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.object(availability_cache, "CACHE_PATH", os.path.join(tmp.name, "availability.sqlite3")),
+            mock.patch.object(availability_cache, "_initialized", False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_round_trip_across_spellings(self):
+        availability_cache.put("The Very Hungry Caterpillar", "Eric Carle", ["Noe Valley"], "S93C4567890")
+        cached = availability_cache.get("Very Hungry Caterpillar", "Carle, Eric")
+        self.assertEqual(cached["branches"], ["Noe Valley"])
+        self.assertEqual(cached["bib_id"], "S93C4567890")
+
+    def test_stale_entries_miss(self):
+        availability_cache.put("Dragons Love Tacos", "Adam Rubin", [])
+        with mock.patch.object(availability_cache, "CACHE_TTL", -1):
+            self.assertIsNone(availability_cache.get("Dragons Love Tacos", "Adam Rubin"))
+
+    def test_least_recently_used_are_evicted(self):
+        with mock.patch.object(availability_cache, "CACHE_MAX_ENTRIES", 2), \
+                mock.patch.object(availability_cache.time, "time", side_effect=range(100)):
+            availability_cache.put("A", "X", [])
+            availability_cache.put("B", "X", [])
+            availability_cache.get("A", "X")
+            availability_cache.put("C", "X", [])
+            self.assertIsNotNone(availability_cache.get("A", "X"))
+            self.assertIsNone(availability_cache.get("B", "X"))
+
+    def test_concurrent_first_use(self):
+        def put(i: int) -> None:
+            availability_cache.put(f"Book {i}", "X", ["Main Library"])
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(put, range(32)))
+        self.assertTrue(all(availability_cache.get(f"Book {i}", "X") for i in range(32)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""cartesia.py: pagination against fake_cartesia.py, retries and backoff."""
+
+import asyncio
+import json
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+import cartesia
+import fake_cartesia
+from tests.test_catalog import free_port
+
+
+def response(status: int, body: dict | None = None, headers: dict | None = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body or {}).encode()
+    resp.headers.update(headers or {})
+    return resp
+
+
+class ClientTest(unittest.TestCase):
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict("os.environ", {"CARTESIA_API_KEY": "test-key"}),
+            mock.patch.object(cartesia, "CARTESIA_RATE_LIMIT", 0),
+            mock.patch.object(cartesia, "_backoff", return_value=0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def scripted(self, *responses):
+        """Make the pooled session answer with responses (or raise exceptions) in order."""
+        session = mock.Mock()
+        session.request.side_effect = list(responses)
+        patcher = mock.patch.object(cartesia, "_http", return_value=session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return session
+
+    def test_get_is_retried_on_server_errors(self):
+        session = self.scripted(response(503), requests.ConnectionError(), response(200, {"ok": True}))
+        self.assertEqual(cartesia.request("GET", "/agents/calls"), {"ok": True})
+        self.assertEqual(session.request.call_count, 3)
+
+    def test_get_gives_up_after_max_retries(self):
+        session = self.scripted(*[response(500)] * (cartesia.CARTESIA_MAX_RETRIES + 1))
+        with self.assertRaises(requests.HTTPError):
+            cartesia.request("GET", "/agents/calls")
+        self.assertEqual(session.request.call_count, cartesia.CARTESIA_MAX_RETRIES + 1)
+
+    def test_post_is_not_retried_when_it_may_have_been_processed(self):
+        session = self.scripted(response(500), response(200))
+        with self.assertRaises(requests.HTTPError):
+            cartesia.request("POST", "/twilio/call/outbound", json={})
+        self.assertEqual(session.request.call_count, 1)
+        session = self.scripted(requests.ReadTimeout())
+        with self.assertRaises(requests.ReadTimeout):
+            cartesia.request("POST", "/twilio/call/outbound", json={})
+
+    def test_post_is_retried_when_it_was_not_processed(self):
+        session = self.scripted(response(429), requests.ConnectTimeout(), response(200, {"status": "queued"}))
+        self.assertEqual(cartesia.request("POST", "/twilio/call/outbound", json={}), {"status": "queued"})
+        self.assertEqual(session.request.call_count, 3)
+
+    def test_client_errors_are_not_retried(self):
+        session = self.scripted(response(404))
+        with self.assertRaises(requests.HTTPError):
+            cartesia.request("GET", "/agents/calls")
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_async_variant_runs_off_the_event_loop(self):
+        threads = []
+
+        def request(*args):
+            threads.append(threading.get_ident())
+            return {"ok": True}
+
+        with mock.patch.object(cartesia, "request", request):
+            self.assertEqual(asyncio.run(cartesia.arequest("GET", "/agents/calls")), {"ok": True})
+        self.assertNotEqual(threads, [threading.get_ident()])
+
+
+class BackoffTest(unittest.TestCase):
+    def test_full_jitter_is_capped(self):
+        for attempt in range(12):
+            self.assertLessEqual(cartesia._backoff(attempt), cartesia.CARTESIA_MAX_BACKOFF)
+
+    def test_retry_after_is_honoured_up_to_the_cap(self):
+        self.assertGreaterEqual(cartesia._backoff(0, "3"), 3.0)
+        self.assertEqual(cartesia._backoff(0, "3600"), cartesia.CARTESIA_MAX_BACKOFF)
+
+
+class FakeCartesiaTest(unittest.TestCase):
+    def setUp(self):
+        port = free_port()
+        self.server = fake_cartesia.serve(port, calls=23)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        for patcher in (
+            mock.patch.dict("os.environ", {"CARTESIA_API_KEY": "test-key",
+                                           "CARTESIA_BASE_URL": f"http://127.0.0.1:{port}"}),
+            mock.patch.object(cartesia, "CARTESIA_RATE_LIMIT", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_pages_through_every_call_once(self):
+        ids = [call["id"] for call in cartesia.iter_calls("agent", page_size=5)]
+        self.assertEqual(len(ids), 23)
+        self.assertEqual(len(set(ids)), 23)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_pages_are_fetched_lazily(self):
+        with mock.patch.object(cartesia, "request", wraps=cartesia.request) as request:
+            calls = cartesia.iter_calls("agent", page_size=5)
+            next(calls)
+        self.assertEqual(request.call_count, 1)
+
+    def test_outbound_call(self):
+        self.assertEqual(cartesia.start_outbound_call("+15550000000", "agent")["status"], "queued")
+        self.assertEqual(self.server.RequestHandlerClass.outbound,
+                         [{"target_numbers": ["+15550000000"], "agent_id": "agent"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""catalog.py against fake_catalog.py: failed lookups fall back to the agent."""
+
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+import availability_cache
+import catalog
+import fake_catalog
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class GatewayErrorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.patch(availability_cache, "CACHE_PATH", os.path.join(self.tmp.name, "availability.sqlite3"))
+        self.patch(availability_cache, "_initialized", False)
+
+    def patch(self, target, name: str, value) -> None:
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, error_status: int = 0) -> None:
+        port = free_port()
+        server = fake_catalog.serve(port, error_status=error_status)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.patch(catalog, "CATALOG_BASE_URL", f"http://127.0.0.1:{port}{fake_catalog.PREFIX}")
+
+    def test_error_status_is_unresolved(self):
+        self.serve(error_status=500)
+        self.assertIsNone(catalog.check_availability("Dragons Love Tacos", "Adam Rubin"))
+
+    def test_connection_refused_is_unresolved(self):
+        self.patch(catalog, "CATALOG_BASE_URL", f"http://127.0.0.1:{free_port()}{fake_catalog.PREFIX}")
+        self.assertEqual(catalog.check_many([("Dragons Love Tacos", "Adam Rubin")]), [None])
+
+    def test_fixture_resolves(self):
+        self.serve()
+        result = catalog.check_availability("Dragons Love Tacos", "Adam Rubin")
+        self.assertIsNotNone(result)
+        self.assertEqual(result["bib_id"], "S93C1234567")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""config: per-family accounts and the family cache."""
+
+import json
+import os
+import stat
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import config
+
+
+class AccountTest(unittest.TestCase):
+    family = {"family_id": "f1", "sfpl_username": "card-1", "sfpl_password_env": "TEST_PIN_F1"}
+
+    def setUp(self):
+        patcher = mock.patch.dict("os.environ", {"TEST_PIN_F1": "1111", "SFPL_PASSWORD": "shared"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pin_is_read_from_the_named_env_var(self):
+        self.assertEqual(config.account(self.family, "sfpl_password"), "1111")
+        self.assertEqual(config.account(self.family, "sfpl_username"), "card-1")
+
+    def test_plaintext_pin_in_the_config_is_ignored(self):
+        family = {"family_id": "f1", "sfpl_password": "plaintext"}
+        with mock.patch.object(config, "_shared_accounts", True):
+            self.assertEqual(config.account(family, "sfpl_password"), "shared")
+        with mock.patch.object(config, "_shared_accounts", False):
+            with self.assertRaises(RuntimeError):
+                config.account(family, "sfpl_password")
+
+    def test_missing_accounts_without_shared_fallback(self):
+        with mock.patch.object(config, "_shared_accounts", False):
+            self.assertEqual(config.missing_accounts(self.family), ["cartesia_agent_id"])
+            self.assertEqual(config.missing_accounts({**self.family, "sfpl_password_env": "UNSET_PIN"}),
+                             ["cartesia_agent_id", "sfpl_password"])
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "families.json")
+        for patcher in (
+            mock.patch.object(config, "FAMILY_CACHE_PATH", self.path),
+            mock.patch.object(config, "_cache", {"f1": (time.time(), {
+                "family_id": "f1", "sfpl_username": "card-1", "sfpl_password": "plaintext",
+                "sfpl_password_env": "TEST_PIN_F1",
+            })}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_secrets_stay_off_disk(self):
+        config._save_disk()
+        with open(self.path) as f:
+            data = json.load(f)["f1"]["data"]
+        self.assertNotIn("sfpl_password", data)
+        self.assertEqual(data["sfpl_password_env"], "TEST_PIN_F1")
+
+    def test_cache_file_is_owner_only(self):
+        config._save_disk()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""firestore_storage's transaction packing, without a Firestore connection."""
+
+import unittest
+from unittest import mock
+
+import firestore_storage
+from firestore_client import BATCH_LIMIT
+
+
+class Ref:
+    def __init__(self, doc_id: str, collection: str = "recommendations"):
+        self.id = doc_id
+        self.parent = mock.Mock(id=collection)
+
+
+class CommitWithEventsTest(unittest.TestCase):
+    def commit(self, writes: list[tuple], events: list[dict]) -> list[list[tuple]]:
+        transactions = []
+        with mock.patch.object(firestore_storage, "_transact_with_events",
+                               lambda family_id, ops: transactions.append(ops) or len(transactions)):
+            firestore_storage._commit_with_events("f1", writes, events)
+        return transactions
+
+    def test_small_call_is_one_transaction(self):
+        writes = [("update", Ref("d1"), {}), ("merge", Ref("book_history", "sync_state"), {})]
+        transactions = self.commit(writes, [{"doc_id": "d1"}])
+        self.assertEqual(len(transactions), 1)
+        self.assertEqual([op for op, _, _ in transactions[0]], ["update", "event", "merge"])
+
+    def test_large_call_is_chunked_with_events_beside_their_writes(self):
+        writes = [("update", Ref(f"d{i}"), {}) for i in range(700)]
+        transactions = self.commit(writes, [{"doc_id": f"d{i}"} for i in range(700)])
+        self.assertGreater(len(transactions), 1)
+        for ops in transactions:
+            # one slot is left for the seq counter
+            self.assertLessEqual(len(ops), BATCH_LIMIT - 1)
+            written = {ref.id for op, ref, _ in ops if op != "event"}
+            logged = {e["doc_id"] for op, _, e in ops if op == "event"}
+            self.assertEqual(logged, written)
+        self.assertEqual(sum(len(ops) for ops in transactions), 1400)
+
+    def test_events_without_a_write_are_kept(self):
+        transactions = self.commit([], [{"doc_id": "gone"}])
+        self.assertEqual(transactions, [[("event", None, {"doc_id": "gone"})]])
+
+
+if __name__ == "__main__":
+    unittest.main()
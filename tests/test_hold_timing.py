@@ -0,0 +1,113 @@
+"""hold_timing: learned transit times and next-sync scheduling."""
+
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import hold_timing
+import recommendations
+from tests.sqlite_case import SQLiteStorageTest
+
+NOW = datetime(2026, 5, 1, 12, tzinfo=timezone.utc)
+
+
+class ScheduleTest(unittest.TestCase):
+    def test_quantile(self):
+        samples = [float(s) for s in range(10, 0, -1)]
+        self.assertEqual(hold_timing.quantile(samples, 0.0), 1.0)
+        self.assertEqual(hold_timing.quantile(samples, 0.1), 2.0)
+        self.assertEqual(hold_timing.quantile(samples, 1.0), 10.0)
+
+    def test_prior_until_enough_samples(self):
+        rec = {"status": "in_transit", "in_transit_at": NOW, "pickup_branch": "Noe Valley"}
+        few = {"Noe Valley": {"in_transit": [60.0] * (hold_timing.MIN_SAMPLES - 1)}}
+        self.assertEqual(hold_timing.earliest_change(rec, few, NOW),
+                         NOW + timedelta(hours=hold_timing.PRIOR_HOURS["in_transit"]))
+        enough = {"Noe Valley": {"in_transit": [3600.0] * hold_timing.MIN_SAMPLES}}
+        self.assertEqual(hold_timing.earliest_change(rec, enough, NOW), NOW + timedelta(hours=1))
+
+    def test_falls_back_to_all_branches(self):
+        rec = {"status": "hold_placed", "hold_placed_at": NOW, "pickup_branch": "Anza"}
+        stats = {hold_timing.ALL_BRANCHES: {"hold_placed": [7200.0] * hold_timing.MIN_SAMPLES}}
+        self.assertEqual(hold_timing.earliest_change(rec, stats, NOW), NOW + timedelta(hours=2))
+
+    def test_next_sync_is_clamped(self):
+        soon = {"status": "hold_placed", "hold_placed_at": NOW - timedelta(days=2)}
+        late = {"status": "hold_placed", "hold_placed_at": NOW + timedelta(days=2)}
+        self.assertEqual(hold_timing.next_sync_at([soon], {}, NOW), NOW + hold_timing.SYNC_MIN_INTERVAL)
+        self.assertEqual(hold_timing.next_sync_at([late], {}, NOW), NOW + hold_timing.SYNC_MAX_INTERVAL)
+        self.assertEqual(hold_timing.next_sync_at([], {}, NOW), NOW + hold_timing.SYNC_MAX_INTERVAL)
+
+    def test_later_statuses(self):
+        self.assertEqual(hold_timing.later_statuses("hold_placed"), ["in_transit", "ready"])
+        self.assertEqual(hold_timing.later_statuses("ready"), [])
+
+
+class TransitionsTest(SQLiteStorageTest):
+    def rec(self, status: str = "hold_placed", at: datetime = NOW) -> dict:
+        return {"doc_id": "d1", "status": status, f"{status}_at": at, "pickup_branch": "Noe Valley"}
+
+    def test_exit_is_midpoint_since_last_sync(self):
+        rec = self.rec(at=NOW - timedelta(hours=10))
+        found = hold_timing.transitions("f1", [rec], {"d1": "in_transit"}, NOW - timedelta(hours=4), NOW)
+        self.assertEqual(found, [("Noe Valley", "hold_placed", 8 * 3600.0)])
+
+    def test_first_sync_uses_the_whole_window(self):
+        rec = self.rec(at=NOW - timedelta(hours=10))
+        found = hold_timing.transitions("f1", [rec], {"d1": "in_transit"}, None, NOW)
+        self.assertEqual(found, [("Noe Valley", "hold_placed", 5 * 3600.0)])
+
+    def test_skipped_status_still_teaches_the_first(self):
+        rec = self.rec(at=NOW - timedelta(hours=10))
+        found = hold_timing.transitions("f1", [rec], {"d1": "ready"}, NOW - timedelta(hours=4), NOW)
+        self.assertEqual([(status, seconds) for _, status, seconds in found], [("hold_placed", 8 * 3600.0)])
+
+    def test_no_sample_without_a_forward_move(self):
+        rec = self.rec(status="in_transit")
+        self.assertEqual(hold_timing.transitions("f1", [rec], {"d1": "hold_placed"}, None, NOW), [])
+        self.assertEqual(hold_timing.transitions("f1", [rec], {}, None, NOW), [])
+
+    def test_entry_time_comes_from_the_event_log(self):
+        recommendations.replace_recommended("f1", [{"title": "A", "author": "X", "why": ""}])
+        rec = recommendations.load("f1", ["recommended"], fields=["title", "author"])[0]
+        recommendations.set_status("f1", rec["doc_id"], "hold_placed", rec)
+        logged = hold_timing.status_entered("f1", {**rec, "status": "hold_placed"})
+        stale = {**rec, "status": "hold_placed", "hold_placed_at": logged - timedelta(days=1)}
+        self.assertEqual(hold_timing.status_entered("f1", stale), logged)
+
+
+class StatsTest(SQLiteStorageTest):
+    def test_concurrent_writers_keep_every_sample(self):
+        threads = [
+            threading.Thread(target=hold_timing.record_transitions, args=([("Noe Valley", "in_transit", float(i))],))
+            for i in range(20)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = hold_timing.load_stats({"Noe Valley"})
+        self.assertEqual(sorted(stats["Noe Valley"]["in_transit"]), [float(i) for i in range(20)])
+        self.assertEqual(len(stats[hold_timing.ALL_BRANCHES]["in_transit"]), 20)
+
+    def test_keeps_newest_max_samples(self):
+        with mock.patch.object(hold_timing, "MAX_SAMPLES", 3):
+            hold_timing.record_transitions([("Anza", "hold_placed", float(i)) for i in range(5)])
+        self.assertEqual(hold_timing.load_stats({"Anza"})["Anza"]["hold_placed"], [2.0, 3.0, 4.0])
+
+    def test_pull_forward_keeps_synced_at(self):
+        now = datetime.now(timezone.utc)
+        hold_timing.save_next_sync("f1", now + timedelta(days=2), synced_at=now)
+        hold_timing.pull_forward("f1", [{"status": "hold_placed", "hold_placed_at": now}])
+        self.assertLess(hold_timing.load_next_sync("f1"), now + timedelta(days=2))
+        self.assertEqual(hold_timing.last_synced("f1"), now)
+
+    def test_due_families(self):
+        hold_timing.save_next_sync("later", NOW + timedelta(hours=1))
+        hold_timing.save_next_sync("past", NOW - timedelta(hours=1))
+        self.assertEqual(hold_timing.due_families(["later", "past", "never"], NOW), ["past", "never"])
+
+
+if __name__ == "__main__":
+    unittest.main()
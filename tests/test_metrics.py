@@ -0,0 +1,65 @@
+"""metrics: JSONL export and label propagation to catalog workers."""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import catalog
+import metrics
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.jsonl = os.path.join(tmp.name, "metrics.jsonl")
+        for patcher in (
+            mock.patch.object(metrics, "METRICS_JSONL", self.jsonl),
+            mock.patch.object(metrics, "METRICS_PROM", os.path.join(tmp.name, "metrics.prom")),
+            mock.patch.object(metrics, "_counters", {}),
+            mock.patch.object(metrics, "_exported", {}),
+            mock.patch.object(metrics, "_events", []),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def counter_lines(self) -> list[tuple[str, float]]:
+        with open(self.jsonl) as f:
+            return [(e["metric"], e["value"]) for e in map(json.loads, f) if "value" in e]
+
+    def test_repeated_exports_write_deltas(self):
+        metrics.incr("firestore_reads", 3)
+        metrics.export()
+        metrics.incr("firestore_reads", 2)
+        metrics.export()
+        metrics.export()
+        self.assertEqual(self.counter_lines(), [("firestore_reads", 3), ("firestore_reads", 2)])
+        self.assertEqual(metrics.total("firestore_reads"), 5)
+
+    def test_prometheus_keeps_totals(self):
+        metrics.incr("firestore_reads", 3)
+        metrics.export()
+        metrics.incr("firestore_reads", 2)
+        metrics.export()
+        self.assertIn("answering_machine_firestore_reads_total 5", metrics.prometheus_text())
+
+
+class CatalogLabelsTest(unittest.TestCase):
+    def test_worker_threads_keep_stage_labels(self):
+        seen = []
+
+        def check(title, author):
+            seen.append(dict(metrics._context.get()))
+            return None
+
+        with mock.patch.object(catalog, "check_availability", check), \
+                mock.patch.object(metrics, "_timings", {}), mock.patch.object(metrics, "_events", []):
+            with metrics.stage("search", "f1"):
+                catalog.check_many([("A", "X"), ("B", "Y")])
+        self.assertEqual(seen, [{"stage": "search", "family": "f1"}] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
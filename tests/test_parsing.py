@@ -0,0 +1,68 @@
+"""parsing.py against the report formats the agents are asked for."""
+
+import unittest
+
+from parsing import book_key, parse_agent_picks, parse_hold_results, parse_hold_statuses, parse_verification
+
+
+class AgentPicksTest(unittest.TestCase):
+    def test_picks_with_and_without_branch(self):
+        picks = parse_agent_picks(
+            '1. "Dragons Love Tacos" by Adam Rubin — Loves dragons. Available at the Noe Valley branch.\n'
+            '2. "Rosie Revere, Engineer" by **Andrea Beaty** — Builds things\n'
+        )
+        self.assertEqual(picks, [
+            {"title": "Dragons Love Tacos", "author": "Adam Rubin", "why": "Loves dragons", "branch": "Noe Valley"},
+            {"title": "Rosie Revere, Engineer", "author": "Andrea Beaty", "why": "Builds things", "branch": ""},
+        ])
+
+    def test_no_picks(self):
+        self.assertEqual(parse_agent_picks("I couldn't find anything."), [])
+
+
+class HoldResultsTest(unittest.TestCase):
+    def test_placed_failed_and_already_on_hold(self):
+        results = parse_hold_results(
+            "HOLD RESULTS:\n"
+            '1. "Dragons Love Tacos" — Hold placed successfully (pickup at Noe Valley)\n'
+            '2. "Rosie Revere, Engineer" - Failed: not in the catalog\n'
+            '3. "The Very Hungry Caterpillar" — Failed: already on hold\n'
+        )
+        self.assertEqual([(r["title"], r["placed"]) for r in results], [
+            ("Dragons Love Tacos", True), ("Rosie Revere, Engineer", False), ("The Very Hungry Caterpillar", True),
+        ])
+        self.assertEqual(results[0]["branch"], "Noe Valley")
+        self.assertEqual(results[1]["branch"], "")
+        self.assertEqual(results[1]["reason"], "not in the catalog")
+        self.assertEqual(results[2]["reason"], "")
+
+    def test_empty_output(self):
+        self.assertEqual(parse_hold_results(None), [])
+
+
+class HoldStatusesTest(unittest.TestCase):
+    def test_statuses_by_lowercased_title(self):
+        statuses = parse_hold_statuses(
+            "HOLD STATUSES:\n"
+            '- "Dragons Love Tacos" by Adam Rubin | Status: Ready for pickup | Branch: Noe Valley\n'
+            '- "Rosie Revere, Engineer" by Andrea Beaty | Status: In transit | Branch: Main Library\n'
+        )
+        self.assertEqual(statuses, {"dragons love tacos": "ready for pickup", "rosie revere, engineer": "in transit"})
+
+
+class VerificationTest(unittest.TestCase):
+    def test_outcomes(self):
+        self.assertEqual(parse_verification("AVAILABLE at Noe Valley, Main Library."), ["Noe Valley", "Main Library"])
+        self.assertEqual(parse_verification("NOT AVAILABLE"), [])
+        self.assertEqual(parse_verification("NOT FOUND"), [])
+        self.assertIsNone(parse_verification("The page didn't load."))
+
+
+class BookKeyTest(unittest.TestCase):
+    def test_catalog_and_agent_spellings_agree(self):
+        self.assertEqual(book_key("The Very Hungry Caterpillar", "Carle, Eric"),
+                         book_key("Very Hungry Caterpillar!", "Eric Carle"))
+
+
+if __name__ == "__main__":
+    unittest.main()
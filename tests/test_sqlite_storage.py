@@ -0,0 +1,59 @@
+"""sqlite_storage: datetime round-trips, transactions and merges."""
+
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import sqlite_storage
+import storage
+from tests.sqlite_case import SQLiteStorageTest
+
+
+class DatetimeTest(SQLiteStorageTest):
+    def test_nested_datetimes_round_trip_timezone_aware(self):
+        when = datetime(2026, 3, 1, 9, 30, tzinfo=timezone(timedelta(hours=-8)))
+        storage.set_state("f1", "holds", {"next_sync_at": when, "nested": {"at": [when]}})
+        state = storage.get_state("f1", "holds")
+        self.assertEqual(state["next_sync_at"], when)
+        self.assertEqual(state["nested"]["at"], [when])
+        self.assertIsNotNone(state["next_sync_at"].tzinfo)
+
+    def test_plain_dict_with_dt_key_among_others_is_left_alone(self):
+        storage.set_state("f1", "misc", {"value": {"$dt": "not a date", "other": 1}})
+        self.assertEqual(storage.get_state("f1", "misc"), {"value": {"$dt": "not a date", "other": 1}})
+
+
+class TransactionTest(SQLiteStorageTest):
+    def test_commits_on_success(self):
+        storage.set_docs("hold_stats", {"_all": {"n": 1}})
+        with sqlite_storage._Transaction() as conn:
+            sqlite_storage._put_docs(conn, "hold_stats", {"_all": {"n": 2}})
+        self.assertEqual(storage.get_docs("hold_stats", ["_all"]), {"_all": {"n": 2}})
+
+    def test_rolls_back_on_error(self):
+        storage.set_docs("hold_stats", {"_all": {"n": 1}})
+        with self.assertRaises(RuntimeError):
+            with sqlite_storage._Transaction() as conn:
+                sqlite_storage._put_docs(conn, "hold_stats", {"_all": {"n": 2}})
+                raise RuntimeError("boom")
+        self.assertEqual(storage.get_docs("hold_stats", ["_all"]), {"_all": {"n": 1}})
+
+    def test_update_docs_applies_to_current_contents(self):
+        storage.set_docs("hold_stats", {"a": {"n": 1}})
+        storage.update_docs("hold_stats", ["a", "b"], lambda docs: {"a": {"n": docs["a"]["n"] + 1}, "b": {"n": 0}})
+        self.assertEqual(storage.get_docs("hold_stats", ["a", "b"]), {"a": {"n": 2}, "b": {"n": 0}})
+
+
+class StateTest(SQLiteStorageTest):
+    def test_merge_keeps_other_fields(self):
+        storage.set_state("f1", "notify", {"cursor": 3, "pending": [{"doc_id": "x"}]})
+        storage.set_state("f1", "notify", {"pending": []}, merge=True)
+        self.assertEqual(storage.get_state("f1", "notify"), {"cursor": 3, "pending": []})
+
+    def test_set_without_merge_replaces(self):
+        storage.set_state("f1", "notify", {"cursor": 3})
+        storage.set_state("f1", "notify", {"pending": []})
+        self.assertEqual(storage.get_state("f1", "notify"), {"pending": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""status_events seqs and notify_parent's cursor over them."""
+
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import notify_parent
+import recommendations
+import status_events
+from tests.sqlite_case import SQLiteStorageTest
+
+
+def recommend(family_id: str, *titles: str) -> list[dict]:
+    recommendations.replace_recommended(family_id, [{"title": t, "author": "Author", "why": ""} for t in titles])
+    return recommendations.load(family_id, ["recommended"], fields=["title", "author"])
+
+
+class SeqTest(SQLiteStorageTest):
+    def test_seqs_increase_without_gaps(self):
+        recs = recommend("f1", "A", "B")
+        recommendations.set_statuses("f1", {rec["doc_id"]: "hold_placed" for rec in recs}, recs)
+        self.assertEqual(status_events.last_seq("f1"), 4)
+        self.assertEqual([e["seq"] for e in status_events.changes_since("f1", 0)], [1, 2, 3, 4])
+        later = status_events.changes_since("f1", 2)
+        self.assertEqual([e["status"] for e in later], ["hold_placed", "hold_placed"])
+        self.assertEqual(status_events.changes_since("f1", 2, limit=1)[0]["seq"], 3)
+
+    def test_families_have_their_own_seqs(self):
+        recommend("f1", "A")
+        recommend("f2", "B", "C")
+        self.assertEqual(status_events.last_seq("f1"), 1)
+        self.assertEqual(status_events.last_seq("f2"), 2)
+
+    def test_concurrent_writers_get_distinct_seqs(self):
+        recs = recommend("f1", *[f"Book {i}" for i in range(10)])
+        threads = [
+            threading.Thread(target=recommendations.set_status, args=("f1", rec["doc_id"], "hold_placed", rec))
+            for rec in recs
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([e["seq"] for e in status_events.changes_since("f1", 0)], list(range(1, 21)))
+
+    def test_history_of_one_book(self):
+        rec = recommend("f1", "A")[0]
+        recommendations.set_status("f1", rec["doc_id"], "hold_placed", rec)
+        recommendations.set_status("f1", rec["doc_id"], "ready", {**rec, "status": "hold_placed"})
+        history = status_events.history("f1", rec["doc_id"])
+        self.assertEqual([e["status"] for e in history], ["recommended", "hold_placed", "ready"])
+        self.assertEqual(history[-1]["from_status"], "hold_placed")
+
+
+class NotifyCursorTest(SQLiteStorageTest):
+    def setUp(self):
+        super().setUp()
+        self.recs = recommend("f1", "A", "B", "C")
+
+    def ready(self, *recs: dict) -> None:
+        recommendations.set_statuses("f1", {rec["doc_id"]: "ready" for rec in recs}, list(recs))
+
+    def test_first_run_seeds_from_current_ready_books(self):
+        self.ready(self.recs[0])
+        books, _ = notify_parent.pending_books("f1")
+        self.assertEqual([b["title"] for b in books], ["A"])
+        self.assertEqual(notify_parent.load_notify_state("f1")["cursor"], status_events.last_seq("f1"))
+
+    def test_later_runs_fold_in_new_ready_books(self):
+        self.ready(self.recs[0])
+        notify_parent.pending_books("f1")
+        self.ready(self.recs[1])
+        books, _ = notify_parent.pending_books("f1")
+        self.assertEqual(sorted(b["title"] for b in books), ["A", "B"])
+        self.assertEqual(notify_parent.load_notify_state("f1")["pending_count"], 2)
+
+    def test_book_leaving_ready_drops_out(self):
+        self.ready(self.recs[0], self.recs[1])
+        notify_parent.pending_books("f1")
+        recommendations.set_status("f1", self.recs[1]["doc_id"], "picked_up", self.recs[1])
+        books, _ = notify_parent.pending_books("f1")
+        self.assertEqual([b["title"] for b in books], ["A"])
+
+    def test_notified_books_are_not_announced_again(self):
+        self.ready(self.recs[0])
+        books, _ = notify_parent.pending_books("f1")
+        notify_parent.mark_notified("f1", books)
+        self.ready(self.recs[1])
+        books, state = notify_parent.pending_books("f1")
+        self.assertEqual([b["title"] for b in books], ["B"])
+        self.assertIn("last_called_at", state)
+
+    def test_notified_at_skips_a_book_even_if_pending_kept_it(self):
+        self.ready(self.recs[0])
+        books, _ = notify_parent.pending_books("f1")
+        # the state write after the call was lost; only the book stamp landed
+        recommendations.update("f1", {books[0]["doc_id"]: {"notified_at": datetime.now(timezone.utc)}})
+        self.assertEqual(notify_parent.pending_books("f1")[0], [])
+
+
+class IsDueTest(unittest.TestCase):
+    now = datetime(2026, 5, 1, 12, tzinfo=timezone.utc)
+    window = timedelta(minutes=30)
+
+    def books(self, *minutes_ago: int) -> list[dict]:
+        return [{"ready_since": self.now - timedelta(minutes=m)} for m in minutes_ago]
+
+    def test_waits_for_the_oldest_book_to_coalesce(self):
+        self.assertFalse(notify_parent.is_due(self.books(10, 5), None, self.window, self.now))
+        self.assertTrue(notify_parent.is_due(self.books(40, 5), None, self.window, self.now))
+
+    def test_respects_min_interval_between_calls(self):
+        recent = self.now - notify_parent.NOTIFY_MIN_INTERVAL + timedelta(minutes=1)
+        self.assertFalse(notify_parent.is_due(self.books(40), recent, self.window, self.now))
+        long_ago = self.now - notify_parent.NOTIFY_MIN_INTERVAL - timedelta(minutes=1)
+        self.assertTrue(notify_parent.is_due(self.books(40), long_ago, self.window, self.now))
+
+    def test_nothing_to_announce(self):
+        self.assertFalse(notify_parent.is_due([], None, self.window, self.now))
+
+
+if __name__ == "__main__":
+    unittest.main()
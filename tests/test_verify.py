@@ -0,0 +1,48 @@
+"""main.verify_candidates keeps the brainstorm's ranking."""
+
+import asyncio
+import unittest
+from unittest import mock
+
+import main
+
+CANDIDATES = [{"title": f"Book {i}", "author": "Author"} for i in range(6)]
+
+
+class VerifyCandidatesTest(unittest.TestCase):
+    def verify(self, fast_path: list, agent_delays: dict[int, float], target: int) -> tuple[list[int], list[int]]:
+        """Titles picked and candidates given a browser check, as indexes."""
+        checked = []
+
+        async def agent(book):
+            i = CANDIDATES.index(book)
+            checked.append(i)
+            await asyncio.sleep(agent_delays[i])
+            return ["Noe Valley"]
+
+        with mock.patch.object(main.catalog, "check_many", return_value=fast_path), \
+                mock.patch.object(main, "verify_with_agent", agent):
+            picks = asyncio.run(main.verify_candidates(CANDIDATES, target))
+        return [CANDIDATES.index({k: p[k] for k in ("title", "author")}) for p in picks], checked
+
+    def test_slow_higher_ranked_check_still_wins(self):
+        available = {"branches": ["Main Library"]}
+        fast_path = [None, {"branches": []}, available, None, available, available]
+        picks, checked = self.verify(fast_path, {0: 0.05, 3: 0.0}, target=2)
+        self.assertEqual(picks, [0, 2])
+        self.assertEqual(sorted(checked), [0, 3])
+
+    def test_lower_ranked_candidates_are_not_checked(self):
+        available = {"branches": ["Main Library"]}
+        fast_path = [available, available, available, None, None, None]
+        picks, checked = self.verify(fast_path, {}, target=3)
+        self.assertEqual(picks, [0, 1, 2])
+        self.assertEqual(checked, [])
+
+    def test_fills_up_from_browser_checks_in_rank_order(self):
+        picks, _ = self.verify([None] * 6, {0: 0.03, 1: 0.02, 2: 0.01, 3: 0.0, 4: 0.0, 5: 0.0}, target=3)
+        self.assertEqual(picks, [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()